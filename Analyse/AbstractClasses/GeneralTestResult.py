@@ -15,6 +15,14 @@ except NameError:
     # noinspection PyShadowingBuiltins,PyDeprecation
     from sets import Set as set
 import Helper.ROOTConfiguration as ROOTConfiguration
+import Helper.ResultDataCache as ResultDataCache
+import Helper.ResultDataStore as ResultDataStore
+import Helper.Scheduler as Scheduler
+import Helper.Profiler as Profiler
+import Helper.TestResultRegistry as TestResultRegistry
+import Helper.PlotRenderer as PlotRenderer
+import Helper.SVGFixer as SVGFixer
+import Helper.PixelMask as PixelMask
 import glob
 
 
@@ -68,19 +76,20 @@ class GeneralTestResult(object):
 
         self.Show = True
         self.Enabled = True
-        self.SavePlotFile = True
-        self.GzipSVG = TestResultEnvironmentObject.Configuration['GzipSVG']
-        
-        self.DefaultImageFormat = TestResultEnvironmentObject.Configuration['DefaultImageFormat'].strip().lower()
-        if TestResultEnvironmentObject.Configuration.has_key('AdditionalImageFormats'):
-            self.AdditionalImageFormats = TestResultEnvironmentObject.Configuration['AdditionalImageFormats'].strip().lower().split(',')
-        else:
-        	self.AdditionalImageFormats = ['root', 'pdf']
-        	
-        if TestResultEnvironmentObject.Configuration.has_key('OverviewHTMLLink'):
-            self.OverviewHTMLLink = TestResultEnvironmentObject.Configuration['OverviewHTMLLink']
-        else:
-            self.OverviewHTMLLink = None
+        # ResultData was taken from the cache, see PopulateAllData
+        self.ResultDataRestored = False
+        # the test result was rebuilt from the ResultDataStore of a former run, see Helper/ResultDataStore.py
+        self.RestoredFromStore = False
+        # the svg plot has been post processed, see FixSVGFile
+        self.SVGFixed = False
+        # parts of the result data HTML which are reused by the parent, see GetKeyValueDictPairsHTML
+        self.ResultDataHTMLFragments = {}
+        # keys of the sub test results of the parent which are read by this test result,
+        # None: all sub test results before this one, see Helper/Scheduler.py
+        self.Inputs = None
+        # the sub test results may be populated in parallel worker processes
+        self.ParallelSubTestResults = False
+        self.SetOutputOptions(TestResultEnvironmentObject)
             
         # Path for current test to folder with root-files
         self.RawTestSessionDataPath = ''
@@ -124,6 +133,8 @@ class GeneralTestResult(object):
                 'Format': self.DefaultImageFormat,
                 'AdditionalFormats':self.AdditionalImageFormats,
                 'ImageFilePDF':'',
+                # ROOT file of the canvas, the plot is drawn again from it by a render-only run
+                'CanvasFile':'',
             },
             # SubTest Results
             'SubTestResults': {},
@@ -155,7 +166,7 @@ class GeneralTestResult(object):
         # Reference to the Test Result Environment
         self.TestResultEnvironmentObject = None
         self.TestResultEnvironmentObject = TestResultEnvironmentObject
-        self.Canvas = self.TestResultEnvironmentObject.Canvas
+        self.Canvas = self.TestResultEnvironmentObject.GetCanvas()
         self.RawTestSessionDataPath = self.TestResultEnvironmentObject.ModuleDataDirectory
 
         if ParentObject:
@@ -237,18 +248,9 @@ class GeneralTestResult(object):
             i['DisplayOptions'] = DisplayOptions
            
             importdir = self.ModulePath + '.' + SubModule
-            try:
-                # print 'import ',importdir,SubModule
-                f = __import__(importdir + '.' + SubModule, fromlist=[importdir + '.' + 'TestResult'])
-            except ImportError as inst:
-                # print 'could not ',importdir+'.'+SubModule,SubModule
-                # print 'type',type(inst)
-                # print 'inst',inst
-                f = __import__(importdir + '.TestResult', fromlist=[''])
-                print 'imported', f, 'please change name of file'
-            pass
-		
-            self.ResultData['SubTestResults'][i['Key']] = f.TestResult(
+            TestResultClass = TestResultRegistry.get_test_result_class(importdir)
+
+            self.ResultData['SubTestResults'][i['Key']] = TestResultClass(
                 self.TestResultEnvironmentObject,
                 self,
                 None,
@@ -385,36 +387,17 @@ class GeneralTestResult(object):
     '''
 
     def PopulateAllData(self):
+        UseResultDataCache = self.TestResultEnvironmentObject.Configuration['ResultDataCache']
+        if UseResultDataCache and ResultDataCache.restore_subtree(self):
+            return
+        nErrors = len(self.TestResultEnvironmentObject.ErrorList)
         self.OpenFileHandle()
-        for i in self.ResultData['SubTestResultDictList']:
-            if i['TestResultObject'].Enabled:
-                self.SetCanvasSize()
-                try:
-                    i['TestResultObject'].PopulateAllData()
-                    # i['TestResultObject'].check_for_comments()
-                except Exception as inst:
-                    exc_type, exc_obj, exc_tb = sys.exc_info()
-                    # Start red color
-                    sys.stdout.write("\x1b[31m")
-                    sys.stdout.flush()
-                    # Print error message
-                    print '\x1b[31mException while processing', i['TestResultObject'].FinalResultsStoragePath
-                    # Print traceback
-                    traceback.print_exception(exc_type, exc_obj, exc_tb)
-                    # Stop red color
-                    sys.stdout.write("\x1b[0m")
-                    sys.stdout.flush()
-
-                    self.TestResultEnvironmentObject.ErrorList.append(
-                        {'ModulePath': i['TestResultObject'].ModulePath,
-                         'ErrorCode': inst,
-                         'FinalResultsStoragePath': i['TestResultObject'].FinalResultsStoragePath}
-                    )
-                    # todo Felix: handel exceptions
+        Scheduler.populate_sub_test_results(self)
 
         self.SetCanvasSize()
         try:
-            self.PopulateResultData()
+            with Profiler.Measurement(self, 'PopulateResultData'):
+                self.PopulateResultData()
             #self.SaveCanvas()
             self.check_for_comments()
         except Exception as inst:
@@ -436,6 +419,42 @@ class GeneralTestResult(object):
                 # 'FinalResultsStoragePath':i['TestResultObject'].FinalResultsStoragePath}
             )
 
+        if UseResultDataCache:
+            if len(self.TestResultEnvironmentObject.ErrorList) == nErrors:
+                ResultDataCache.store(self)
+            else:
+                ResultDataCache.remove(self)
+
+    '''
+        Populates one sub test result including its sub test results, errors are added to the ErrorList
+        @final
+    '''
+
+    def PopulateSubTestResult(self, SubTestResultObject):
+        self.SetCanvasSize()
+        try:
+            SubTestResultObject.PopulateAllData()
+            # SubTestResultObject.check_for_comments()
+        except Exception as inst:
+            exc_type, exc_obj, exc_tb = sys.exc_info()
+            # Start red color
+            sys.stdout.write("\x1b[31m")
+            sys.stdout.flush()
+            # Print error message
+            print '\x1b[31mException while processing', SubTestResultObject.FinalResultsStoragePath
+            # Print traceback
+            traceback.print_exception(exc_type, exc_obj, exc_tb)
+            # Stop red color
+            sys.stdout.write("\x1b[0m")
+            sys.stdout.flush()
+
+            self.TestResultEnvironmentObject.ErrorList.append(
+                {'ModulePath': SubTestResultObject.ModulePath,
+                 'ErrorCode': inst,
+                 'FinalResultsStoragePath': SubTestResultObject.FinalResultsStoragePath}
+            )
+            # todo Felix: handel exceptions
+
     '''
         Manually close all file handles of the sub tests
         @final
@@ -464,6 +483,25 @@ class GeneralTestResult(object):
     def CustomInit(self):
         pass
 
+    '''
+        Sets the options of the plot and HTML files from the configuration
+    '''
+
+    def SetOutputOptions(self, TestResultEnvironmentObject):
+        self.SavePlotFile = TestResultEnvironmentObject.Configuration['Render']
+        self.GzipSVG = TestResultEnvironmentObject.Configuration['GzipSVG']
+
+        self.DefaultImageFormat = TestResultEnvironmentObject.Configuration['DefaultImageFormat'].strip().lower()
+        if TestResultEnvironmentObject.Configuration.has_key('AdditionalImageFormats'):
+            self.AdditionalImageFormats = TestResultEnvironmentObject.Configuration['AdditionalImageFormats'].strip().lower().split(',')
+        else:
+            self.AdditionalImageFormats = ['root', 'pdf']
+
+        if TestResultEnvironmentObject.Configuration.has_key('OverviewHTMLLink'):
+            self.OverviewHTMLLink = TestResultEnvironmentObject.Configuration['OverviewHTMLLink']
+        else:
+            self.OverviewHTMLLink = None
+
     '''
         Opens a file handle just before populating data
     '''
@@ -513,12 +551,20 @@ class GeneralTestResult(object):
     '''
         Saving the Canvas
     '''
+    @Profiler.measured
     def SaveCanvas(self):
         if self.SavePlotFile:
             if self.Canvas:
-                self.Canvas.SaveAs(self.GetPlotFileName())
+                # the files are written by the rendering pool, see PlotRenderer.wait
+                FileNames = [self.GetPlotFileName()] + [self.GetPlotFileName(Suffix) for Suffix in self.ResultData['Plot']['AdditionalFormats']]
+                if self.TestResultEnvironmentObject.Configuration['ResultDataStore']:
+                    # the canvas is kept as ROOT file for a render-only run, see Helper/ResultDataStore.py
+                    if self.GetPlotFileName('root') not in FileNames:
+                        FileNames.append(self.GetPlotFileName('root'))
+                    self.ResultData['Plot']['CanvasFile'] = self.GetPlotFileName('root')
+                PlotRenderer.save(self.Canvas, FileNames, self.TestResultEnvironmentObject.Configuration['PlotRenderProcesses'],
+                                  self.GetPlotFileName(PlotRenderer.SnapshotSuffix))
                 for Suffix in self.ResultData['Plot']['AdditionalFormats']:
-                	self.Canvas.SaveAs(self.GetPlotFileName(Suffix))
                 	if Suffix == 'pdf':
                 		self.ResultData['Plot']['ImageFilePDF'] = self.GetPlotFileName(Suffix)
                 self.ResultData['Plot']['Enabled'] = 1
@@ -555,18 +601,47 @@ class GeneralTestResult(object):
     '''
 
     def GenerateFinalOutput(self):
+        # all plot files have to be written
+        PlotRenderer.wait()
+        if not self.ParentObject:
+            # without rendering there are no canvas files, the store of the last rendered run is kept
+            Configuration = self.TestResultEnvironmentObject.Configuration
+            if Configuration['ResultDataStore'] and Configuration['Render'] and not self.RestoredFromStore:
+                ResultDataStore.write(self)
+            Nodes = [self]
+            for Node in Nodes:
+                Nodes.extend(Node.ResultData['SubTestResults'].values())
+            SVGFixer.fix_svgs(Nodes, self.TestResultEnvironmentObject.Configuration['SVGThreads'])
+            for Node in Nodes:
+                Node.ResultDataHTMLFragments = {}
         for i in self.ResultData['SubTestResults']:
             self.ResultData['SubTestResults'][i].GenerateFinalOutput()
 
         self.GenerateDataFiles()
 
+    '''
+        Post processing of the svg plot file, it is compressed if GzipSVG is set
+    '''
+
+    def FixSVGFile(self):
+        # restored plots have already been processed
+        if self.SVGFixed or self.ResultDataRestored or not self.SavePlotFile:
+            return
+        Plot = self.ResultData['Plot']
+        if not Plot['Enabled'] or Plot['Format'] != 'svg' or not Plot['ImageFile'] or not os.path.exists(Plot['ImageFile']):
+            return
+        Plot['ImageFile'] = SVGFixer.fix_svg(Plot['ImageFile'], self.GzipSVG,
+                                             self.TestResultEnvironmentObject.Configuration['SVGCompressionLevel'])
+        self.SVGFixed = True
+
     '''
         Generate files like Key/Value pairs in JSON format, ASCII-files, HTML-files, etc.
         @final
     '''
 
     def GenerateDataFiles(self):
-        self.GenerateDataFileHTML()
+        if self.TestResultEnvironmentObject.Configuration['Render']:
+            self.GenerateDataFileHTML()
         self.GenerateDataFileJSON()
 
     '''
@@ -574,6 +649,7 @@ class GeneralTestResult(object):
         @final
     '''
 
+    @Profiler.measured
     def GenerateDataFileHTML(self):
         HtmlParser = self.TestResultEnvironmentObject.HtmlParser
 
@@ -586,13 +662,11 @@ class GeneralTestResult(object):
 
         # Stylesheet
 
-        StylesheetHTMLTemplate = HtmlParser.getSubpart(HTMLTemplate, '###HEAD_STYLESHEET_TEMPLATE###')
-        StylesheetHTML = HtmlParser.substituteMarkerArray(
-            StylesheetHTMLTemplate,
-            {
-                '###STYLESHEET###': self.TestResultEnvironmentObject.MainStylesheet +
-                                    self.TestResultEnvironmentObject.TestResultStylesheet,
-            }
+        StylesheetHTML = self.TestResultEnvironmentObject.GetStylesheetHTML(
+            HTMLTemplate,
+            'TestResult',
+            self.TestResultEnvironmentObject.MainStylesheet + self.TestResultEnvironmentObject.TestResultStylesheet,
+            self.FinalResultsStoragePath
         )
         FinalHTML = HtmlParser.substituteSubpart(
             FinalHTML,
@@ -604,6 +678,11 @@ class GeneralTestResult(object):
             '###HEAD_STYLESHEET_TEMPLATE###',
             ''
         )
+        FinalHTML = HtmlParser.substituteSubpart(
+            FinalHTML,
+            '###HEAD_STYLESHEET_LINK_TEMPLATE###',
+            ''
+        )
 
         # Clickpath
         ClickPathEntries = []
@@ -730,36 +809,10 @@ class GeneralTestResult(object):
             '''
 
             # file operations for svg
-            if TestResultObject.ResultData['Plot']['Format'] == 'svg' and RecursionLevel == 0 and self.SavePlotFile:
-                f = open(TestResultObject.ResultData['Plot']['ImageFile'], 'r')
-                SVGContent = f.read()
-                f.close()
-
-                # fix an error in chrome / safari when displaying resized svg
-                if SVGContent.find('<svg preserveAspectRatio') == -1:
-                    SVGContent = SVGContent.replace('<svg', '<svg preserveAspectRatio="xMinYMin"', 1)
-
-                # remove an invalid space in attribute width and height
-                SVGContent = SVGContent.replace('width=" ', 'width="')
-                SVGContent = SVGContent.replace('height=" ', 'height="')
-                SVGContent = SVGContent.replace('x=" ', 'x="')
-                SVGContent = SVGContent.replace('y=" ', 'y="')
-                SVGContent = SVGContent.replace('r=" ', 'r="')
-                SVGContent = SVGContent.replace('=" ', '="')
-                SVGContent = SVGContent.replace('&#786', '&#176')
-
-                if self.GzipSVG and TestResultObject.ResultData['Plot']['ImageFile'].find('.svgz') == -1:
-                    os.remove(TestResultObject.ResultData['Plot']['ImageFile'])
-                    TestResultObject.ResultData['Plot']['ImageFile'] += 'z'
-                    f = gzip.GzipFile(TestResultObject.ResultData['Plot']['ImageFile'], 'w')
-
-                else:
-                    f = open(TestResultObject.ResultData['Plot']['ImageFile'], 'w')
-                    if os.path.exists(TestResultObject.ResultData['Plot']['ImageFile'] + 'z'):
-                        os.remove(TestResultObject.ResultData['Plot']['ImageFile'] + 'z')
-
-                f.write(SVGContent)
-                f.close()
+            # restored plots have already been processed
+            if TestResultObject.ResultData['Plot']['Format'] == 'svg' and RecursionLevel == 0 and self.SavePlotFile \
+                    and not TestResultObject.ResultDataRestored:
+                TestResultObject.FixSVGFile()
 
             if not TestResultObject.ResultData['Plot']['Caption']:
                 TestResultObject.ResultData['Plot']['Caption'] = TestResultObject.Title
@@ -792,59 +845,14 @@ class GeneralTestResult(object):
 
         ResultDataHTML = HtmlParser.substituteSubpart(ResultDataHTML, '###PLOT###', PlotHTML)
 
-        # Key Value Dict Pairs
-        KeyValueDictPairsRowHTMLTemplate = HtmlParser.getSubpart(HTMLTemplate, '###KEYVALUEDICTPAIRS_ROW###')
-        KeyValueDictPairsRows = ''
-
-        for i in TestResultObject.ResultData['KeyList']:
-            if not TestResultObject.ResultData['KeyValueDictPairs'].has_key(i):
-                warnings.warn('Cannot find Key: {Key} in {Name}'.format(Key=i,Name=self.Name))
-                continue
-            if not TestResultObject.ResultData['KeyValueDictPairs'][i].has_key('Unit'):
-                TestResultObject.ResultData['KeyValueDictPairs'][i]['Unit'] = ''
-            html_value = HtmlParser.MaskHTML(str(TestResultObject.ResultData['KeyValueDictPairs'][i]['Value']))
-            if TestResultObject.ResultData['KeyValueDictPairs'][i].has_key('Sigma'):
-                TestResultObject.ResultData['KeyValueDictPairs'][i]['SigmaOutput'] = ' +/- %s' % \
-                                                                                     TestResultObject.ResultData[
-                                                                                         'KeyValueDictPairs'][i][
-                                                                                         'Sigma']
-                html_value += ' &plusmn; ' + HtmlParser.MaskHTML(
-                    str(TestResultObject.ResultData['KeyValueDictPairs'][i]['Sigma']))
-            else:
-                TestResultObject.ResultData['KeyValueDictPairs'][i]['SigmaOutput'] = ''
-
-            if not TestResultObject.ResultData['KeyValueDictPairs'][i].has_key('Label'):
-                TestResultObject.ResultData['KeyValueDictPairs'][i]['Label'] = i
-
-            KeyValueDictPairsRows += HtmlParser.substituteMarkerArray(
-                KeyValueDictPairsRowHTMLTemplate,
-                {
-                    '###KEY###': HtmlParser.MaskHTML(i),
-                    '###LABEL###': HtmlParser.MaskHTML(
-                        TestResultObject.ResultData['KeyValueDictPairs'][i]['Label']
-                    ),
-                    '###VALUE###': html_value,
-                    '###UNIT###': HtmlParser.MaskHTML(
-                        TestResultObject.ResultData['KeyValueDictPairs'][i]['Unit']
-                    ),
-                }
-            )
+        # Key Value Dict Pairs and Table, the same for all recursion levels
         ResultDataHTML = HtmlParser.substituteSubpart(ResultDataHTML,
                                                       '###KEYVALUEDICTPAIRS_ROW###',
-                                                      KeyValueDictPairsRows)
-
-        # Table
-        TableHTML = ''
-        if RecursionLevel == 0 or True:
-            TableHTMLTemplate = HtmlParser.getSubpart(HTMLTemplate, '###TABLE###')
-            TableHTML = HtmlParser.GenerateTableHTML(TableHTMLTemplate, TestResultObject.ResultData['Table'], {
-                '###ADDITIONALCSSCLASS###': '',
-                '###ID###': 'Table',
-            })
+                                                      TestResultObject.GetKeyValueDictPairsHTML())
 
         ResultDataHTML = HtmlParser.substituteSubpart(ResultDataHTML,
                                                       '###TABLE###',
-                                                      TableHTML)
+                                                      TestResultObject.GetTableHTML())
 
         # Sub Test Results
         SubTestResultListHTML = ''
@@ -946,34 +954,80 @@ class GeneralTestResult(object):
         )
         return ResultDataHTML
 
+    '''
+        HTML of the key value pairs and of the table, they are the same in the page of the test result
+        and in the page of its parent and are generated only once, see ResultDataHTMLFragments
+    '''
+
+    def GetKeyValueDictPairsHTML(self):
+        if 'KeyValueDictPairs' in self.ResultDataHTMLFragments:
+            return self.ResultDataHTMLFragments['KeyValueDictPairs']
+        HtmlParser = self.TestResultEnvironmentObject.HtmlParser
+        HTMLTemplate = self.TestResultEnvironmentObject.TestResultHTMLTemplate
+        KeyValueDictPairsRowHTMLTemplate = HtmlParser.getSubpart(HTMLTemplate, '###KEYVALUEDICTPAIRS_ROW###')
+        KeyValueDictPairsRows = ''
+
+        for i in self.ResultData['KeyList']:
+            if not self.ResultData['KeyValueDictPairs'].has_key(i):
+                warnings.warn('Cannot find Key: {Key} in {Name}'.format(Key=i,Name=self.Name))
+                continue
+            if not self.ResultData['KeyValueDictPairs'][i].has_key('Unit'):
+                self.ResultData['KeyValueDictPairs'][i]['Unit'] = ''
+            html_value = HtmlParser.MaskHTML(str(self.ResultData['KeyValueDictPairs'][i]['Value']))
+            if self.ResultData['KeyValueDictPairs'][i].has_key('Sigma'):
+                self.ResultData['KeyValueDictPairs'][i]['SigmaOutput'] = ' +/- %s' % \
+                                                                         self.ResultData['KeyValueDictPairs'][i]['Sigma']
+                html_value += ' &plusmn; ' + HtmlParser.MaskHTML(
+                    str(self.ResultData['KeyValueDictPairs'][i]['Sigma']))
+            else:
+                self.ResultData['KeyValueDictPairs'][i]['SigmaOutput'] = ''
+
+            if not self.ResultData['KeyValueDictPairs'][i].has_key('Label'):
+                self.ResultData['KeyValueDictPairs'][i]['Label'] = i
+
+            KeyValueDictPairsRows += HtmlParser.substituteMarkerArray(
+                KeyValueDictPairsRowHTMLTemplate,
+                {
+                    '###KEY###': HtmlParser.MaskHTML(i),
+                    '###LABEL###': HtmlParser.MaskHTML(
+                        self.ResultData['KeyValueDictPairs'][i]['Label']
+                    ),
+                    '###VALUE###': html_value,
+                    '###UNIT###': HtmlParser.MaskHTML(
+                        self.ResultData['KeyValueDictPairs'][i]['Unit']
+                    ),
+                }
+            )
+        self.ResultDataHTMLFragments['KeyValueDictPairs'] = KeyValueDictPairsRows
+        return KeyValueDictPairsRows
+
+    def GetTableHTML(self):
+        if 'Table' in self.ResultDataHTMLFragments:
+            return self.ResultDataHTMLFragments['Table']
+        HtmlParser = self.TestResultEnvironmentObject.HtmlParser
+        TableHTMLTemplate = HtmlParser.getSubpart(self.TestResultEnvironmentObject.TestResultHTMLTemplate, '###TABLE###')
+        TableHTML = HtmlParser.GenerateTableHTML(TableHTMLTemplate, self.ResultData['Table'], {
+            '###ADDITIONALCSSCLASS###': '',
+            '###ID###': 'Table',
+        })
+        self.ResultDataHTMLFragments['Table'] = TableHTML
+        return TableHTML
+
     '''
         Generate file from ResultData['KeyValueDictPairs'] Key/Value pairs in JSON format
         @final
     '''
 
     def GenerateDataFileJSON(self):
-        data = None
-        key = None
         try:
-            data = self.ResultData['KeyValueDictPairs']
-            for key in data:
-                # {'NotAlivePixels': {'SigmaOutput': '', 'Unit': '', 'Value': Set([(0, 21, 31)]), 'Label': 'Pixels'}, 'MaskDefects': {'SigmaOutput': '', 'Unit': '', 'Value': Set([]), 'Label': 'Pixels'}, 'NoisyPixels': {'SigmaOutput': '', 'Unit': '', 'Value': Set([]), 'Label': 'Pixels'}, 'DeadPixels': {'SigmaOutput': '', 'Unit': '', 'Value': Set([(0, 21, 31)]), 'Label': 'Pixels'}, 'InefficentPixels': {'SigmaOutput': '', 'Unit': '', 'Value': Set([]), 'Label': 'Pixels'}}
-                if data[key].has_key('Value'):
-                    value = data[key]['Value']
-                    if type(value) == set:
-                        value = list(value)
-                        data[key]['Value'] = value
-                pass
-            # self.ResultData['KeyValueDictPairs']
+            # pixel lists, e.g. {'DeadPixels': {'Value': PixelMask([(0, 21, 31)]), 'Label': 'Dead Pixels'}}, are written
+            # in the compact form of PixelMask.to_json(), sets as lists
             f = open(self.FinalResultsStoragePath + '/KeyValueDictPairs.json', 'w')
-            f.write(json.dumps(self.ResultData['KeyValueDictPairs'], sort_keys=True, indent=4, separators=(',', ': ')))
+            f.write(json.dumps(self.ResultData['KeyValueDictPairs'], sort_keys=True, indent=4, separators=(',', ': '),
+                               default=PixelMask.json_default))
             f.close()
-        except (KeyError,IOError):
-            if data and key in data:
-                warnings.warn(
-                    'Cannot create JSON for %s, %s' % (type(data[key]['Value']), self.ResultData['KeyValueDictPairs']))
-            else:
-                warnings.warn('Cannot create JSON for %s, %s' % (type(data), self.ResultData['KeyValueDictPairs']))
+        except (KeyError,IOError,TypeError) as e:
+            warnings.warn('Cannot create JSON for %s: %s' % (e, self.ResultData['KeyValueDictPairs']))
 
     '''
         Generate file from ResultData['KeyValueDictPairs'] Key/Value pairs in ASCII format
@@ -987,6 +1041,7 @@ class GeneralTestResult(object):
         Write all test results to the database
     '''
 
+    @Profiler.measured
     def WriteToDatabase(self, ParentID=0):
         ColumnMapping = {}
         ID = 0
@@ -1003,6 +1058,11 @@ class GeneralTestResult(object):
                 print sys.exc_info()[0]
                 print "\n\n------\n"
 
+        # the rows of the whole qualification are written at once, before PostWriteToDatabase reads them
+        ResultWriter = self.TestResultEnvironmentObject.ResultWriter
+        if not self.ParentObject and ResultWriter:
+            ResultWriter.flush()
+
         self.PostWriteToDatabase()
 
     def CustomWriteToDatabase(self, ParentID):
@@ -0,0 +1,439 @@
+'''
+    Regrading of stored Fulltests for many sets of grading parameters in one vectorised pass.
+
+    get_fulltest_inputs() collects from a Fulltest in the ResultDataStore (see ResultDataStore.py)
+    the per pixel arrays and per ROC values its grade depends on:
+        PixelMap                 pixel alive map                 PixelMapMaxValue, PixelMapMaskDefectUpperThreshold
+        BumpBondingProblems      threshold difference map        BumpBondingProblemsNSigma, minThrDiff
+        TrimBitProblems          trim bit map differences        TrimBitDifference, excludeTrimBit14
+        AddressDecoding          pixels with address problems
+        Noise, ..., Parameter1   value and N of every ROC        noiseB, noiseC, ..., defectsB, defectsC
+        IVCurve                  current and slope               currentB, currentC, currentBm10, currentCm10, slopeivB
+    Pixel lists of a Fulltest which was stored without the arrays, e.g. analysed without numpy,
+    are used as they are. The inputs are cached in InputsFileName next to the store.
+
+    grade() applies the grading rules with numpy to all parameter sets at once. The rules are the
+    functions below get_pixel_alive_defects ... get_module_limits, they are used in the analysis by
+    PixelMap, BumpBondingProblems, TrimBitProblems, Chips/Chip/Grading and Fulltest/Grading with
+    single values. get_parameter_sets() builds the sets of a parameter sweep, e.g.
+        python AbstractClasses/Helper/GradingEngine.py <final results folder> defectsB=42,50 noiseB=400:600:50
+    prints the grades of all stored Fulltests for every combination and how many change their
+    grade compared to Configuration/GradingParameters.cfg.
+'''
+import os
+import sys
+import itertools
+import ConfigParser
+import ResultDataStore
+import PixelMask
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+InputsFileName = 'GradingInputs.npz'
+
+# parameter sets which are evaluated together, limits the size of the [set, ROC, pixel] arrays
+ChunkSize = 32
+
+# sub test result of the Fulltest -> (sub test result of the ROC, value, factor, limit B, limit C)
+# as in the SpecialPopulateDataParameters of the sub test results
+SubtestGradings = {
+    'Noise': ('SCurveWidths', 'mu', None, 'noiseB', 'noiseC'),
+    'VcalThresholdWidth': ('VcalThresholdTrimmed', 'sigma', 'StandardVcal2ElectronConversionFactor', 'trimmingB', 'trimmingC'),
+    'RelativeGainWidth': ('PHCalibrationGain', 'sigma/mu', None, 'gainB', 'gainC'),
+    'PedestalSpread': ('PHCalibrationPedestal', 'sigma', 'StandardVcal2ElectronConversionFactor', 'pedestalB', 'pedestalC'),
+    'Parameter1': ('PHCalibrationTan', 'mu', None, 'par1B', 'par1C'),
+}
+# N of a ROC is compared to 8 * nCols - defectsB/C, see Chip/Grading.GetSingleChipSubtestGrade
+MaxN = 8 * PixelMask.NCols
+
+FulltestName = 'CMSPixel_QualificationGroup_Fulltest_TestResult'
+
+verbose = False
+
+
+def get_sub_record(Record, Key):
+    for i in Record['SubTestResultDictList']:
+        if i['Key'] == Key:
+            return i['Record']
+    return None
+
+
+def get_value(Record, Key, Default = None):
+    try:
+        return Record['ResultData']['KeyValueDictPairs'][Key]['Value']
+    except (KeyError, TypeError):
+        return Default
+
+
+def get_histogram_array(Data):
+    '''
+        bin contents [column, row] of a 2D histogram stored by ResultDataStore, None if there is none
+    '''
+    if not isinstance(Data, dict) or 'Contents' not in Data or len(Data['Axes']) != 2:
+        return None
+    nBinsX = Data['Axes'][0][0]
+    nBinsY = Data['Axes'][1][0]
+    Contents = numpy.frombuffer(Data['Contents'], dtype = numpy.dtype(Data['TypeCode'])).astype(float)
+    return Contents.reshape(nBinsY + 2, nBinsX + 2)[1:nBinsY + 1, 1:nBinsX + 1].T[:PixelMask.NCols, :PixelMask.NRows]
+
+
+def get_stacked(Arrays):
+    '''
+        [ROC, pixel] array of the arrays of all ROCs, None if one of them is missing
+    '''
+    if not Arrays or any(Array is None or numpy.shape(Array) != (PixelMask.NCols, PixelMask.NRows) for Array in Arrays):
+        return None
+    return numpy.array([numpy.asarray(Array, dtype = float).reshape(-1) for Array in Arrays])
+
+
+def get_mask_array(Masks, chipNos):
+    return numpy.array([PixelMask.PixelMask(Mask).to_array(chipNo).reshape(-1) for Mask, chipNo in zip(Masks, chipNos)])
+
+
+def get_subtest_value(Record, ValueKey):
+    if ValueKey == 'sigma/mu':
+        mu = float(get_value(Record, 'mu'))
+        return float(get_value(Record, 'sigma')) / mu if mu > 0 else 0
+    return float(get_value(Record, ValueKey))
+
+
+def get_fulltest_inputs(Record):
+    '''
+        arrays the grade of the stored Fulltest depends on, pixel arrays are [ROC, pixel]
+    '''
+    Attributes = Record['Attributes']['Attributes']
+    ChipRecords = [i['Record'] for i in get_sub_record(Record, 'Chips')['SubTestResultDictList']]
+    chipNos = [ChipRecord['Attributes']['Attributes']['ChipNo'] for ChipRecord in ChipRecords]
+    SubRecords = lambda Key: [get_sub_record(ChipRecord, Key) for ChipRecord in ChipRecords]
+
+    Inputs = {
+        'ModuleID': numpy.array(str(Attributes['ModuleID'])),
+        'StorageKey': numpy.array(str(Attributes.get('StorageKey', ''))),
+        'TestType': numpy.array(str(Attributes['TestType'])),
+        'isDigital': numpy.array(bool(Attributes['isDigital'])),
+        'StoredModuleGrade': numpy.array(int(get_value(get_sub_record(Record, 'Grading'), 'ModuleGrade'))),
+        'StoredPixelDefectsGrade': numpy.array([int(get_value(i, 'PixelDefectsGrade')) for i in SubRecords('Grading')]),
+        'chipNos': numpy.array(chipNos),
+    }
+
+    PixelMaps = get_stacked([get_histogram_array(i['ResultData']['Plot']['ROOTObject']) for i in SubRecords('PixelMap')])
+    if PixelMaps is not None:
+        Inputs['PixelMap'] = PixelMaps
+    else:
+        Inputs['DeadPixels'] = get_mask_array([get_value(i, 'DeadPixels') for i in SubRecords('PixelMap')], chipNos)
+        Inputs['MaskDefects'] = get_mask_array([get_value(i, 'MaskDefects') for i in SubRecords('PixelMap')], chipNos)
+
+    BumpBondingMaps = get_stacked([get_histogram_array(i['ResultData']['Plot']['ROOTObject']) for i in SubRecords('BumpBondingProblems')])
+    if BumpBondingMaps is not None:
+        Inputs['BumpBonding'] = BumpBondingMaps
+        Inputs['BumpBondingMean'] = numpy.array([float(get_value(i, 'Mean')) for i in SubRecords('BumpBonding')])
+        Inputs['BumpBondingRMS'] = numpy.array([float(get_value(i, 'RMS')) for i in SubRecords('BumpBonding')])
+    else:
+        Inputs['DeadBumps'] = get_mask_array([get_value(i, 'DeadBumps') for i in SubRecords('BumpBondingProblems')], chipNos)
+
+    TrimBitDifferences1 = get_stacked([i['ResultData']['HiddenData'].get('TrimBitDifference1') for i in SubRecords('TrimBitProblems')])
+    TrimBitMinDifferences = get_stacked([i['ResultData']['HiddenData'].get('TrimBitMinDifference') for i in SubRecords('TrimBitProblems')])
+    if TrimBitDifferences1 is not None and TrimBitMinDifferences is not None:
+        Inputs['TrimBitDifference1'] = TrimBitDifferences1
+        Inputs['TrimBitMinDifference'] = TrimBitMinDifferences
+    else:
+        Inputs['DeadTrimbits'] = get_mask_array([get_value(i, 'DeadTrimbits') for i in SubRecords('TrimBitProblems')], chipNos)
+
+    Inputs['AddressProblems'] = get_mask_array([get_value(i, 'AddressDecodingProblems') for i in SubRecords('AddressDecoding')], chipNos)
+
+    Subtests = []
+    for Name in sorted(SubtestGradings):
+        if get_sub_record(Record, Name) is None:
+            continue
+        DataKey, ValueKey = SubtestGradings[Name][:2]
+        Inputs[Name + '.Value'] = numpy.array([get_subtest_value(i, ValueKey) for i in SubRecords(DataKey)])
+        Inputs[Name + '.N'] = numpy.array([float(get_value(i, 'N')) for i in SubRecords(DataKey)])
+        Subtests.append(Name)
+    Inputs['Subtests'] = numpy.array(Subtests, dtype = str)
+
+    IVRecord = get_sub_record(Record, 'IVCurve')
+    Inputs['CurrentAtVoltage150V'] = numpy.array(float(get_value(IVRecord, 'CurrentAtVoltage150V', 0)) if IVRecord else 0.)
+    Inputs['Variation'] = numpy.array(float(get_value(IVRecord, 'Variation', 0)) if IVRecord else 0.)
+    Inputs['RecalculatedCurrentAtVoltage150V'] = numpy.array(float(get_value(IVRecord, 'recalculatedCurrentAtVoltage150V', 0)) if IVRecord else 0.)
+    Inputs['RecalculatedCurrentVariation'] = numpy.array(float(get_value(IVRecord, 'recalculatedCurrentVariation', 0)) if IVRecord else 0.)
+    return Inputs
+
+
+def get_fulltest_records(Record):
+    if Record['Attributes'].get('Name') == FulltestName:
+        return [Record]
+    return [i for SubTestResultDict in Record['SubTestResultDictList'] for i in get_fulltest_records(SubTestResultDict['Record'])]
+
+
+def load_inputs(FinalModuleResultsPath):
+    '''
+        inputs of all Fulltests of a stored qualification, read from the cache if the store did not change
+    '''
+    StoreFileName = ResultDataStore.get_store_file_name(FinalModuleResultsPath)
+    CacheFileName = FinalModuleResultsPath + '/' + InputsFileName
+    FileStat = os.stat(StoreFileName)
+    Source = numpy.array([FileStat.st_size, int(FileStat.st_mtime)], dtype = 'int64')
+    if os.path.exists(CacheFileName):
+        try:
+            Cache = numpy.load(CacheFileName)
+            if numpy.array_equal(Cache['@source'], Source):
+                InputsList = [{} for i in range(int(Cache['@n']))]
+                for Key in Cache.files:
+                    if '/' in Key:
+                        Index, Name = Key.split('/', 1)
+                        InputsList[int(Index)][Name] = Cache[Key]
+                return InputsList
+        except Exception as e:
+            if verbose:
+                print 'cannot read %s: %s' % (CacheFileName, e)
+
+    Data = ResultDataStore.read(StoreFileName)
+    if Data is None:
+        return []
+    InputsList = []
+    for Record in get_fulltest_records(Data['Record']):
+        try:
+            InputsList.append(get_fulltest_inputs(Record))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            print '\x1b[31mcannot regrade %s %s: %r\x1b[0m' % (FinalModuleResultsPath, Record['Attributes'].get('Key'), e)
+    Arrays = {'@source': Source, '@n': numpy.array(len(InputsList))}
+    for Index, Inputs in enumerate(InputsList):
+        for Name, Array in Inputs.items():
+            Arrays['%d/%s' % (Index, Name)] = Array
+    try:
+        numpy.savez(CacheFileName, **Arrays)
+    except (IOError, OSError) as e:
+        if verbose:
+            print 'cannot write %s: %s' % (CacheFileName, e)
+    return InputsList
+
+
+def get_parameter_sets(GradingParameters, Sweep = None):
+    '''
+        all combinations of the values in Sweep (parameter -> list of values), the other parameters
+        as in GradingParameters, returns parameter -> array with one value per set
+    '''
+    Sweep = Sweep or {}
+    Names = sorted(Sweep)
+    Combinations = list(itertools.product(*[Sweep[Name] for Name in Names]))
+    Parameters = dict((Name, numpy.repeat(float(Value), len(Combinations))) for Name, Value in GradingParameters.items())
+    # optional in PixelMap
+    Parameters.setdefault('PixelMapMaskDefectUpperThreshold', numpy.zeros(len(Combinations)))
+    for Index, Name in enumerate(Names):
+        Parameters[Name] = numpy.array([float(Combination[Index]) for Combination in Combinations])
+    return Parameters
+
+
+# The grading rules, the arguments are single values in the analysis and arrays which are
+# broadcast against each other in grade(), e.g. the bin contents [set, ROC, pixel] and a limit [set, 1, 1]
+
+def get_pixel_alive_defects(PixelMapValues, PixelMapMaxValue, PixelMapMaskDefectUpperThreshold):
+    '''
+        dead, noisy and mask defect pixels of the pixel alive map, every pixel is only in the first class it qualifies for
+    '''
+    Dead = PixelMapValues == 0
+    Noisy = ~Dead & (PixelMapValues > PixelMapMaxValue)
+    MaskDefect = ~(Dead | Noisy) & (PixelMapValues < PixelMapMaskDefectUpperThreshold)
+    return Dead, Noisy, MaskDefect
+
+
+def get_bump_bonding_threshold(isDigital, Mean, RMS, nSigma, minThrDiff):
+    '''
+        bumps whose threshold difference is at least the returned value are dead
+    '''
+    if isDigital:
+        return Mean + nSigma * RMS
+    return minThrDiff
+
+
+def is_dead_trim_bit(TrimBitDifference, TrimBit, GradingTrimBitDifference, excludeTrimBit14):
+    '''
+        TrimBitDifference is the difference of the maps of TrimBit (1..4) and without trimming
+    '''
+    return (TrimBitDifference <= GradingTrimBitDifference) & ((excludeTrimBit14 == 0) | (TrimBit != 1))
+
+
+def get_pixel_defects_grade(nDefects, defectsB, defectsC):
+    # 1 below defectsB, otherwise 2 below defectsC and 3 above
+    return 1 + (nDefects >= defectsB) * (1 + (nDefects >= defectsC))
+
+
+def get_subtest_limits(Value, N, LimitB, LimitC, defectsB, defectsC):
+    '''
+        whether the value of a ROC or its number of pixels N exceeds the limits of grade B and C
+    '''
+    return (Value > LimitB) | (N < MaxN - defectsB), (Value > LimitC) | (N < MaxN - defectsC)
+
+
+def is_bad_roc(nDefects):
+    return nDefects > 0.01 * PixelMask.PixelsPerROC
+
+
+def get_module_limits(BadRocs, TestType, CurrentAtVoltage150V, Variation, RecalculatedCurrentAtVoltage150V,
+                      RecalculatedCurrentVariation, GradingParameters):
+    '''
+        whether the number of bad ROCs and the IV curve exceed the limits of grade B and C
+    '''
+    GradeB = BadRocs > 1
+    GradeC = BadRocs > 2
+    if TestType == 'p17_1':
+        GradeB = GradeB | (CurrentAtVoltage150V > GradingParameters['currentB']) | (Variation > GradingParameters['slopeivB'])
+        GradeC = GradeC | (CurrentAtVoltage150V > GradingParameters['currentC'])
+    else:
+        # the recalculated values are only used if they were determined
+        if RecalculatedCurrentAtVoltage150V:
+            GradeB = GradeB | (RecalculatedCurrentAtVoltage150V > GradingParameters['currentBm10'])
+        if RecalculatedCurrentVariation:
+            GradeB = GradeB | (RecalculatedCurrentVariation > GradingParameters['slopeivB'])
+        GradeC = GradeC | (RecalculatedCurrentAtVoltage150V > GradingParameters['currentCm10'])
+    return GradeB, GradeC
+
+
+def count_defects(Inputs, Parameters):
+    '''
+        number of defect pixels [set, ROC] as in the TotalList of Chip/Grading
+    '''
+    nSets = len(Parameters['defectsB'])
+    Column = lambda Name: Parameters[Name][:, None, None]
+    Shape = Inputs['AddressProblems'].shape
+    Total = numpy.zeros((nSets,) + Shape, dtype = bool)
+
+    if 'PixelMap' in Inputs:
+        Dead, Noisy, MaskDefect = get_pixel_alive_defects(Inputs['PixelMap'], Column('PixelMapMaxValue'),
+                                                          Column('PixelMapMaskDefectUpperThreshold'))
+        Total |= Dead | MaskDefect
+    else:
+        Total |= Inputs['DeadPixels'] | Inputs['MaskDefects']
+
+    if 'BumpBonding' in Inputs:
+        Total |= Inputs['BumpBonding'] >= get_bump_bonding_threshold(Inputs['isDigital'],
+                Inputs['BumpBondingMean'][None, :, None], Inputs['BumpBondingRMS'][None, :, None],
+                Column('BumpBondingProblemsNSigma'), Column('minThrDiff'))
+    else:
+        Total |= Inputs['DeadBumps']
+
+    # the trim bits 2..4 only count through their minimum difference
+    if 'TrimBitMinDifference' in Inputs:
+        Total |= is_dead_trim_bit(Inputs['TrimBitMinDifference'], 2, Column('TrimBitDifference'), Column('excludeTrimBit14'))
+        Total |= is_dead_trim_bit(Inputs['TrimBitDifference1'], 1, Column('TrimBitDifference'), Column('excludeTrimBit14'))
+    else:
+        Total |= Inputs['DeadTrimbits']
+
+    Total |= Inputs['AddressProblems']
+    return Total.sum(axis = 2)
+
+
+def grade(Inputs, Parameters):
+    '''
+        grades of one Fulltest for all parameter sets, returns the arrays
+        ModuleGrade [set], BadRocs [set], nDefects [set, ROC] and PixelDefectsGrade [set, ROC]
+    '''
+    if numpy is None:
+        raise ImportError('numpy is needed for the GradingEngine')
+    Parameters = dict((Name, numpy.asarray(Values, dtype = float)) for Name, Values in Parameters.items())
+    nSets = len(Parameters['defectsB'])
+    nDefects = numpy.empty((nSets, len(Inputs['chipNos'])), dtype = int)
+    for Start in range(0, nSets, ChunkSize):
+        Chunk = dict((Name, Values[Start:Start + ChunkSize]) for Name, Values in Parameters.items())
+        nDefects[Start:Start + ChunkSize] = count_defects(Inputs, Chunk)
+
+    # [set, 1] against the [set, ROC] arrays
+    RocColumn = lambda Name: Parameters[Name][:, None]
+    PixelDefectsGrade = get_pixel_defects_grade(nDefects, RocColumn('defectsB'), RocColumn('defectsC'))
+    # the pixel defects only count for the module grade through the bad ROCs
+    BadRocs = is_bad_roc(nDefects).sum(axis = 1)
+    GradeB, GradeC = get_module_limits(BadRocs, str(Inputs['TestType']), Inputs['CurrentAtVoltage150V'], Inputs['Variation'],
+                                       Inputs['RecalculatedCurrentAtVoltage150V'], Inputs['RecalculatedCurrentVariation'], Parameters)
+    for Name in Inputs['Subtests']:
+        DataKey, ValueKey, Factor, LimitB, LimitC = SubtestGradings[Name]
+        Value = Inputs[Name + '.Value'][None, :] * (RocColumn(Factor) if Factor else 1.)
+        SubtestB, SubtestC = get_subtest_limits(Value, Inputs[Name + '.N'][None, :], RocColumn(LimitB), RocColumn(LimitC),
+                                                RocColumn('defectsB'), RocColumn('defectsC'))
+        GradeB = GradeB | SubtestB.any(axis = 1)
+        GradeC = GradeC | SubtestC.any(axis = 1)
+
+    return {
+        'ModuleGrade': numpy.where(GradeC, 3, numpy.where(GradeB, 2, 1)),
+        'BadRocs': BadRocs,
+        'nDefects': nDefects,
+        'PixelDefectsGrade': PixelDefectsGrade,
+    }
+
+
+def find_stores(Folder):
+    '''
+        final results folders with a ResultDataStore below Folder
+    '''
+    Folders = []
+    for Directory, SubDirectories, Files in os.walk(Folder):
+        if ResultDataStore.StoreFileName in Files:
+            Folders.append(Directory)
+            # the other folders belong to the same qualification
+            del SubDirectories[:]
+    return sorted(Folders)
+
+
+def read_grading_parameters(FileName):
+    Configuration = ConfigParser.ConfigParser()
+    Configuration.optionxform = str
+    Configuration.read(FileName)
+    return dict((Option, float(Configuration.get('GradingParameters', Option))) for Option in Configuration.options('GradingParameters'))
+
+
+def get_sweep_values(Argument):
+    '''
+        values of name=v1,v2,... or name=start:stop:step (stop included)
+    '''
+    if ':' in Argument:
+        Start, Stop, Step = [float(i) for i in Argument.split(':')]
+        return list(numpy.arange(Start, Stop + Step / 2., Step))
+    return [float(i) for i in Argument.split(',')]
+
+
+if __name__ == '__main__':
+    Arguments = sys.argv[1:]
+    if not Arguments or any('=' not in Argument for Argument in Arguments[1:]):
+        print 'usage: %s <final results folder> [<parameter>=<value>,<value>,... | <parameter>=<start>:<stop>:<step>] ...' % sys.argv[0]
+        sys.exit(1)
+    # the directory which contains AbstractClasses, the stored pixel masks refer to it
+    BaseDirectory = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.path.insert(0, BaseDirectory)
+    GradingParameters = read_grading_parameters(BaseDirectory + '/Configuration/GradingParameters.cfg')
+    Sweep = dict((Argument.split('=', 1)[0], get_sweep_values(Argument.split('=', 1)[1])) for Argument in Arguments[1:])
+    for Name in Sweep:
+        if Name not in GradingParameters:
+            print 'unknown grading parameter %s' % Name
+            sys.exit(1)
+
+    InputsList = []
+    for Folder in find_stores(Arguments[0]):
+        InputsList.extend(load_inputs(Folder))
+    print '%d Fulltests' % len(InputsList)
+
+    Configured = get_parameter_sets(GradingParameters)
+    Parameters = get_parameter_sets(GradingParameters, Sweep)
+    ConfiguredGrades = []
+    Grades = []
+    nAsStored = 0
+    for Inputs in InputsList:
+        ConfiguredGrade = grade(Inputs, Configured)
+        nAsStored += int(ConfiguredGrade['ModuleGrade'][0] == Inputs['StoredModuleGrade']
+                         and (ConfiguredGrade['PixelDefectsGrade'][0] == Inputs['StoredPixelDefectsGrade']).all())
+        ConfiguredGrades.append(ConfiguredGrade['ModuleGrade'][0])
+        Grades.append(grade(Inputs, Parameters)['ModuleGrade'])
+    print '%d of %d Fulltests are graded as stored with the configured parameters' % (nAsStored, len(InputsList))
+    if not InputsList:
+        sys.exit(0)
+
+    Grades = numpy.array(Grades)
+    Changed = Grades != numpy.array(ConfiguredGrades)[:, None]
+    ModuleIDs = numpy.array([str(Inputs['ModuleID']) for Inputs in InputsList])
+    Names = sorted(Sweep)
+    print ' '.join('%12s' % Name for Name in Names) + ' %6s %6s %6s %10s %10s' % ('A', 'B', 'C', 'changed', 'modules')
+    for Set in range(Grades.shape[1]):
+        print ' '.join('%12g' % Parameters[Name][Set] for Name in Names) + ' %6d %6d %6d %10d %10d' % (
+            (Grades[:, Set] == 1).sum(), (Grades[:, Set] == 2).sum(), (Grades[:, Set] == 3).sum(),
+            Changed[:, Set].sum(), len(set(ModuleIDs[Changed[:, Set]])))
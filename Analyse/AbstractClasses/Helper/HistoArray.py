@@ -0,0 +1,63 @@
+import PixelMask
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# histograms can be converted to arrays, i.e. numpy is installed
+available = numpy is not None
+
+# numpy type of the bin content buffer for the different histogram classes
+_BufferTypes = [
+    ('TArrayD', 'float64'),
+    ('TArrayF', 'float32'),
+    ('TArrayI', 'int32'),
+    ('TArrayS', 'int16'),
+    ('TArrayC', 'int8'),
+]
+
+verbose = False
+
+
+def get_array(histo):
+    '''
+        Bin contents of a TH2 as numpy array with shape (nBinsX, nBinsY), i.e. array[col, row]
+        is histo.GetBinContent(col + 1, row + 1). Under- and overflow bins are not included.
+        If possible the array is a view on the bin content buffer of the histogram,
+        changes of the histogram are visible in the array and it must not be used after the
+        histogram is deleted or rebinned.
+    '''
+    if numpy is None:
+        raise ImportError('numpy is needed to convert histograms to arrays')
+    nBinsX = histo.GetNbinsX()
+    nBinsY = histo.GetNbinsY()
+    array = None
+    for bufferClass, dtype in _BufferTypes:
+        if histo.InheritsFrom(bufferClass):
+            try:
+                buffer = numpy.frombuffer(histo.GetArray(), dtype = dtype, count = (nBinsX + 2) * (nBinsY + 2))
+                # the buffer is ordered bin = binX + (nBinsX + 2) * binY
+                array = buffer.reshape(nBinsY + 2, nBinsX + 2)[1:nBinsY + 1, 1:nBinsX + 1].T
+            except (TypeError, ValueError, AttributeError) as e:
+                if verbose:
+                    print 'cannot access buffer of %s: %s' % (histo.GetName(), e)
+            break
+    if array is None:
+        array = numpy.array([[histo.GetBinContent(binX, binY) for binY in range(1, nBinsY + 1)] for binX in range(1, nBinsX + 1)])
+    return array
+
+
+def get_pixel_set(mask, chipNo):
+    '''
+        set of (chipNo, column, row) for all pixels where mask is True, as used for the pixel lists
+    '''
+    columns, rows = numpy.nonzero(mask)
+    return set((chipNo, int(column), int(row)) for column, row in zip(columns, rows))
+
+
+def get_pixel_mask(mask, chipNo):
+    '''
+        PixelMask of all pixels where mask is True
+    '''
+    return PixelMask.PixelMask.from_array(mask, chipNo)
@@ -1,7 +1,129 @@
-
-import ROOT
+import os
+from collections import OrderedDict
 verbose = False
+
+# maximum number of fetched objects kept per file
+CacheSize = 2000
+
+# id(rootfile) -> FileCache, the file is kept to make sure the id is not reused
+_FileCaches = {}
+# (file name, file size, modification time) -> {directory path: (set of key names, {prefix: [key names]})},
+# shared by all handles of the same file and removed with the last of them
+_KeyIndexes = {}
+_Statistics = {
+    'Hits': 0,
+    'Misses': 0,
+    'Evictions': 0,
+    'IndexedDirectories': 0,
+}
+
+def get_file_signature(rootfile):
+    try:
+        mtime = os.stat(rootfile.GetName()).st_mtime
+    except OSError:
+        # e.g. remote files, the modification date in the header of the file
+        mtime = rootfile.GetModificationDate().Convert()
+    return (rootfile.GetName(), rootfile.GetSize(), mtime)
+
+def get_key_index(signature, path, dir):
+    indexes = _KeyIndexes.setdefault(signature, {})
+    if path not in indexes:
+        keys = set()
+        buckets = {}
+        for key in dir.GetListOfKeys():
+            keyName = key.GetName()
+            if keyName in keys:
+                continue
+            keys.add(keyName)
+            # find_histo looks for keys starting with the part before the first '_' and '_',
+            # keys without '_' do not start with such a prefix
+            buckets.setdefault(keyName.split('_')[0] + '_' if '_' in keyName else keyName, []).append(keyName)
+        indexes[path] = (keys, buckets)
+        _Statistics['IndexedDirectories'] += 1
+    return indexes[path]
+
+class FileCache:
+    '''
+        directories of one ROOT file handle and the objects already fetched from it
+    '''
+    def __init__(self, rootfile):
+        self.RootFile = rootfile
+        self.Signature = get_file_signature(rootfile)
+        # directory path -> (directory, set of key names, {prefix: [key names]})
+        self.Directories = {}
+        self.Objects = OrderedDict()
+
+    def get_directory(self, path):
+        '''
+            directory with the dotted path and its key index, None if it does not exist
+        '''
+        if path not in self.Directories:
+            if not path:
+                dir = self.RootFile
+            else:
+                parent = self.get_directory(path.rsplit('.', 1)[0] if '.' in path else '')
+                dir = parent[0].Get(path.split('.')[-1]) if parent else None
+            if not dir or not hasattr(dir, 'GetListOfKeys'):
+                self.Directories[path] = None
+            else:
+                self.Directories[path] = (dir,) + get_key_index(self.Signature, path, dir)
+        return self.Directories[path]
+
+    def get_cached(self, cacheKey):
+        if cacheKey in self.Objects:
+            _Statistics['Hits'] += 1
+            value = self.Objects.pop(cacheKey)
+            self.Objects[cacheKey] = value
+            return True, value
+        _Statistics['Misses'] += 1
+        return False, None
+
+    def add(self, cacheKey, value):
+        self.Objects[cacheKey] = value
+        while len(self.Objects) > CacheSize:
+            self.Objects.popitem(last = False)
+            _Statistics['Evictions'] += 1
+
+def remove_closed_files():
+    '''
+        objects of closed files are deleted by ROOT, their caches and unused key indexes are removed
+    '''
+    for key in [key for key, value in _FileCaches.items() if not value.RootFile.IsOpen()]:
+        del _FileCaches[key]
+    used = set(value.Signature for value in _FileCaches.values())
+    for signature in [signature for signature in _KeyIndexes if signature not in used]:
+        del _KeyIndexes[signature]
+
+def get_file_cache(rootfile):
+    entry = _FileCaches.get(id(rootfile))
+    if entry is None or not rootfile.IsOpen():
+        entry = FileCache(rootfile)
+        _FileCaches[id(rootfile)] = entry
+        remove_closed_files()
+    return entry
+
+def clear_cache(rootfile = None):
+    '''
+        forget index and fetched objects of one or all files, has to be done before a file is closed
+    '''
+    if rootfile is None:
+        _FileCaches.clear()
+        _KeyIndexes.clear()
+    else:
+        _FileCaches.pop(id(rootfile), None)
+        remove_closed_files()
+
+def get_cache_statistics():
+    '''
+        number of cache hits, misses, evicted objects and indexed directories
+    '''
+    statistics = dict(_Statistics)
+    statistics['CachedFiles'] = len(_FileCaches)
+    statistics['CachedObjects'] = sum(len(i.Objects) for i in _FileCaches.values())
+    return statistics
+
 def get_histo(rootfile,name,rocNo = None):
+    import ROOT
     histoname = name
     if rocNo !=None:
         try:
@@ -9,50 +131,103 @@ def get_histo(rootfile,name,rocNo = None):
         except TypeError:
             print 'cannot append RocNo: ',rocNo,' at ', histoname
 
-    histoname = histoname.split('.')
     if not type(rootfile) == ROOT.TFile:
         print 'INVALID input: ROOTFILE'
         raise TypeError('Cannot use %s as a ROOT TFile'%type(rootfile))
-    dir = rootfile
-    for  i in histoname:
-        if histoname.index(i) == len(histoname) - 1:
-            break
-        dir = dir.Get(i)
-        if dir==None:
-            break
-    if dir == None:
+    fileCache = get_file_cache(rootfile)
+    cacheKey = (name, histoname, rocNo)
+    found, histo = fileCache.get_cached(cacheKey)
+    if found:
+        return histo
+    histo = find_histo(fileCache, name, histoname, rocNo)
+    # misses are not cached, the object can still be written to the open file
+    if histo:
+        fileCache.add(cacheKey, histo)
+    return histo
+
+def find_histo(fileCache, name, histoname, rocNo):
+    histoname = histoname.split('.')
+    directory = fileCache.get_directory('.'.join(histoname[:-1]))
+    if directory is None:
         return None
+    dir, keys, buckets = directory
+    # not only keys, also objects in memory and names with a cycle
     histo = dir.Get(histoname[-1])
     if not histo:
         if verbose and 'Xray.' not in name:
             dir.GetListOfKeys().Print()
             raw_input('Cannot find key: %s'%histoname)
     if name.startswith('Xray.q_') or not histo:
-        l = []
         if verbose: print 'FIND: ',name,histoname
-        l = []
         key = histoname[-1].split('_')[0]+'_'
         if verbose: print 'KEY: ',key
-        for i in dir.GetListOfKeys():
-            if i.GetName().startswith(key):
-                l.append(i)
+        l = buckets.get(key, [])
         if verbose: print l
         if rocNo != None:
             # rocNo = 0
-            l = filter(lambda x: 'C{ROC}_'.format(ROC=rocNo) in x.GetName(), l)
+            l = filter(lambda x: 'C{ROC}_'.format(ROC=rocNo) in x, l)
         if len(l) == 1:
-            histo = dir.Get(l[0].GetName())
+            histo = dir.Get(l[0])
         elif len(l) > 1:
             histo = None
             raise NameError('Found more than one possible candidate for the Xray spectrum: {Candidates}'.format(Candidates=l))
         else:
             histo = None
-            all_names = []
-            for i in dir.GetListOfKeys():
-                all_names.append(i.GetName())
+            all_names = sorted(keys)
             try:
                 raise NameError("Didn't found any possible candidate for the Xray spectrum: {Name} in {Names}".format(Name=name,Names=all_names))
             except NameError:
                 print 'The histogram ',histoname , ' was not found'
 
     return histo
+
+# file name of the ROOT file -> (numpy store with the bin contents of its histograms, arrays read from it, path of the store)
+_ArrayStores = {}
+
+def use_array_store(rootfile, HistoDict, nRocs, storePath):
+    '''
+        serve get_histo_array for this ROOT file from a HistoStore in storePath,
+        the store is created on first use
+    '''
+    import AbstractClasses.Helper.HistoStore as HistoStore
+    if HistoStore.numpy is None:
+        return False
+    try:
+        _ArrayStores[rootfile.GetName()] = (HistoStore.open_store(rootfile, HistoDict, nRocs, storePath), {}, storePath)
+    except (IOError, OSError) as e:
+        print 'cannot use histogram store %s: %s' % (storePath, e)
+        return False
+    return True
+
+def reopen_array_stores():
+    '''
+        open all stores again, needed in forked processes which must not share the file position
+    '''
+    import numpy
+    for name, (store, arrays, storePath) in _ArrayStores.items():
+        _ArrayStores[name] = (numpy.load(storePath), arrays, storePath)
+
+def get_histo_array(rootfile, name, rocNo = None):
+    '''
+        bin contents of a histogram as numpy array (see HistoArray.get_array),
+        read from the histogram store if there is one for this file. The array is a copy,
+        histograms read from the file are deleted when it is closed.
+    '''
+    histoname = name
+    if rocNo != None:
+        try:
+            histoname = histoname%rocNo
+        except TypeError:
+            print 'cannot append RocNo: ',rocNo,' at ', histoname
+    if rootfile.GetName() in _ArrayStores:
+        store, arrays = _ArrayStores[rootfile.GetName()][:2]
+        if histoname not in arrays and histoname in store.files:
+            arrays[histoname] = store[histoname]
+        if histoname in arrays:
+            return arrays[histoname].copy()
+    import numpy
+    import AbstractClasses.Helper.HistoArray as HistoArray
+    histo = get_histo(rootfile, name, rocNo)
+    if not histo:
+        return None
+    return numpy.array(HistoArray.get_array(histo))
@@ -0,0 +1,108 @@
+'''
+    Columnar store of the histograms of one test session which are only used as arrays.
+    The histograms of ArrayHistograms are read once from the ROOT file and written as numpy
+    arrays to a .npz file, later analyses read their bin contents from there with
+    HistoGetter.get_histo_array instead of going through ROOT I/O. Histograms which are drawn
+    are read from the ROOT file anyway and are not stored, so the Fulltest still opens the ROOT
+    file in every analysis. Regradings without ROOT I/O use the stored results, see GradingEngine.py.
+    The store is rewritten if size or modification time of the ROOT file changed.
+'''
+import os
+import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.HistoArray as HistoArray
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+StoreFileName = 'HistoStore.npz'
+
+# HistoDict section -> options of the histograms which are read with HistoGetter.get_histo_array
+ArrayHistograms = {
+    'TrimBitProblems': ['TrimBitMap%d' % k for k in range(5)],
+}
+
+verbose = False
+
+
+def get_source_signature(rootfile):
+    FileStat = os.stat(rootfile.GetName())
+    return numpy.array([FileStat.st_size, int(FileStat.st_mtime)], dtype = 'int64')
+
+
+def get_histogram_names(HistoDict, nRocs):
+    '''
+        names of the ArrayHistograms in the HistoDict, names with %d are expanded for all ROCs
+    '''
+    Names = set()
+    for Section, Options in ArrayHistograms.items():
+        for Option in Options:
+            if not HistoDict.has_option(Section, Option):
+                continue
+            Name = HistoDict.get(Section, Option).strip()
+            if '%d' in Name:
+                for RocNo in range(nRocs):
+                    try:
+                        Names.add(Name % RocNo)
+                    except TypeError:
+                        pass
+            elif Name:
+                Names.add(Name)
+    return sorted(Names)
+
+
+def get_contents(histo):
+    '''
+        bin contents without under- and overflow as returned by HistoArray.get_array
+        and the axis ranges [nBinsX, xMin, xMax, nBinsY, yMin, yMax]
+    '''
+    nBinsX = histo.GetNbinsX()
+    nBinsY = histo.GetNbinsY()
+    Axes = numpy.array([
+        nBinsX, histo.GetXaxis().GetXmin(), histo.GetXaxis().GetXmax(),
+        nBinsY, histo.GetYaxis().GetXmin(), histo.GetYaxis().GetXmax(),
+    ], dtype = 'float64')
+    return numpy.array(HistoArray.get_array(histo)), Axes
+
+
+def extract(rootfile, HistoDict, nRocs, StorePath):
+    '''
+        reads the ArrayHistograms which exist in the ROOT file and writes them to StorePath
+        returns the number of stored histograms
+    '''
+    TopLevelKeys = set(Key.GetName() for Key in rootfile.GetListOfKeys())
+    Arrays = {'@source': get_source_signature(rootfile)}
+    for Name in get_histogram_names(HistoDict, nRocs):
+        # names of psi46expert files can have a cycle, e.g. CalThresholdMap_C0;2
+        if Name.split('.')[0].split(';')[0] not in TopLevelKeys:
+            continue
+        try:
+            histo = HistoGetter.get_histo(rootfile, Name)
+        except Exception as e:
+            if verbose:
+                print 'cannot read %s: %s' % (Name, e)
+            continue
+        if not histo or not histo.InheritsFrom('TH1') or histo.GetDimension() > 2:
+            continue
+        Arrays[Name], Arrays[Name + '@axes'] = get_contents(histo)
+    numpy.savez(StorePath, **Arrays)
+    if verbose:
+        print 'stored %d histograms in %s' % (len(Arrays) // 2, StorePath)
+    return len(Arrays) // 2
+
+
+def open_store(rootfile, HistoDict, nRocs, StorePath):
+    '''
+        returns the store for the ROOT file, it is (re)created if it does not exist or is outdated
+    '''
+    if os.path.exists(StorePath):
+        try:
+            Store = numpy.load(StorePath)
+            if (Store['@source'] == get_source_signature(rootfile)).all():
+                return Store
+            Store.close()
+        except Exception as e:
+            if verbose:
+                print 'cannot read %s: %s' % (StorePath, e)
+    extract(rootfile, HistoDict, nRocs, StorePath)
+    return numpy.load(StorePath)
@@ -43,21 +43,126 @@
  * @author Kasper Skårhøj <kasperYYYY@typo3.com>
  '''
 import re,cgi
+
+class Template(object):
+    '''
+        A template string which is parsed only once: the subparts found in it (which are
+        templates themselves) and its content split into text fragments and marker slots.
+    '''
+    def __init__(self, content):
+        self.content = content
+        # marker -> content of the subpart
+        self.subparts = {}
+        # (marker, recursive) -> fragments which are joined with the subpart content, False if not possible
+        self.subpartFragments = {}
+        # [text, marker, text, marker, ..., text], False if the markers can not be substituted in one pass
+        self.markerFragments = None
+
 class HtmlParser:
 
     caseShift_cache = {};
 
     # Void elements that do not have closing tags, as defined by HTML5, except link element
     VOID_ELEMENTS = 'area|base|br|col|command|embed|hr|img|input|keygen|meta|param|source|track|wbr'
+
+    # maximum number of parsed templates, the cache is cleared if it is reached
+    TemplateCacheSize = 1000
+    MarkerPattern = re.compile('(###[A-Z0-9_]+###)')
+    # text around a marker which can form another marker with it or with the content substituted for it
+    MarkerNamePattern = re.compile('#{0,2}[A-Z0-9_]*###')
+    MarkerNameEndPattern = re.compile('###[A-Z0-9_]*#{0,2}$')
+    MarkerNameCharsPattern = re.compile('#{0,2}[A-Z0-9_]*#{0,2}$')
+    # placeholder for the subpart content when the fragments of a subpart are created
+    FragmentSeparator = '\x00'
+
+    def __init__(self):
+        self.clearTemplateCache()
+
+    def clearTemplateCache(self):
+        self.templates = {}
+
+    '''
+    * Returns the parsed template of content, templates are content strings which were passed to
+    * or returned by getSubpart()
+    *
+    * @param string content Template content
+    * @param boolean create If not set, None is returned for content which is not parsed yet
+    * @return Template
+    '''
+    def getTemplate(self, content, create = True):
+        template = self.templates.get(content)
+        if template is None and create:
+            if len(self.templates) >= self.TemplateCacheSize:
+                self.clearTemplateCache()
+            template = Template(content)
+            self.templates[content] = template
+        return template
+
+    '''
+    * Removes a "<!-- ..." at the end of content (the start of the comment around a marker)
+    *
+    * @param string content
+    * @return string content without the comment, None if there is none
+    '''
+    def stripCommentEnd(self, content):
+        start = content.rfind('<!--')
+        if start < 0 or content.find('>', start + 4) >= 0:
+            return None
+        return content[:start]
+
+    '''
+    * Removes a "... -->" at the beginning of content (the end of the comment around a marker)
+    *
+    * @param string content
+    * @return string content without the comment, None if there is none
+    '''
+    def stripCommentStart(self, content):
+        tagStart = content.find('<')
+        if tagStart < 0:
+            tagStart = len(content)
+        stop = content.rfind('-->', 0, tagStart)
+        if stop < 0:
+            return None
+        return content[stop + 3:]
+
+    '''
+    * Removes the comments around a subpart, "<!-- ###MARKER### -->subpart<!-- ###MARKER### -->"
+    *
+    * @param string content Content between the markers
+    * @return string
+    '''
+    def stripSubpartComments(self, content):
+        stripped = self.stripCommentStart(content)
+        if stripped is not None:
+            strippedBoth = self.stripCommentEnd(stripped)
+            if strippedBoth is not None:
+                return strippedBoth
+        strippedEnd = self.stripCommentEnd(content)
+        if strippedEnd is not None:
+            return strippedEnd
+        if stripped is not None:
+            return stripped
+        return content
+
     '''
     * Returns the first subpart encapsulated in the marker, marker
     * (possibly present in content as a HTML comment)
+    * The subpart is parsed only once per template and marker.
     *
     * @param string content Content with subpart wrapped in fx. "###CONTENT_PART###" inside.
     * @param string marker Marker string, eg. "###CONTENT_PART###
     * @return string
     '''
     def getSubpart(self, content, marker):
+        template = self.getTemplate(content)
+        subpart = template.subparts.get(marker)
+        if subpart is None:
+            subpart = self.parseSubpart(content, marker)
+            template.subparts[marker] = subpart
+            self.getTemplate(subpart)
+        return subpart
+
+    def parseSubpart(self, content, marker):
         start = content.find( marker);
         if start < 0 :
             return '';
@@ -71,29 +176,7 @@ class HtmlParser:
             return '';
         
     
-        content = content[start:stop];
-        matches = {};
-        
-        matches = re.search('^([^\\<]*\\-\\-\\>)((.|\n)*)(\\<\\!\\-\\-[^\\>]*)$', content)
-        if matches :
-            return matches.group(2);
-        
-    
-        # Resetting matches
-        matches = {};
-        matches = re.search('((.|\n)*)(\\<\\!\\-\\-[^\\>]*)$', content)
-        if matches :
-            return matches.group(1);
-        
-    
-        # Resetting matches
-        matches = {};
-        matches = re.search('^([^\\<]*\\-\\-\\>)((.|\n)*)$', content)
-        if matches :
-            return matches.group(2);
-        
-    
-        return content;
+        return self.stripSubpartComments(content[start:stop]);
     
     '''
     * Substitutes a subpart in content with the content of subpartContent.
@@ -106,6 +189,34 @@ class HtmlParser:
     * @return string Processed input content
     '''
     def substituteSubpart(self, content, marker, subpartContent, recursive = True, keepMarker = False) :
+        template = self.getTemplate(content, False)
+        if template is not None and not keepMarker and isinstance(subpartContent, basestring):
+            fragments = self.getSubpartFragments(template, marker, recursive)
+            # a "-->" in the content of a repeated subpart changes how the comments after it are removed
+            if fragments and (len(fragments) <= 2 or '-->' not in subpartContent):
+                return subpartContent.join(fragments)
+        return self.substituteSubpartUncached(content, marker, subpartContent, recursive, keepMarker)
+
+    '''
+    * Returns the parts of a template around the subpart, joined with the subpart content
+    * they give the same as substituteSubpart()
+    *
+    * @param Template template
+    * @param string marker Marker string, eg. "###CONTENT_PART###
+    * @param boolean recursive See substituteSubpart()
+    * @return list of strings, False if the template contains the FragmentSeparator
+    '''
+    def getSubpartFragments(self, template, marker, recursive = True):
+        fragments = template.subpartFragments.get((marker, recursive))
+        if fragments is None:
+            if self.FragmentSeparator in template.content:
+                fragments = False
+            else:
+                fragments = self.substituteSubpartUncached(template.content, marker, self.FragmentSeparator, recursive).split(self.FragmentSeparator)
+            template.subpartFragments[(marker, recursive)] = fragments
+        return fragments
+
+    def substituteSubpartUncached(self, content, marker, subpartContent, recursive = True, keepMarker = False) :
         start = content.find( marker);
         if start < 0  :
             return content;
@@ -122,7 +233,7 @@ class HtmlParser:
         after = content[stopAM:];
         between = content[startAM:stop - startAM];
         if recursive :
-            after = self.substituteSubpart(after, marker, subpartContent, recursive, keepMarker);
+            after = self.substituteSubpartUncached(after, marker, subpartContent, recursive, keepMarker);
         
     
         if keepMarker :
@@ -152,34 +263,17 @@ class HtmlParser:
     
         
         else :
-            matches = {};
-            matches = re.search('^((.|\n)*)\\<\\!\\-\\-[^\\>]*$', before) 
-            if matches:
-                before = matches.group(1);
+            stripped = self.stripCommentEnd(before)
+            if stripped is not None:
+                before = stripped
             
             if isinstance(subpartContent, list) or isinstance(subpartContent, dict) :
-                matches = {};
-                matches = re.search('^([^\\<]*\\-\\-\\>)((.|\n)*)(\\<\\!\\-\\-[^\\>]*)$', between)
-                if  matches :
-                    between = matches.group(2);
-                else:
-                    matches = matches = re.search('^((.|\n)*)(\\<\\!\\-\\-[^\\>]*)$', between)
-                    if  matches :
-                        between = matches.group(1);
-                    else:
-                        matches = re.search('^([^\\<]*\\-\\-\\>)((.|\n)*)$', between)
-                        if  matches :
-                            between = matches.group(2);
+                between = self.stripSubpartComments(between)
             
-    
-            
-            matches = {};
-            # resetting matches
-            matches = re.search('^[^\\<]*\\-\\-\\>((.|\n)*)$', after)
-            if  matches :
-                after = matches.group(1);
+            stripped = self.stripCommentStart(after)
+            if stripped is not None:
+                after = stripped
             
-        
     
         if isinstance(subpartContent, list) or isinstance(subpartContent, dict) :
             between = subpartContent[0] + between + subpartContent[1];
@@ -240,6 +334,57 @@ class HtmlParser:
     * @see substituteMarker(), substituteMarkerInObject(), TEMPLATE()
     '''
     def substituteMarkerArray(self, content, markContentArray, wrap = '', uppercase = False, deleteUnused = False)  :
+        if isinstance(markContentArray, dict) and not wrap and not uppercase and not deleteUnused:
+            template = self.getTemplate(content, False)
+            if template is not None and self.canSubstituteMarkersInOnePass(markContentArray):
+                fragments = self.getMarkerFragments(template)
+                if fragments:
+                    fragments = fragments[:]
+                    for i in xrange(1, len(fragments), 2):
+                        if fragments[i] in markContentArray:
+                            fragments[i] = markContentArray[fragments[i]]
+                    return ''.join(fragments)
+        return self.substituteMarkerArrayUncached(content, markContentArray, wrap, uppercase, deleteUnused)
+
+    '''
+    * Checks if replacing the markers one after the other gives the same as filling the marker
+    * slots of a template: the markers have to be plain "###MARKER###" and the values must not
+    * contain "#", which could form new markers.
+    *
+    * @param dict markContentArray
+    * @return boolean
+    '''
+    def canSubstituteMarkersInOnePass(self, markContentArray):
+        for marker in markContentArray:
+            markContent = markContentArray[marker]
+            if not isinstance(markContent, basestring) or '#' in markContent:
+                return False
+            match = self.MarkerPattern.match(marker)
+            if not match or match.end() != len(marker):
+                return False
+        return True
+
+    '''
+    * Returns the template content split into text fragments and marker slots
+    *
+    * @param Template template
+    * @return list [text, marker, text, ..., text], False if markers could overlap or new markers
+    * could be formed from the substituted content and the text around it
+    '''
+    def getMarkerFragments(self, template):
+        if template.markerFragments is None:
+            fragments = self.MarkerPattern.split(template.content)
+            for i in xrange(1, len(fragments), 2):
+                # e.g. "###A###B###", "###A####B###" or "###A" + content + "B###"
+                if self.MarkerNamePattern.match(fragments[i + 1]) or self.MarkerNameEndPattern.search(fragments[i - 1]) \
+                        or (i + 2 < len(fragments) and self.MarkerNameCharsPattern.match(fragments[i + 1])) \
+                        or (i > 1 and self.MarkerNameCharsPattern.match(fragments[i - 1])):
+                    fragments = False
+                    break
+            template.markerFragments = fragments
+        return template.markerFragments
+
+    def substituteMarkerArrayUncached(self, content, markContentArray, wrap = '', uppercase = False, deleteUnused = False)  :
         if isinstance(markContentArray, list) or isinstance(markContentArray, dict) :
             wrapArr = wrap.split('|');
             for marker in markContentArray:
@@ -0,0 +1,144 @@
+'''
+    Stand-in for the PixelDB module with the part of its interface which is used by PixelDBOutbox,
+    e.g. to test the uploads without the global database:
+        [SystemConfiguration]
+        PixelDBModule = AbstractClasses.Helper.LocalPixelDB
+
+    The objects are stored with their attributes in a SQLite file, by default FileName, which
+    can be changed with the environment variable LOCALPIXELDB. Full modules and their bare modules
+    are created when they are requested for the first time.
+'''
+import os
+import sqlite3
+import cPickle as pickle
+
+FileName = os.environ.get('LOCALPIXELDB', '/tmp/LocalPixelDB.sqlite')
+
+
+class Record(object):
+    def __init__(self, **Attributes):
+        self.__dict__.update(Attributes)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % Item for Item in sorted(self.__dict__.items())))
+
+
+class Session(Record):
+    def __init__(self, CENTER, OPERATOR):
+        Record.__init__(self, CENTER = CENTER, OPERATOR = OPERATOR)
+
+
+class Data(Record):
+    pass
+
+
+class FullModule(Record):
+    pass
+
+
+class BareModule(Record):
+    pass
+
+
+class Test_FullModule(Record):
+    pass
+
+
+class Test_IV(Record):
+    pass
+
+
+class Test_DacParameters(Record):
+    pass
+
+
+class Test_PerformanceParameters(Record):
+    pass
+
+
+# class -> attribute which gets the id of the inserted object
+IDAttributes = {
+    Session: 'SESSION_ID',
+    Data: 'DATA_ID',
+    Test_FullModule: 'TEST_ID',
+    Test_IV: 'TEST_ID',
+    Test_DacParameters: 'TEST_ID',
+    Test_PerformanceParameters: 'TEST_ID',
+}
+
+
+class PixelDBInterface(object):
+
+    def __init__(self, operator = '', center = ''):
+        self.operator = operator
+        self.center = center
+        self.Connection = None
+
+    def connectToDB(self):
+        self.Connection = sqlite3.connect(FileName, timeout = 60.)
+        self.Connection.text_factory = str
+        with self.Connection:
+            self.Connection.execute('CREATE TABLE IF NOT EXISTS Objects(ID INTEGER PRIMARY KEY, Type TEXT, Name TEXT, Attributes BLOB)')
+
+    def store(self, Object, Name = None):
+        Cursor = self.Connection.execute(
+            'INSERT INTO Objects (Type, Name, Attributes) VALUES (?, ?, ?)',
+            (type(Object).__name__, Name, sqlite3.Binary(pickle.dumps(Object.__dict__, pickle.HIGHEST_PROTOCOL)))
+        )
+        if type(Object) in IDAttributes:
+            setattr(Object, IDAttributes[type(Object)], Cursor.lastrowid)
+        return Object
+
+    def insertObject(self, Object):
+        with self.Connection:
+            return self.store(Object)
+
+    def insertObjects(self, Objects):
+        '''
+            inserts all objects in one transaction
+        '''
+        with self.Connection:
+            return [self.store(Object) for Object in Objects]
+
+    def insertSession(self, Session):
+        return self.insertObject(Session)
+
+    def insertData(self, Data):
+        return self.insertObject(Data)
+
+    def insertIVTest(self, Test):
+        return self.insertObject(Test)
+
+    def insertTestDac(self, Test):
+        return self.insertObject(Test)
+
+    def insertTestPerformance(self, Test):
+        return self.insertObject(Test)
+
+    def insertTestFullModuleDirPlusMapv96Plus(self, SessionID, Row):
+        return self.insertObject(Test_FullModule(SESSION_ID = SessionID, **dict((str(Key), Value) for Key, Value in Row.items())))
+
+    def get(self, Class, Name):
+        Row = self.Connection.execute('SELECT Attributes FROM Objects WHERE Type = ? AND Name = ?', (Class.__name__, Name)).fetchone()
+        if Row:
+            return Class(**pickle.loads(str(Row[0])))
+        return None
+
+    def getFullModule(self, ModuleID):
+        Module = self.get(FullModule, ModuleID)
+        if not Module:
+            Module = FullModule(FULLMODULE_ID = ModuleID, BAREMODULE_ID = 'B' + ModuleID)
+            with self.Connection:
+                self.store(Module, ModuleID)
+                self.store(BareModule(BAREMODULE_ID = Module.BAREMODULE_ID, SENSOR_ID = 'S' + ModuleID), Module.BAREMODULE_ID)
+        return Module
+
+    def getBareModule(self, BareModuleID):
+        return self.get(BareModule, BareModuleID)
+
+    def getObjects(self, Class):
+        '''
+            all stored objects of the class, for tests
+        '''
+        return [Class(**pickle.loads(str(Row[0]))) for Row in
+                self.Connection.execute('SELECT Attributes FROM Objects WHERE Type = ? ORDER BY ID', (Class.__name__,))]
@@ -0,0 +1,372 @@
+'''
+    Persistent outbox of the uploads to the global PixelDB.
+
+    The test results only add jobs to a SQLite spool file, e.g. the row of a Fulltest with the DAC
+    and performance parameters of its ROCs. This is fast and does not need the PixelDB, the analysis
+    is neither blocked nor stopped by it. An Uploader process takes the jobs from the spool and uploads
+    them, the objects per ROC of a job in one batch. The jobs are leased to the process which took them,
+    other processes using the same spool (other Controller runs, the command line below) do not upload
+    them until the lease expires, e.g. because the process was stopped. A job which fails is tried again later with
+    exponential backoff, the steps and objects which were uploaded already are stored with the job
+    and are not repeated. Jobs which still fail after MaxAttempts are kept with the state 'failed'.
+
+    Jobs which are left at the end of a run are uploaded by the next run or with
+        python AbstractClasses/Helper/PixelDBOutbox.py <spool file> [<PixelDB module>] [--retry-failed]
+    The module defaults to PixelDB, AbstractClasses.Helper.LocalPixelDB is a stand-in for testing.
+'''
+import os
+import sys
+import time
+import uuid
+import socket
+import shutil
+import sqlite3
+import multiprocessing
+import traceback
+import cPickle as pickle
+
+SpoolFileName = 'PixelDBOutbox.sqlite'
+
+# attempts of a job before it is marked as failed
+MaxAttempts = 10
+# seconds before the first retry, doubled after every attempt up to MaxRetryDelay
+RetryDelay = 30.
+MaxRetryDelay = 3600.
+# jobs uploaded with one connection to the PixelDB
+JobsPerConnection = 20
+# seconds a taken job is reserved for the process which uploads it, renewed before every job and step
+LeaseDuration = 600.
+
+verbose = False
+
+
+class UploadError(Exception):
+    pass
+
+
+class Outbox(object):
+    def __init__(self, FileName, BusyTimeout = 60.):
+        '''
+            the spool file, every method uses a connection of its own so that the outbox can be
+            used by the analysis processes and the uploader at the same time
+        '''
+        self.FileName = FileName
+        self.BusyTimeout = BusyTimeout
+        self.TableCreated = False
+
+    def connect(self):
+        Connection = sqlite3.connect(self.FileName, timeout = self.BusyTimeout)
+        Connection.text_factory = str
+        if not self.TableCreated:
+            with Connection:
+                Connection.execute('''
+                    CREATE TABLE IF NOT EXISTS Jobs(
+                        ID INTEGER PRIMARY KEY,
+                        Kind TEXT,
+                        Payload BLOB,
+                        Progress BLOB,
+                        State TEXT,
+                        Attempts INT,
+                        NextAttempt FLOAT,
+                        Created FLOAT,
+                        LastError TEXT,
+                        LeaseUntil FLOAT,
+                        Claim TEXT
+                    )
+                ''')
+                # spool files of former versions
+                Columns = [Row[1] for Row in Connection.execute('PRAGMA table_info(Jobs)')]
+                for Column, Type in (('LeaseUntil', 'FLOAT'), ('Claim', 'TEXT')):
+                    if Column not in Columns:
+                        Connection.execute('ALTER TABLE Jobs ADD COLUMN %s %s' % (Column, Type))
+            self.TableCreated = True
+        return Connection
+
+    def execute(self, SQL, Parameters = ()):
+        Connection = self.connect()
+        try:
+            with Connection:
+                return Connection.execute(SQL, Parameters).fetchall()
+        finally:
+            Connection.close()
+
+    def add(self, Kind, Payload):
+        '''
+            adds an upload job, Payload has to be picklable
+        '''
+        self.execute(
+            'INSERT INTO Jobs (Kind, Payload, Progress, State, Attempts, NextAttempt, Created) VALUES (?, ?, ?, ?, 0, 0, ?)',
+            (Kind, sqlite3.Binary(pickle.dumps(Payload, pickle.HIGHEST_PROTOCOL)),
+             sqlite3.Binary(pickle.dumps({}, pickle.HIGHEST_PROTOCOL)), 'pending', time.time())
+        )
+
+    def claim_due_jobs(self, Limit, Now = None):
+        '''
+            takes the pending jobs whose next attempt is due, the oldest first. They get the state 'uploading'
+            and are leased to this call for LeaseDuration seconds, jobs whose lease expired are pending again.
+        '''
+        Now = time.time() if Now is None else Now
+        Claim = '%s:%d:%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+        Connection = self.connect()
+        # the transaction is started explicitly, BEGIN IMMEDIATE locks the spool for the other processes
+        Connection.isolation_level = None
+        try:
+            Connection.execute('BEGIN IMMEDIATE')
+            try:
+                Connection.execute('UPDATE Jobs SET State = ?, Claim = NULL WHERE State = ? AND LeaseUntil < ?',
+                                   ('pending', 'uploading', Now))
+                IDs = [Row[0] for Row in Connection.execute(
+                    'SELECT ID FROM Jobs WHERE State = ? AND NextAttempt <= ? ORDER BY ID LIMIT ?', ('pending', Now, Limit))]
+                Connection.executemany('UPDATE Jobs SET State = ?, LeaseUntil = ?, Claim = ? WHERE ID = ? AND State = ?',
+                                       [('uploading', Now + LeaseDuration, Claim, ID, 'pending') for ID in IDs])
+                Rows = Connection.execute(
+                    'SELECT ID, Kind, Payload, Progress, Attempts FROM Jobs WHERE Claim = ? ORDER BY ID', (Claim,)).fetchall()
+                Connection.execute('COMMIT')
+            except:
+                Connection.execute('ROLLBACK')
+                raise
+        finally:
+            Connection.close()
+        return [{
+            'ID': ID,
+            'Kind': Kind,
+            'Payload': pickle.loads(str(Payload)),
+            'Progress': pickle.loads(str(Progress)),
+            'Attempts': Attempts,
+            'Claim': Claim,
+        } for ID, Kind, Payload, Progress, Attempts in Rows]
+
+    def execute_claimed(self, SQL, Parameters, Job):
+        '''
+            executes SQL with the parameters ID and Claim of the job appended, False if the job is
+            not leased to this process any more
+        '''
+        Connection = self.connect()
+        try:
+            with Connection:
+                return Connection.execute(SQL, tuple(Parameters) + (Job['ID'], Job['Claim'])).rowcount > 0
+        finally:
+            Connection.close()
+
+    def renew_lease(self, Job):
+        return self.execute_claimed('UPDATE Jobs SET LeaseUntil = ? WHERE ID = ? AND Claim = ?',
+                                    (time.time() + LeaseDuration,), Job)
+
+    def save_progress(self, Job):
+        '''
+            stores the progress and renews the lease of the job, raises UploadError if another
+            process took the job
+        '''
+        if not self.execute_claimed('UPDATE Jobs SET Progress = ?, LeaseUntil = ? WHERE ID = ? AND Claim = ?',
+                                    (sqlite3.Binary(pickle.dumps(Job['Progress'], pickle.HIGHEST_PROTOCOL)),
+                                     time.time() + LeaseDuration), Job):
+            raise UploadError('the lease of job %d expired' % Job['ID'])
+
+    def set_done(self, Job):
+        self.execute_claimed('DELETE FROM Jobs WHERE ID = ? AND Claim = ?', (), Job)
+
+    def set_attempt_failed(self, Job, Error):
+        Attempts = Job['Attempts'] + 1
+        State = 'failed' if Attempts >= MaxAttempts else 'pending'
+        NextAttempt = time.time() + min(RetryDelay * 2 ** (Attempts - 1), MaxRetryDelay)
+        self.execute_claimed('UPDATE Jobs SET State = ?, Attempts = ?, NextAttempt = ?, LastError = ?, Claim = NULL '
+                             'WHERE ID = ? AND Claim = ?', (State, Attempts, NextAttempt, Error), Job)
+        return State
+
+    def retry_failed(self):
+        self.execute('UPDATE Jobs SET State = ?, Attempts = 0, NextAttempt = 0 WHERE State = ?', ('pending', 'failed'))
+
+    def count(self, State = 'pending'):
+        '''
+            number of jobs with the state, the pending ones include those which are uploaded now
+        '''
+        States = ('pending', 'uploading') if State == 'pending' else (State, State)
+        return self.execute('SELECT COUNT(*) FROM Jobs WHERE State IN (?, ?)', States)[0][0]
+
+
+def insert_batch(Interface, Method, Objects, Progress, Key, SaveProgress):
+    '''
+        inserts the objects in one call if the interface supports it, otherwise one after the other.
+        Progress[Key] is the number of objects which were inserted already, they are skipped.
+    '''
+    nInserted = Progress.get(Key, 0)
+    # spool files of former versions only stored if the step was finished
+    if nInserted is True:
+        nInserted = len(Objects)
+    if nInserted >= len(Objects):
+        return
+    if hasattr(Interface, 'insertObjects'):
+        if Interface.insertObjects(Objects[nInserted:]) is None:
+            raise UploadError('insertion of %d objects failed' % (len(Objects) - nInserted))
+        Progress[Key] = len(Objects)
+        SaveProgress()
+    else:
+        for Index in range(nInserted, len(Objects)):
+            getattr(Interface, Method)(Objects[Index])
+            Progress[Key] = Index + 1
+            SaveProgress()
+
+
+def upload_iv(Interface, Module, Payload, Progress, SaveProgress):
+    Row = Payload['Row']
+    IV = Payload['IV']
+    FullModule = Interface.getFullModule(Row['ModuleID'])
+    if FullModule is None:
+        raise UploadError('cannot find module with ModuleID = %s' % Row['ModuleID'])
+    BareModule = Interface.getBareModule(FullModule.BAREMODULE_ID)
+    if BareModule is None:
+        print 'cannot find bare module with BareModuleID = %s, IV not uploaded' % FullModule.BAREMODULE_ID
+        return
+    if 'IVDataID' not in Progress:
+        # copy the log file into the test folder
+        FileName = Row['AbsFulltestSubfolder'] + '/' + os.path.basename(IV['IVCurveFilePath'])
+        if verbose:
+            print 'copying %s to %s' % (IV['IVCurveFilePath'], FileName)
+        shutil.copy(IV['IVCurveFilePath'], FileName)
+        IVData = Module.Data(PFNs = FileName)
+        if Interface.insertData(IVData) is None:
+            raise UploadError('cannot insert data %s' % FileName)
+        Progress['IVDataID'] = IVData.DATA_ID
+        SaveProgress()
+    Test = Module.Test_IV(SESSION_ID = Progress['SessionID'], SENSOR_ID = BareModule.SENSOR_ID,
+                          DATA_ID = Progress['IVDataID'], REF_ID = Progress['TestID'], **IV['Test'])
+    Result = Interface.insertIVTest(Test)
+    if Result is None:
+        raise UploadError('cannot insert IV test')
+    print 'IVTEST INSERTED FOR', Row['ModuleID'], BareModule.SENSOR_ID, Result.TEST_ID, Progress['IVDataID'], IV['Test']['GRADE']
+
+
+def upload_fulltest(Interface, Module, Job, SaveProgress):
+    Payload = Job['Payload']
+    Progress = Job['Progress']
+    Row = Payload['Row']
+    if 'TestID' not in Progress:
+        Session = Module.Session(Payload['Center'], Payload['Operator'])
+        Interface.insertSession(Session)
+        print 'INSERTING INTO DB', Row['AbsModuleFulltestStoragePath'], Session.SESSION_ID
+        Inserted = Interface.insertTestFullModuleDirPlusMapv96Plus(Session.SESSION_ID, Row)
+        if Inserted is None:
+            raise UploadError('insertion of %s failed' % Row['AbsFulltestSubfolder'])
+        Progress['SessionID'] = Session.SESSION_ID
+        Progress['TestID'] = Inserted.TEST_ID
+        SaveProgress()
+    if Payload['IV'] and not Progress.get('IV'):
+        upload_iv(Interface, Module, Payload, Progress, SaveProgress)
+        Progress['IV'] = True
+        SaveProgress()
+    insert_batch(Interface, 'insertTestDac', [
+        Module.Test_DacParameters(FULLMODULEANALYSISTEST_ID = Progress['TestID'], **Parameters)
+        for Parameters in Payload['DacParameters']
+    ], Progress, 'DacParameters', SaveProgress)
+    insert_batch(Interface, 'insertTestPerformance', [
+        Module.Test_PerformanceParameters(FULLMODULEANALYSISTEST_ID = Progress['TestID'], **Parameters)
+        for Parameters in Payload['PerformanceParameters']
+    ], Progress, 'PerformanceParameters', SaveProgress)
+    print 'FULLTEST INSERTED', Row['ModuleID'], Progress['TestID'], \
+        len(Payload['DacParameters']), 'DAC and', len(Payload['PerformanceParameters']), 'performance tests'
+
+
+# kind of job -> function(Interface, Module, Job, SaveProgress)
+Uploaders = {
+    'Fulltest': upload_fulltest,
+}
+
+
+def connect_to_database(ModuleName):
+    Module = __import__(ModuleName, fromlist = ['PixelDBInterface'], level = 0)
+    Interface = Module.PixelDBInterface(operator = "tommaso", center = "pisa")
+    Interface.connectToDB()
+    return Module, Interface
+
+
+def drain(Outbox, ModuleName = 'PixelDB', Deadline = None):
+    '''
+        uploads the due jobs until there are none left or the Deadline (time.time()) is reached,
+        returns the number of uploaded jobs
+    '''
+    nUploaded = 0
+    while Deadline is None or time.time() < Deadline:
+        Jobs = Outbox.claim_due_jobs(JobsPerConnection)
+        if not Jobs:
+            break
+        try:
+            Module, Interface = connect_to_database(ModuleName)
+        except Exception as e:
+            for Job in Jobs:
+                Outbox.set_attempt_failed(Job, 'cannot connect to %s: %s' % (ModuleName, e))
+            print 'cannot connect to %s: %s' % (ModuleName, e)
+            break
+        for Job in Jobs:
+            # the lease of the last jobs can expire while the first ones are uploaded
+            if not Outbox.renew_lease(Job):
+                continue
+            try:
+                Uploaders[Job['Kind']](Interface, Module, Job, lambda: Outbox.save_progress(Job))
+                Outbox.set_done(Job)
+                nUploaded += 1
+            except Exception as e:
+                if verbose:
+                    traceback.print_exc()
+                State = Outbox.set_attempt_failed(Job, '%s: %s' % (type(e).__name__, e))
+                print 'upload of job %d (%s) failed, %s: %s' % (Job['ID'], Job['Kind'], State, e)
+    return nUploaded
+
+
+class Uploader(multiprocessing.Process):
+    '''
+        uploads the jobs of the outbox in the background, a process and not a thread because
+        the analysis forks its workers while the uploader runs
+    '''
+    def __init__(self, Outbox, ModuleName = 'PixelDB', Interval = 10.):
+        multiprocessing.Process.__init__(self)
+        self.daemon = True
+        self.Outbox = Outbox
+        self.ModuleName = ModuleName
+        self.Interval = Interval
+        self.StopEvent = multiprocessing.Event()
+        self.Uploaded = multiprocessing.Value('l', 0)
+
+    def run(self):
+        while True:
+            Stopping = self.StopEvent.is_set()
+            try:
+                nUploaded = drain(self.Outbox, self.ModuleName)
+                with self.Uploaded.get_lock():
+                    self.Uploaded.value += nUploaded
+            except Exception:
+                traceback.print_exc()
+            sys.stdout.flush()
+            if Stopping:
+                break
+            self.StopEvent.wait(self.Interval)
+
+    def stop(self, Timeout = None):
+        '''
+            uploads the due jobs for at most Timeout seconds, returns the number of jobs left in the outbox
+        '''
+        self.StopEvent.set()
+        self.join(Timeout)
+        if self.is_alive():
+            # the job which is uploaded now is uploaded again when its lease expired, its finished steps are not repeated
+            self.terminate()
+            self.join()
+        return self.Outbox.count()
+
+    @property
+    def nUploaded(self):
+        return self.Uploaded.value
+
+
+if __name__ == '__main__':
+    Arguments = [Argument for Argument in sys.argv[1:] if not Argument.startswith('--')]
+    if not Arguments:
+        print 'usage: %s <spool file> [<PixelDB module>] [--retry-failed]' % sys.argv[0]
+        sys.exit(1)
+    # the directory which contains AbstractClasses, for the stand-in module
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    SpoolOutbox = Outbox(Arguments[0])
+    if '--retry-failed' in sys.argv:
+        SpoolOutbox.retry_failed()
+    verbose = True
+    print 'uploaded %d jobs' % drain(SpoolOutbox, Arguments[1] if len(Arguments) > 1 else 'PixelDB')
+    print '%d jobs pending, %d failed' % (SpoolOutbox.count(), SpoolOutbox.count('failed'))
@@ -0,0 +1,197 @@
+'''
+    Set of pixels (chipNo, column, row) as a bit mask, one bit per pixel in a python integer:
+    bit = chipNo * PixelsPerROC + column * NRows + row, i.e. 4160 bits per ROC and 66560 per module.
+
+    A PixelMask can be used like the sets of (chipNo, column, row) tuples it replaces (add, update,
+    in, len, union, difference, iteration over the tuples), but union, difference and count work
+    on the whole mask at once. It is written to the JSON files in the compact form of to_json().
+'''
+import zlib
+import base64
+import binascii
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NCols = 52
+NRows = 80
+PixelsPerROC = NCols * NRows
+
+
+def get_bit(Pixel):
+    chipNo, column, row = Pixel
+    # other coordinates would be the bit of another pixel
+    if not (0 <= column < NCols and 0 <= row < NRows and chipNo >= 0):
+        raise ValueError('pixel %r is outside of the ROC geometry %dx%d' % (Pixel, NCols, NRows))
+    return chipNo * PixelsPerROC + column * NRows + row
+
+
+def get_pixel(Bit):
+    chipNo, Rest = divmod(Bit, PixelsPerROC)
+    return (chipNo, Rest // NRows, Rest % NRows)
+
+
+def get_bits(Pixels):
+    '''
+        integer with the bits of the pixels, Pixels is a PixelMask or an iterable of tuples
+    '''
+    if isinstance(Pixels, PixelMask):
+        return Pixels.Bits
+    Bits = 0
+    for Pixel in Pixels:
+        Bits |= 1 << get_bit(Pixel)
+    return Bits
+
+
+class PixelMask(object):
+    __slots__ = ('Bits',)
+
+    def __init__(self, Pixels = None, Bits = 0):
+        self.Bits = Bits
+        if Pixels is not None:
+            self.Bits |= get_bits(Pixels)
+
+    @classmethod
+    def from_array(cls, Mask, chipNo):
+        '''
+            mask of all pixels of the ROC where the boolean array Mask[column, row] is True
+        '''
+        Flat = numpy.zeros(PixelsPerROC, dtype = bool)
+        Flat[:] = numpy.asarray(Mask, dtype = bool)[:NCols, :NRows].reshape(-1)
+        if not Flat.any():
+            return cls()
+        # packbits puts the first element into the highest bit, reversed the first pixel is the lowest bit
+        Packed = numpy.packbits(numpy.concatenate([numpy.zeros(-PixelsPerROC % 8, dtype = bool), Flat[::-1]]))
+        return cls(Bits = int(binascii.hexlify(Packed.tostring()), 16) << (chipNo * PixelsPerROC))
+
+    def to_array(self, chipNo):
+        '''
+            boolean array [column, row] of the pixels of the ROC, the inverse of from_array
+        '''
+        Hex = '%x' % (self.Bits >> (chipNo * PixelsPerROC) & ((1 << PixelsPerROC) - 1))
+        Packed = numpy.frombuffer(binascii.unhexlify('0' * (PixelsPerROC // 4 - len(Hex)) + Hex), dtype = numpy.uint8)
+        # the highest bit comes first
+        return numpy.unpackbits(Packed)[::-1].astype(bool).reshape(NCols, NRows)
+
+    @classmethod
+    def from_json(cls, Data):
+        Bytes = zlib.decompress(base64.b64decode(Data['PixelMask']))
+        return cls(Bits = int(binascii.hexlify(Bytes[::-1]) or '0', 16) << (Data['FirstChip'] * PixelsPerROC))
+
+    def to_json(self):
+        '''
+            the bits from the first ROC with pixels on as compressed little endian bytes in base64,
+            the first ROC and the number of pixels
+        '''
+        FirstChip = ((self.Bits & -self.Bits).bit_length() - 1) // PixelsPerROC if self.Bits else 0
+        Hex = '%x' % (self.Bits >> (FirstChip * PixelsPerROC))
+        Bytes = binascii.unhexlify('0' * (len(Hex) % 2) + Hex) if self.Bits else ''
+        return {'PixelMask': base64.b64encode(zlib.compress(Bytes[::-1])), 'FirstChip': FirstChip, 'N': len(self)}
+
+    def add(self, Pixel):
+        self.Bits |= 1 << get_bit(Pixel)
+
+    def discard(self, Pixel):
+        # like a set, a pixel which can not be in the mask is ignored
+        if Pixel in self:
+            self.Bits &= ~(1 << get_bit(Pixel))
+
+    def update(self, *Others):
+        for Other in Others:
+            self.Bits |= get_bits(Other)
+
+    def union(self, *Others):
+        Bits = self.Bits
+        for Other in Others:
+            Bits |= get_bits(Other)
+        return PixelMask(Bits = Bits)
+
+    def difference(self, *Others):
+        Bits = self.Bits
+        for Other in Others:
+            Bits &= ~get_bits(Other)
+        return PixelMask(Bits = Bits)
+
+    def intersection(self, *Others):
+        Bits = self.Bits
+        for Other in Others:
+            Bits &= get_bits(Other)
+        return PixelMask(Bits = Bits)
+
+    def copy(self):
+        return PixelMask(Bits = self.Bits)
+
+    def get_roc(self, chipNo):
+        '''
+            the pixels of one ROC
+        '''
+        return PixelMask(Bits = self.Bits & (((1 << PixelsPerROC) - 1) << (chipNo * PixelsPerROC)))
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
+
+    def __ior__(self, Other):
+        self.update(Other)
+        return self
+
+    def __isub__(self, Other):
+        self.Bits &= ~get_bits(Other)
+        return self
+
+    def __contains__(self, Pixel):
+        try:
+            return bool(self.Bits >> get_bit(Pixel) & 1)
+        except ValueError:
+            # outside of the geometry, e.g. the neighbour of a pixel at the edge
+            return False
+
+    def __len__(self):
+        return bin(self.Bits).count('1')
+
+    def __nonzero__(self):
+        return self.Bits != 0
+
+    def __iter__(self):
+        # the binary digits from the lowest bit on
+        Digits = bin(self.Bits)[:1:-1]
+        Bit = Digits.find('1')
+        while Bit >= 0:
+            yield get_pixel(Bit)
+            Bit = Digits.find('1', Bit + 1)
+
+    def __eq__(self, Other):
+        if isinstance(Other, PixelMask):
+            return self.Bits == Other.Bits
+        try:
+            return self.Bits == get_bits(Other)
+        except (TypeError, IndexError, ValueError):
+            return False
+
+    def __ne__(self, Other):
+        return not self == Other
+
+    __hash__ = None
+
+    def __getstate__(self):
+        # a tuple, __setstate__ is not called for a false state
+        return (self.Bits,)
+
+    def __setstate__(self, State):
+        self.Bits = State[0]
+
+    def __repr__(self):
+        return 'PixelMask(%r)' % list(self)
+
+
+def json_default(Object):
+    '''
+        default of json.dumps for the pixel masks and sets in the results
+    '''
+    if isinstance(Object, PixelMask):
+        return Object.to_json()
+    if isinstance(Object, (set, frozenset)):
+        return list(Object)
+    raise TypeError('%r is not JSON serializable' % Object)
@@ -0,0 +1,147 @@
+'''
+    Renders the plot files of the test results in worker processes.
+
+    save() writes a snapshot of the canvas (with all drawn objects and their draw options) and of
+    the current style to a small ROOT file and queues a job which draws it into all requested
+    formats (svg, root, pdf, ...). The analysis continues while the plots are rendered.
+    wait() has to be called before the plot files are used, e.g. at the start of GenerateFinalOutput.
+    With nProcesses = 0 the canvas is saved directly as before.
+    redraw() queues a job for a canvas which was saved as ROOT file before, see Helper/ResultDataStore.py.
+'''
+import os
+import multiprocessing
+
+SnapshotSuffix = 'snapshot.root'
+
+verbose = False
+
+_Pool = None
+# the pool belongs to this process, forked processes start their own
+_PoolPid = None
+# (snapshot file name, plot file names, remove snapshot, result) of the queued jobs
+_Pending = []
+
+
+def init_worker():
+    import ROOT
+    ROOT.gROOT.SetBatch(True)
+    ROOT.gErrorIgnoreLevel = 1001
+    ROOT.gEnv.SetValue('Canvas.SavePrecision', "30")
+
+
+def get_canvas(SnapshotFile):
+    '''
+        the canvas of a snapshot or the first canvas in a ROOT file written by TCanvas.SaveAs
+    '''
+    Canvas = SnapshotFile.Get('Canvas')
+    if not Canvas:
+        for Key in SnapshotFile.GetListOfKeys():
+            if Key.GetClassName() == 'TCanvas':
+                return Key.ReadObj()
+    return Canvas
+
+
+def render(SnapshotFileName, FileNames, Remove = True):
+    '''
+        draws the snapshot into all files, returns an error message or None
+    '''
+    import ROOT
+    try:
+        SnapshotFile = ROOT.TFile.Open(SnapshotFileName)
+        if not SnapshotFile or SnapshotFile.IsZombie():
+            return 'cannot open %s' % SnapshotFileName
+        Style = SnapshotFile.Get('Style')
+        if Style:
+            Style.cd()
+        Canvas = get_canvas(SnapshotFile)
+        if not Canvas:
+            return 'no canvas in %s' % SnapshotFileName
+        Canvas.Draw()
+        for FileName in FileNames:
+            Canvas.SaveAs(FileName)
+        Canvas.Close()
+        SnapshotFile.Close()
+        if Remove:
+            os.remove(SnapshotFileName)
+    except Exception as e:
+        return '%s: %s' % (SnapshotFileName, e)
+    return None
+
+
+def get_pool(nProcesses):
+    global _Pool, _PoolPid
+    if _PoolPid != os.getpid():
+        _Pool = None
+        del _Pending[:]
+    if _Pool is None:
+        _Pool = multiprocessing.Pool(processes = nProcesses, initializer = init_worker)
+        _PoolPid = os.getpid()
+    return _Pool
+
+
+def save(Canvas, FileNames, nProcesses, SnapshotFileName):
+    '''
+        saves the canvas to all FileNames, in the rendering pool if nProcesses > 0
+    '''
+    import ROOT
+    if nProcesses < 1:
+        for FileName in FileNames:
+            Canvas.SaveAs(FileName)
+        return
+    Pool = get_pool(nProcesses)
+    # the snapshot must not change the directory new histograms are attached to
+    PreviousDirectory = ROOT.gDirectory.GetPath()
+    SnapshotFile = ROOT.TFile(SnapshotFileName, 'RECREATE')
+    Canvas.Write('Canvas')
+    ROOT.gStyle.Write('Style')
+    SnapshotFile.Close()
+    ROOT.gDirectory.cd(PreviousDirectory)
+    _Pending.append((SnapshotFileName, FileNames, True, Pool.apply_async(render, (SnapshotFileName, FileNames))))
+
+
+def redraw(CanvasFileName, FileNames, nProcesses):
+    '''
+        draws the canvas saved in a ROOT file into all FileNames with the current style, the file is kept
+    '''
+    if nProcesses < 1:
+        Error = render(CanvasFileName, FileNames, False)
+        if Error:
+            print '\x1b[31mcannot write plot %s\x1b[0m' % Error
+        return
+    Pool = get_pool(nProcesses)
+    _Pending.append((CanvasFileName, FileNames, False, Pool.apply_async(render, (CanvasFileName, FileNames, False))))
+
+
+def wait():
+    '''
+        blocks until all queued plots are written, jobs which failed in the pool are rendered
+        again in this process, returns the number of plots which could not be written
+    '''
+    if _PoolPid != os.getpid():
+        return 0
+    nErrors = 0
+    for SnapshotFileName, FileNames, Remove, Result in _Pending:
+        Error = Result.get()
+        if Error:
+            if verbose:
+                print 'rendering in pool failed, %s' % Error
+            Error = render(SnapshotFileName, FileNames, Remove)
+        if Error:
+            print '\x1b[31mcannot write plot %s\x1b[0m' % Error
+            nErrors += 1
+    del _Pending[:]
+    return nErrors
+
+
+def close():
+    '''
+        waits for all plots and stops the rendering pool, returns the number of plots which could not be written
+    '''
+    global _Pool, _PoolPid
+    nErrors = wait()
+    if _Pool is not None and _PoolPid == os.getpid():
+        _Pool.close()
+        _Pool.join()
+    _Pool = None
+    _PoolPid = None
+    return nErrors
@@ -0,0 +1,173 @@
+'''
+    Wall time, CPU time, memory and ROOT objects of the expensive methods of every test result
+    (PopulateResultData, SaveCanvas, GenerateDataFileHTML, WriteToDatabase).
+
+    Only active if Enabled is set (Controller.py --profile). The measurements are written as
+        - Profile.json next to the TestResult.html of every test result
+        - one file with collapsed stacks for the whole run, which can be read by flame graph
+          tools, e.g. flamegraph.pl profile.txt > profile.svg
+    The stack of a measurement are the keys of the test result and its parents and the method,
+    its value the time in microseconds which was not spent in other measurements inside it.
+'''
+import os
+import time
+import json
+import resource
+
+Enabled = False
+
+ReportFileName = 'Profile.json'
+
+# measurements of this process, see Measurement
+_Records = []
+# measurements which are running, the innermost at the end
+_Active = []
+
+try:
+    _PageSize = os.sysconf('SC_PAGE_SIZE')
+except (ValueError, AttributeError, OSError):
+    _PageSize = 4096
+
+
+def get_rss():
+    '''
+        resident memory of this process in bytes, the maximum so far if /proc is not available
+    '''
+    try:
+        f = open('/proc/self/statm', 'r')
+        Pages = int(f.read().split()[1])
+        f.close()
+        return Pages * _PageSize
+    except (IOError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_number_of_ROOT_objects():
+    '''
+        objects registered in the ROOT memory directory, i.e. histograms which are not owned by a file
+    '''
+    import ROOT
+    try:
+        return ROOT.gROOT.GetList().GetSize()
+    except Exception:
+        return 0
+
+
+def get_stack(TestResultObject):
+    Keys = []
+    Object = TestResultObject
+    while Object:
+        Keys.insert(0, str(Object.Key or Object.NameSingle))
+        Object = Object.ParentObject
+    return Keys
+
+
+class Measurement(object):
+    '''
+        with Profiler.Measurement(TestResultObject, 'Method'):
+            ...
+    '''
+    def __init__(self, TestResultObject, Method):
+        self.TestResultObject = TestResultObject
+        self.Method = Method
+
+    def __enter__(self):
+        if not Enabled:
+            return self
+        self.ChildWallTime = 0.
+        self.Start = (time.time(), time.clock(), get_rss(), get_number_of_ROOT_objects())
+        _Active.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not Enabled or self not in _Active:
+            return False
+        WallTime = time.time() - self.Start[0]
+        _Active.remove(self)
+        if _Active:
+            _Active[-1].ChildWallTime += WallTime
+        _Records.append({
+            'ModulePath': self.TestResultObject.ModulePath,
+            'FinalResultsStoragePath': self.TestResultObject.FinalResultsStoragePath,
+            'Stack': get_stack(self.TestResultObject) + [self.Method],
+            'Method': self.Method,
+            'WallTime': WallTime,
+            'SelfWallTime': max(WallTime - self.ChildWallTime, 0.),
+            'CPUTime': time.clock() - self.Start[1],
+            'RSSDelta': get_rss() - self.Start[2],
+            'ROOTObjectsDelta': get_number_of_ROOT_objects() - self.Start[3],
+            'Failed': exc_type is not None,
+        })
+        return False
+
+
+def measured(Method):
+    '''
+        decorator for methods of test results
+    '''
+    def MeasuredMethod(self, *args, **kwargs):
+        if not Enabled:
+            return Method(self, *args, **kwargs)
+        with Measurement(self, Method.__name__):
+            return Method(self, *args, **kwargs)
+    MeasuredMethod.__name__ = Method.__name__
+    MeasuredMethod.__doc__ = Method.__doc__
+    return MeasuredMethod
+
+
+def get_records(Start = 0):
+    return _Records[Start:]
+
+
+def add_records(Records):
+    '''
+        add the measurements of a worker process
+    '''
+    _Records.extend(Records)
+
+
+def clear():
+    del _Records[:]
+    del _Active[:]
+
+
+def write_reports():
+    '''
+        writes the measurements of every test result to its storage folder
+    '''
+    Reports = {}
+    for Record in _Records:
+        Reports.setdefault(Record['FinalResultsStoragePath'], []).append(Record)
+    for Path, Records in Reports.items():
+        if not os.path.isdir(Path):
+            continue
+        Report = {
+            'ModulePath': Records[0]['ModulePath'],
+            'Methods': {},
+        }
+        for Record in Records:
+            Method = Report['Methods'].setdefault(Record['Method'], {
+                'Calls': 0, 'WallTime': 0., 'SelfWallTime': 0., 'CPUTime': 0., 'RSSDelta': 0, 'ROOTObjectsDelta': 0, 'Failed': 0,
+            })
+            Method['Calls'] += 1
+            for Key in ['WallTime', 'SelfWallTime', 'CPUTime', 'RSSDelta', 'ROOTObjectsDelta', 'Failed']:
+                Method[Key] += Record[Key]
+        f = open(Path + '/' + ReportFileName, 'w')
+        json.dump(Report, f, sort_keys = True, indent = 4)
+        f.close()
+    return len(Reports)
+
+
+def write_collapsed_stacks(FileName):
+    '''
+        one line 'key;key;...;method microseconds' per stack
+    '''
+    Stacks = {}
+    for Record in _Records:
+        Stack = ';'.join(Key.replace(';', '_').replace(' ', '_') for Key in Record['Stack'])
+        Stacks[Stack] = Stacks.get(Stack, 0) + int(round(Record['SelfWallTime'] * 1e6))
+    f = open(FileName, 'w')
+    for Stack, Value in sorted(Stacks.items()):
+        f.write('%s %d\n' % (Stack, Value))
+    f.close()
+    return len(Stacks)
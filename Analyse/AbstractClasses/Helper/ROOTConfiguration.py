@@ -1,6 +1,5 @@
-import ROOT
-
 def initialise_ROOT():
+    import ROOT
     # Suppress "info"-level notices from TCanvas that it has saved a .png
     # see root/core/base/inc/TError.h for information on error levels
     ROOT.gErrorIgnoreLevel = 1001
@@ -0,0 +1,326 @@
+'''
+    Cache of the populated ResultData of every test result.
+
+    Each test result gets a key from
+        - CacheVersion
+        - the source files of its class, its base classes and the project modules they use
+        - its section in the HistoDict, the grading parameters and the fitting configuration
+        - name, size and modification time of the files in its raw data folder
+        - its attributes
+        - the keys of its sub test results and of all test results which are populated before it
+    A test result and all its sub test results are only restored from the cache if all keys agree,
+    otherwise the test result is populated as usual and the cache is rewritten.
+'''
+import os
+import re
+import sys
+import types
+import fnmatch
+import hashlib
+import inspect
+import cPickle as pickle
+
+# has to be increased if the format of the cache or the meaning of the keys changes
+CacheVersion = 2
+
+CacheFileName = 'ResultDataCache.pkl'
+CacheROOTFileName = 'ResultDataCache.root'
+
+# files which are written by the analysis itself into the raw data folders
+GeneratedFilePatterns = ['SCurve_C*.dat', 'phCalibrationFit_C*.dat', 'phCalibrationFitTan_C*.dat', 'checksum.md5']
+
+# ResultData entries which are stored, ROOT objects in 'Plot' and 'HiddenData' go to the ROOT file
+CachedResultDataKeys = ['KeyValueDictPairs', 'KeyList', 'Plot', 'HiddenData', 'Table']
+ROOTObjectResultDataKeys = ['Plot', 'HiddenData']
+
+verbose = False
+
+# the directory which contains AbstractClasses and TestResultClasses, only modules below it are hashed
+BaseDirectory = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_FileHashes = {}
+_UsedModules = {}
+_SourceHashes = {}
+_InputHashes = {}
+
+
+def get_module_source_file(Module):
+    '''
+        the .py file of a module of the project, None for packages of other projects and built in modules
+    '''
+    FileName = getattr(Module, '__file__', None)
+    if not FileName:
+        return None
+    FileName = os.path.abspath(FileName)
+    if FileName.endswith(('.pyc', '.pyo')):
+        FileName = FileName[:-1]
+    if not FileName.startswith(BaseDirectory + os.sep) or not os.path.isfile(FileName):
+        return None
+    return FileName
+
+
+def get_file_hash(FileName):
+    if not _FileHashes.has_key(FileName):
+        f = open(FileName, 'rb')
+        _FileHashes[FileName] = hashlib.md5(f.read()).hexdigest()
+        f.close()
+    return _FileHashes[FileName]
+
+
+def get_used_modules(Module, SourceFile):
+    '''
+        project modules the module refers to, a package only counts with the sub modules which are
+        named in the source, e.g. AbstractClasses.Helper.HistoArray for import AbstractClasses
+    '''
+    f = open(SourceFile, 'rb')
+    Source = f.read()
+    f.close()
+    Modules = []
+    for Name, Value in Module.__dict__.items():
+        if not isinstance(Value, types.ModuleType):
+            # from ... import ...
+            Value = sys.modules.get(getattr(Value, '__module__', None) or '')
+            if Value is not None:
+                Modules.append(Value)
+            continue
+        Modules.append(Value)
+        if not hasattr(Value, '__path__'):
+            continue
+        for Match in set(re.findall(r'\b%s((?:\.\w+)+)' % re.escape(Name), Source)):
+            SubModule = Value
+            for Part in Match.split('.')[1:]:
+                SubModule = getattr(SubModule, Part, None)
+                if not isinstance(SubModule, types.ModuleType):
+                    break
+                Modules.append(SubModule)
+    return Modules
+
+
+def get_source_files(Class):
+    '''
+        source files of the class, its base classes and all project modules they use directly or indirectly
+    '''
+    Pending = [sys.modules.get(i.__module__) for i in inspect.getmro(Class)]
+    SourceFiles = set()
+    while Pending:
+        Module = Pending.pop()
+        SourceFile = get_module_source_file(Module)
+        if SourceFile is None or SourceFile in SourceFiles:
+            continue
+        SourceFiles.add(SourceFile)
+        # packages are only hashed, their sub modules are added where they are used
+        if hasattr(Module, '__path__'):
+            continue
+        if not _UsedModules.has_key(SourceFile):
+            _UsedModules[SourceFile] = get_used_modules(Module, SourceFile)
+        Pending.extend(_UsedModules[SourceFile])
+    return sorted(SourceFiles)
+
+
+def get_source_hash(TestResultObject):
+    Class = type(TestResultObject)
+    if not _SourceHashes.has_key(Class):
+        md5 = hashlib.md5()
+        for SourceFile in get_source_files(Class):
+            md5.update('%s %s\n' % (os.path.relpath(SourceFile, BaseDirectory), get_file_hash(SourceFile)))
+        _SourceHashes[Class] = md5.hexdigest()
+    return _SourceHashes[Class]
+
+
+def get_config_hash(TestResultObject):
+    md5 = hashlib.md5()
+    # the HistoDict is usually set by one of the parents
+    Object = TestResultObject
+    HistoDict = None
+    while Object and not HistoDict:
+        HistoDict = Object.HistoDict
+        Object = Object.ParentObject
+    if HistoDict and HistoDict.has_section(TestResultObject.NameSingle):
+        for Option in sorted(HistoDict.options(TestResultObject.NameSingle)):
+            md5.update('%s=%s\n' % (Option, HistoDict.get(TestResultObject.NameSingle, Option)))
+    Environment = TestResultObject.TestResultEnvironmentObject
+    md5.update(repr(sorted(Environment.GradingParameters.items())))
+    Fitting = Environment.Configuration['Fitting']
+    # the number of processes does not change the result
+    md5.update(repr(sorted((Key, Value) for Key, Value in Fitting.items() if Key != 'nProcesses')))
+    return md5.hexdigest()
+
+
+def get_input_hash(Path):
+    Path = os.path.abspath(Path)
+    if not _InputHashes.has_key(Path):
+        md5 = hashlib.md5()
+        if os.path.isdir(Path):
+            for FileName in sorted(os.listdir(Path)):
+                if any(fnmatch.fnmatch(FileName, Pattern) for Pattern in GeneratedFilePatterns):
+                    continue
+                FilePath = Path + '/' + FileName
+                if not os.path.isfile(FilePath):
+                    continue
+                FileStat = os.stat(FilePath)
+                md5.update('%s %d %d\n' % (FileName, FileStat.st_size, int(FileStat.st_mtime)))
+        _InputHashes[Path] = md5.hexdigest()
+    return _InputHashes[Path]
+
+
+def get_attributes_hash(TestResultObject):
+    Attributes = []
+    for Key, Value in sorted(TestResultObject.Attributes.items()):
+        if type(Value) in (str, unicode, int, long, float, bool, type(None)):
+            Attributes.append((Key, Value))
+    return hashlib.md5(repr(Attributes)).hexdigest()
+
+
+def get_enabled_sub_test_results(TestResultObject):
+    return [i['TestResultObject'] for i in TestResultObject.ResultData['SubTestResultDictList'] if i['TestResultObject'].Enabled]
+
+
+def get_subtree_key(TestResultObject):
+    if not hasattr(TestResultObject, 'ResultDataCacheSubtreeKey'):
+        md5 = hashlib.md5()
+        md5.update('%d' % CacheVersion)
+        md5.update(get_source_hash(TestResultObject))
+        md5.update(get_config_hash(TestResultObject))
+        md5.update(get_input_hash(TestResultObject.RawTestSessionDataPath))
+        md5.update(get_attributes_hash(TestResultObject))
+        for SubTestResult in get_enabled_sub_test_results(TestResultObject):
+            md5.update(get_subtree_key(SubTestResult))
+        TestResultObject.ResultDataCacheSubtreeKey = md5.hexdigest()
+    return TestResultObject.ResultDataCacheSubtreeKey
+
+
+def get_context_key(TestResultObject):
+    '''
+        keys of all test results which are populated before this one and might be used by it
+    '''
+    if not hasattr(TestResultObject, 'ResultDataCacheContextKey'):
+        md5 = hashlib.md5()
+        Parent = TestResultObject.ParentObject
+        if Parent:
+            md5.update(get_context_key(Parent))
+            for SubTestResult in get_enabled_sub_test_results(Parent):
+                if SubTestResult is TestResultObject:
+                    break
+                md5.update(get_subtree_key(SubTestResult))
+        TestResultObject.ResultDataCacheContextKey = md5.hexdigest()
+    return TestResultObject.ResultDataCacheContextKey
+
+
+def get_key(TestResultObject):
+    return hashlib.md5(get_subtree_key(TestResultObject) + get_context_key(TestResultObject)).hexdigest()
+
+
+def store(TestResultObject):
+    '''
+        write the ResultData of one test result to its storage folder, returns False if it can not be cached
+    '''
+    import ROOT
+    Data = {
+        'Key': get_key(TestResultObject),
+        'Title': TestResultObject.Title,
+        'Attributes': TestResultObject.Attributes,
+        'ResultData': {},
+        'ROOTObjects': [],
+    }
+    ROOTObjects = {}
+    for Key in CachedResultDataKeys:
+        Value = TestResultObject.ResultData[Key]
+        if Key in ROOTObjectResultDataKeys:
+            Value = dict(Value)
+            for SubKey in Value.keys():
+                if isinstance(Value[SubKey], ROOT.TObject):
+                    ROOTObjects['%s__%s' % (Key, SubKey)] = Value.pop(SubKey)
+                    Data['ROOTObjects'].append((Key, SubKey))
+        Data['ResultData'][Key] = Value
+    try:
+        Pickled = pickle.dumps(Data, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        if verbose:
+            print 'cannot cache ResultData of %s: %s' % (TestResultObject.ModulePath, e)
+        remove(TestResultObject)
+        return False
+
+    ROOTFileName = TestResultObject.FinalResultsStoragePath + '/' + CacheROOTFileName
+    if ROOTObjects:
+        ROOTFile = ROOT.TFile(ROOTFileName, 'RECREATE')
+        for Name, Object in ROOTObjects.items():
+            Object.Write(Name)
+        ROOTFile.Close()
+    elif os.path.exists(ROOTFileName):
+        os.remove(ROOTFileName)
+    f = open(TestResultObject.FinalResultsStoragePath + '/' + CacheFileName, 'wb')
+    f.write(Pickled)
+    f.close()
+    return True
+
+
+def remove(TestResultObject):
+    for FileName in [CacheFileName, CacheROOTFileName]:
+        if os.path.exists(TestResultObject.FinalResultsStoragePath + '/' + FileName):
+            os.remove(TestResultObject.FinalResultsStoragePath + '/' + FileName)
+
+
+def load(TestResultObject):
+    '''
+        returns the cached data if the key agrees, otherwise None
+    '''
+    FileName = TestResultObject.FinalResultsStoragePath + '/' + CacheFileName
+    if not os.path.exists(FileName):
+        return None
+    try:
+        f = open(FileName, 'rb')
+        Data = pickle.load(f)
+        f.close()
+    except Exception as e:
+        if verbose:
+            print 'cannot read %s: %s' % (FileName, e)
+        return None
+    if Data['Key'] != get_key(TestResultObject):
+        return None
+    return Data
+
+
+def restore_subtree(TestResultObject):
+    '''
+        restores the test result and all its sub test results, returns False if one of them is not cached
+    '''
+    CachedData = []
+    Objects = [TestResultObject]
+    while Objects:
+        Object = Objects.pop()
+        Data = load(Object)
+        if Data is None:
+            return False
+        CachedData.append((Object, Data))
+        Objects.extend(get_enabled_sub_test_results(Object))
+
+    for Object, Data in reversed(CachedData):
+        restore(Object, Data)
+    if verbose:
+        print 'restored %d test results of %s from cache' % (len(CachedData), TestResultObject.ModulePath)
+    return True
+
+
+def restore(TestResultObject, Data):
+    # other test results might read from the file handle
+    import ROOT
+    TestResultObject.OpenFileHandle()
+    TestResultObject.Title = Data['Title']
+    TestResultObject.Attributes.update(Data['Attributes'])
+    TestResultObject.ResultData.update(Data['ResultData'])
+    if Data['ROOTObjects']:
+        ROOTFile = ROOT.TFile.Open(TestResultObject.FinalResultsStoragePath + '/' + CacheROOTFileName)
+        for Key, SubKey in Data['ROOTObjects']:
+            Object = ROOTFile.Get('%s__%s' % (Key, SubKey))
+            if Object and Object.InheritsFrom('TH1'):
+                Object.SetDirectory(0)
+            elif Object:
+                Object = Object.Clone()
+            TestResultObject.ResultData[Key][SubKey] = Object
+        ROOTFile.Close()
+
+    # the plot file might have been compressed when the HTML was generated
+    Plot = TestResultObject.ResultData['Plot']
+    if Plot['ImageFile'] and not os.path.exists(Plot['ImageFile']) and os.path.exists(Plot['ImageFile'] + 'z'):
+        Plot['ImageFile'] += 'z'
+    TestResultObject.ResultDataRestored = True
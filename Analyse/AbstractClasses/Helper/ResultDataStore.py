@@ -0,0 +1,295 @@
+'''
+    Store of the populated test results of one qualification, a compressed pickle file in its
+    final results folder.
+
+    write() saves for every test result its class, its simple attributes, its place in the tree and
+    its ResultData (KeyValueDictPairs, KeyList, Table, Plot and HiddenData). Histograms are stored
+    as arrays of their bin contents and errors, other ROOT objects are not stored. The canvas of
+    every plot is kept as ROOT file next to the plot, see GeneralTestResult.SaveCanvas.
+
+    load() rebuilds the tree of test results from the store without CustomInit and
+    PopulateResultData, i.e. without reading raw data. The plots are drawn again from the stored
+    canvases in the current image formats and GenerateFinalOutput writes the HTML and JSON files
+    as usual, e.g. after a change of the HTML templates or image formats:
+        python Controller.py --render-only
+'''
+import os
+import gzip
+import array
+import importlib
+import cPickle as pickle
+import PlotRenderer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+StoreFileName = 'ResultDataStore.pkl.gz'
+# stores of another version are not read
+Version = 1
+
+StoredResultDataKeys = ['KeyValueDictPairs', 'KeyList', 'Plot', 'HiddenData', 'Table']
+StoredSubTestResultDictKeys = ['Key', 'Module', 'InitialAttributes', 'DisplayOptions']
+# attributes which are set again when the test result is restored
+RuntimeAttributes = ['ResultData', 'ResultDataRestored', 'RestoredFromStore', 'SVGFixed', 'ResultDataHTMLFragments',
+                     'Inputs', 'ParallelSubTestResults', 'SavePlotFile', 'GzipSVG', 'DefaultImageFormat',
+                     'AdditionalImageFormats', 'OverviewHTMLLink', 'ResultDataCacheSubtreeKey', 'ResultDataCacheContextKey']
+SimpleTypes = (str, unicode, int, long, float, bool, type(None))
+
+# histogram class -> type code of its bin contents
+HistogramTypeCodes = {
+    'TH1D': 'd', 'TH1F': 'f', 'TH1I': 'i', 'TH1S': 'h', 'TH1C': 'b',
+    'TH2D': 'd', 'TH2F': 'f', 'TH2I': 'i', 'TH2S': 'h', 'TH2C': 'b',
+}
+
+verbose = False
+
+
+def get_store_file_name(FinalModuleResultsPath):
+    return FinalModuleResultsPath + '/' + StoreFileName
+
+
+def get_final_module_results_path(TestResultObject):
+    '''
+        folder which contains the folder of the top test result
+    '''
+    return TestResultObject.FinalResultsStoragePath[:-len(TestResultObject.RelativeFinalResultsStoragePath)]
+
+
+def is_simple(Value):
+    if isinstance(Value, SimpleTypes):
+        return True
+    if isinstance(Value, (list, tuple, set)):
+        return all(is_simple(i) for i in Value)
+    if isinstance(Value, dict):
+        return all(is_simple(Key) and is_simple(i) for Key, i in Value.items())
+    return False
+
+
+def get_axis(Axis):
+    '''
+        (nBins, xMin, xMax, bin edges if the binning is variable, title)
+    '''
+    nBins = Axis.GetNbins()
+    Edges = None
+    if Axis.GetXbins().GetSize():
+        Edges = [Axis.GetBinLowEdge(Bin) for Bin in range(1, nBins + 2)]
+    return (nBins, Axis.GetXmin(), Axis.GetXmax(), Edges, Axis.GetTitle())
+
+
+def get_histogram_data(Histogram):
+    '''
+        bin contents (including under- and overflow) and errors of a TH1 or TH2 as arrays, None for other objects
+    '''
+    ClassName = Histogram.ClassName()
+    if ClassName not in HistogramTypeCodes:
+        return None
+    TypeCode = HistogramTypeCodes[ClassName]
+    nCells = Histogram.GetSize()
+    Contents = None
+    if numpy is not None:
+        try:
+            Contents = numpy.frombuffer(Histogram.GetArray(), dtype = numpy.dtype(TypeCode), count = nCells).tostring()
+        except (TypeError, ValueError, AttributeError):
+            Contents = None
+    if Contents is None:
+        TypeCode = 'd'
+        Contents = array.array(TypeCode, [Histogram.GetBinContent(Cell) for Cell in range(nCells)]).tostring()
+    Errors = None
+    if Histogram.GetSumw2N():
+        Sumw2 = Histogram.GetSumw2()
+        Errors = array.array('d', [Sumw2.At(Cell) for Cell in range(nCells)]).tostring()
+    return {
+        'Histogram': ClassName,
+        'Name': Histogram.GetName(),
+        'Title': Histogram.GetTitle(),
+        'Axes': [get_axis(Histogram.GetXaxis())] + ([get_axis(Histogram.GetYaxis())] if ClassName.startswith('TH2') else []),
+        'Contents': Contents,
+        'TypeCode': TypeCode,
+        'Sumw2': Errors,
+        'Entries': Histogram.GetEntries(),
+    }
+
+
+def get_histogram(Data):
+    '''
+        histogram from the arrays of get_histogram_data, not attached to a directory
+    '''
+    import ROOT
+    Arguments = [Data['Name'], Data['Title']]
+    Variable = any(Axis[3] for Axis in Data['Axes'])
+    for nBins, xMin, xMax, Edges, Title in Data['Axes']:
+        if Variable:
+            Arguments += [nBins, array.array('d', Edges or [xMin + (xMax - xMin) * Bin / float(nBins) for Bin in range(nBins + 1)])]
+        else:
+            Arguments += [nBins, xMin, xMax]
+    AddDirectory = ROOT.TH1.AddDirectoryStatus()
+    ROOT.TH1.AddDirectory(False)
+    try:
+        Histogram = getattr(ROOT, Data['Histogram'])(*Arguments)
+    finally:
+        ROOT.TH1.AddDirectory(AddDirectory)
+    Histogram.SetContent(array.array('d', array.array(Data['TypeCode'], Data['Contents'])))
+    if Data['Sumw2']:
+        Errors = array.array('d', Data['Sumw2'])
+        Histogram.Sumw2()
+        Histogram.GetSumw2().Set(len(Errors), Errors)
+    for Axis, AxisData in zip([Histogram.GetXaxis(), Histogram.GetYaxis()], Data['Axes']):
+        Axis.SetTitle(AxisData[4])
+    Histogram.SetEntries(Data['Entries'])
+    return Histogram
+
+
+def get_storable(Value, Description):
+    '''
+        copy of the value with histograms as arrays, values which can not be stored are None
+    '''
+    import ROOT
+    if isinstance(Value, dict):
+        return dict((Key, get_storable(i, '%s.%s' % (Description, Key))) for Key, i in Value.items())
+    if isinstance(Value, (list, tuple)):
+        return type(Value)(get_storable(i, Description) for i in Value)
+    if isinstance(Value, ROOT.TObject):
+        Data = get_histogram_data(Value)
+        if Data is None and verbose:
+            print 'cannot store %s (%s)' % (Description, Value.ClassName())
+        return Data
+    try:
+        pickle.dumps(Value, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        if verbose:
+            print 'cannot store %s: %s' % (Description, e)
+        return None
+    return Value
+
+
+def get_restored(Value):
+    if isinstance(Value, dict):
+        if 'Histogram' in Value and 'Contents' in Value:
+            return get_histogram(Value)
+        return dict((Key, get_restored(i)) for Key, i in Value.items())
+    if isinstance(Value, (list, tuple)):
+        return type(Value)(get_restored(i) for i in Value)
+    return Value
+
+
+def get_record(TestResultObject):
+    Record = {
+        'Module': type(TestResultObject).__module__,
+        'Class': type(TestResultObject).__name__,
+        'Attributes': dict((Key, Value) for Key, Value in TestResultObject.__dict__.items()
+                           if Key not in RuntimeAttributes and is_simple(Value)),
+        'ImageFormats': (TestResultObject.DefaultImageFormat, TestResultObject.AdditionalImageFormats),
+        'ResultData': {},
+        'SubTestResultDictList': [],
+    }
+    for Key in StoredResultDataKeys:
+        Record['ResultData'][Key] = get_storable(TestResultObject.ResultData[Key], '%s.%s' % (TestResultObject.ModulePath, Key))
+    for i in TestResultObject.ResultData['SubTestResultDictList']:
+        SubTestResultDict = dict((Key, i[Key]) for Key in StoredSubTestResultDictKeys if i.has_key(Key))
+        SubTestResultDict['Record'] = get_record(i['TestResultObject'])
+        Record['SubTestResultDictList'].append(SubTestResultDict)
+    return Record
+
+
+def write(TestResultObject):
+    '''
+        writes the tree of the top test result to its store, returns False if it could not be written
+    '''
+    FileName = get_store_file_name(get_final_module_results_path(TestResultObject))
+    try:
+        Pickled = pickle.dumps({'Version': Version, 'Record': get_record(TestResultObject)}, pickle.HIGHEST_PROTOCOL)
+        f = gzip.open(FileName + '.tmp', 'wb')
+        f.write(Pickled)
+        f.close()
+        os.rename(FileName + '.tmp', FileName)
+    except Exception as e:
+        print '\x1b[31mcannot write %s: %s\x1b[0m' % (FileName, e)
+        return False
+    return True
+
+
+def redraw(TestResultObject, StoredImageFormats):
+    '''
+        draws the plot again from the stored canvas in the current image formats
+    '''
+    Plot = TestResultObject.ResultData['Plot']
+    # formats which were not set by the test result itself follow the configuration
+    if Plot['Format'] == StoredImageFormats[0]:
+        Plot['Format'] = TestResultObject.DefaultImageFormat
+    if Plot['AdditionalFormats'] == StoredImageFormats[1]:
+        Plot['AdditionalFormats'] = TestResultObject.AdditionalImageFormats
+    CanvasFileName = Plot.get('CanvasFile')
+    if not (Plot['Enabled'] and TestResultObject.SavePlotFile and CanvasFileName and os.path.exists(CanvasFileName)):
+        # the plot file is used as it is, it might have been compressed
+        if Plot['ImageFile'] and not os.path.exists(Plot['ImageFile']) and os.path.exists(Plot['ImageFile'] + 'z'):
+            Plot['ImageFile'] += 'z'
+        return False
+    FileNames = [TestResultObject.GetPlotFileName()] + [TestResultObject.GetPlotFileName(Suffix) for Suffix in Plot['AdditionalFormats']]
+    PlotRenderer.redraw(CanvasFileName, [FileName for FileName in FileNames if FileName != CanvasFileName],
+                        TestResultObject.TestResultEnvironmentObject.Configuration['PlotRenderProcesses'])
+    Plot['ImageFile'] = FileNames[0]
+    if 'pdf' in Plot['AdditionalFormats']:
+        Plot['ImageFilePDF'] = TestResultObject.GetPlotFileName('pdf')
+    return True
+
+
+def restore(Record, TestResultEnvironmentObject, ParentObject = None):
+    Class = getattr(importlib.import_module(Record['Module']), Record['Class'])
+    TestResultObject = Class.__new__(Class)
+    TestResultObject.HistoDict = None
+    TestResultObject.__dict__.update(Record['Attributes'])
+    TestResultObject.TestResultEnvironmentObject = TestResultEnvironmentObject
+    TestResultObject.ParentObject = ParentObject
+    TestResultObject.Canvas = TestResultEnvironmentObject.GetCanvas()
+    TestResultObject.FileHandle = 0
+    TestResultObject.SetOutputOptions(TestResultEnvironmentObject)
+    TestResultObject.RestoredFromStore = True
+    TestResultObject.SVGFixed = False
+    TestResultObject.ResultDataHTMLFragments = {}
+    TestResultObject.Inputs = None
+    TestResultObject.ParallelSubTestResults = False
+    TestResultObject.ResultData = get_restored(Record['ResultData'])
+    TestResultObject.ResultData['SubTestResults'] = {}
+    TestResultObject.ResultData['SubTestResultDictList'] = []
+    # plots which are not drawn again must not be processed a second time, see FixSVGFile
+    TestResultObject.ResultDataRestored = not redraw(TestResultObject, Record['ImageFormats'])
+
+    for SubTestResultDict in Record['SubTestResultDictList']:
+        SubTestResultObject = restore(SubTestResultDict.pop('Record'), TestResultEnvironmentObject, TestResultObject)
+        SubTestResultDict['TestResultObject'] = SubTestResultObject
+        TestResultObject.ResultData['SubTestResults'][SubTestResultDict['Key']] = SubTestResultObject
+        TestResultObject.ResultData['SubTestResultDictList'].append(SubTestResultDict)
+    return TestResultObject
+
+
+def read(FileName):
+    '''
+        the stored records without restoring the test results, None if the store can not be read
+    '''
+    try:
+        f = gzip.open(FileName, 'rb')
+        Data = pickle.loads(f.read())
+        f.close()
+    except Exception as e:
+        print '\x1b[31mcannot read %s: %s\x1b[0m' % (FileName, e)
+        return None
+    if Data.get('Version') != Version:
+        print '\x1b[31m%s has version %s instead of %s, the qualification has to be analysed again\x1b[0m' % (
+            FileName, Data.get('Version'), Version)
+        return None
+    return Data
+
+
+def load(TestResultEnvironmentObject, FinalModuleResultsPath):
+    '''
+        the top test result of the qualification with all its sub test results, None if there is no valid store
+    '''
+    FileName = get_store_file_name(FinalModuleResultsPath)
+    if not os.path.exists(FileName):
+        return None
+    Data = read(FileName)
+    if Data is None:
+        return None
+    return restore(Data['Record'], TestResultEnvironmentObject)
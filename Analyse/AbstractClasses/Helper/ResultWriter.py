@@ -0,0 +1,205 @@
+'''
+    Writes the rows of the test results to the table ModuleTestResults of the local SQLite DB.
+
+    The test results add their rows with add(), flush() writes all rows of a qualification in one
+    transaction: one executemany for the DELETEs of the older results of the same tests and one
+    executemany per column list for the INSERTs. Rows which a later row of the same batch replaces
+    are not written, so the table is the same as after writing the rows one by one.
+
+    With start_process() the rows are written by a dedicated process which owns the only writing
+    connection, flush() sends the batch over a queue and waits until it is committed. The process
+    has to be started before the analysis workers are forked, they share its queue.
+'''
+import os
+import sys
+import traceback
+import collections
+import multiprocessing
+import multiprocessing.queues
+import sqlite3
+
+DeleteSQL = 'DELETE FROM ModuleTestResults WHERE ModuleID = ? AND TestType = ? AND QualificationType = ? AND TestDate <= ?'
+# the parameters of DeleteSQL
+KeyColumns = ('ModuleID', 'TestType', 'QualificationType', 'TestDate')
+
+# number of failed batches the waiting processes can look up
+FailedBatchesSize = 64
+
+verbose = False
+
+
+def connect(DBPath, BusyTimeout = 60., JournalMode = 'WAL'):
+    '''
+        connection to the SQLite DB which waits up to BusyTimeout seconds for locks of other processes
+    '''
+    Connection = sqlite3.connect(DBPath, timeout = BusyTimeout)
+    Connection.text_factory = str
+    set_journal_mode(Connection, JournalMode)
+    return Connection
+
+
+def set_journal_mode(Connection, JournalMode):
+    '''
+        with WAL the readers do not block the writer and the other way round,
+        the DB must not be on a network file system then
+    '''
+    if not JournalMode:
+        return
+    try:
+        Connection.execute('PRAGMA journal_mode=%s' % JournalMode)
+        if JournalMode.upper() == 'WAL':
+            # in WAL mode safe against corruption, only the last transactions can be lost at a power failure
+            Connection.execute('PRAGMA synchronous=NORMAL')
+    except sqlite3.OperationalError as e:
+        print 'cannot set journal mode %s of the DB: %s' % (JournalMode, e)
+
+
+def get_insert_sql(Columns):
+    return 'INSERT INTO ModuleTestResults (%s) VALUES (%s)' % (', '.join(Columns), ', '.join(['?'] * len(Columns)))
+
+
+def replaces(Key, OtherKey):
+    '''
+        True if the DELETE of the row with Key removes the row with OtherKey
+    '''
+    return Key[:3] == OtherKey[:3] and OtherKey[3] <= Key[3]
+
+
+def remove_replaced_rows(Batch):
+    '''
+        rows of the batch which are not deleted by a later row
+    '''
+    Rows = []
+    for Index, (Columns, Values, Key) in enumerate(Batch):
+        if not [1 for LaterColumns, LaterValues, LaterKey in Batch[Index + 1:] if replaces(LaterKey, Key)]:
+            Rows.append((Columns, Values, Key))
+    return Rows
+
+
+def write_batch(Connection, Batch):
+    '''
+        writes the rows (columns, values, key) in one transaction, returns the number of inserted rows
+    '''
+    if not Batch:
+        return 0
+    Rows = remove_replaced_rows(Batch)
+    Inserts = collections.OrderedDict()
+    for Columns, Values, Key in Rows:
+        Inserts.setdefault(Columns, []).append(Values)
+    with Connection:
+        Connection.executemany(DeleteSQL, [Key for Columns, Values, Key in Batch])
+        for Columns, ValuesList in Inserts.items():
+            Connection.executemany(get_insert_sql(Columns), ValuesList)
+    return len(Rows)
+
+
+def run_process(DBPath, BusyTimeout, JournalMode, Queue, Committed, FailedBatches, Condition):
+    '''
+        main loop of the writer process, a batch None stops it
+    '''
+    Connection = connect(DBPath, BusyTimeout, JournalMode)
+    while True:
+        Item = Queue.get()
+        if Item is None:
+            break
+        Number, Batch = Item
+        try:
+            nRows = write_batch(Connection, Batch)
+            if verbose:
+                print 'result writer: batch %d, %d rows written' % (Number, nRows)
+        except Exception:
+            traceback.print_exc()
+            FailedBatches[Number % FailedBatchesSize] = Number
+        sys.stdout.flush()
+        with Condition:
+            Committed.value = Number
+            Condition.notify_all()
+    Connection.close()
+
+
+class ResultWriter(object):
+
+    def __init__(self, DBPath, BusyTimeout = 60., JournalMode = 'WAL'):
+        self.DBPath = DBPath
+        self.BusyTimeout = BusyTimeout
+        self.JournalMode = JournalMode
+        # connection of this process, used if there is no writer process
+        self.Connection = None
+        # (columns, values, key) of the rows which are not written yet
+        self.Batch = []
+        # IDs of the modules whose rows were written, their rows of the overview are built again
+        self.WrittenModuleIDs = set()
+        self.Process = None
+
+    def add(self, Row, Columns, Parameters = None):
+        '''
+            adds the row, Parameters are the keys of Row which are written to Columns, default Columns
+        '''
+        Values = tuple(Row[Parameter] for Parameter in (Parameters or Columns))
+        Key = tuple(Row[Column] for Column in KeyColumns)
+        self.Batch.append((tuple(Columns), Values, Key))
+
+    def clear(self):
+        '''
+            discards the rows which are not written and the written module IDs, e.g. in a forked process
+        '''
+        del self.Batch[:]
+        self.WrittenModuleIDs.clear()
+
+    def flush(self):
+        '''
+            writes all added rows, returns when they are committed
+        '''
+        Batch = self.Batch
+        self.Batch = []
+        if not Batch:
+            return
+        self.WrittenModuleIDs.update(Key[0] for Columns, Values, Key in Batch)
+        if self.Process:
+            self.send(Batch)
+        else:
+            write_batch(self.Connection, Batch)
+
+    def start_process(self):
+        if self.Process:
+            return
+        # the put of a SimpleQueue is written to the pipe at once, the batches arrive in the order of their numbers
+        self.Queue = multiprocessing.queues.SimpleQueue()
+        self.Sequence = multiprocessing.Value('l', 0)
+        self.Committed = multiprocessing.Value('l', 0, lock = False)
+        self.FailedBatches = multiprocessing.Array('l', [0] * FailedBatchesSize, lock = False)
+        self.Condition = multiprocessing.Condition()
+        self.Process = multiprocessing.Process(target = run_process,
+                                               args = (self.DBPath, self.BusyTimeout, self.JournalMode, self.Queue,
+                                                       self.Committed, self.FailedBatches, self.Condition))
+        self.Process.daemon = True
+        self.Process.start()
+        self.ProcessPid = self.Process.pid
+
+    def send(self, Batch):
+        with self.Sequence.get_lock():
+            self.Sequence.value += 1
+            Number = self.Sequence.value
+            self.Queue.put((Number, Batch))
+        with self.Condition:
+            while self.Committed.value < Number:
+                self.Condition.wait(1)
+                if self.Committed.value < Number and not self.is_process_alive():
+                    raise RuntimeError('result writer process stopped, %d rows not written' % len(Batch))
+        if self.FailedBatches[Number % FailedBatchesSize] == Number:
+            raise RuntimeError('result writer process could not write %d rows' % len(Batch))
+
+    def is_process_alive(self):
+        # Process.is_alive() can only be called in the process which started it
+        try:
+            os.kill(self.ProcessPid, 0)
+        except OSError:
+            return False
+        return True
+
+    def stop_process(self):
+        if not self.Process:
+            return
+        self.Queue.put(None)
+        self.Process.join()
+        self.Process = None
@@ -0,0 +1,99 @@
+'''
+    Post processing of the SVG plots written by ROOT, in one pass over the file:
+        - preserveAspectRatio="xMinYMin" for the first <svg tag (resized svg in chrome / safari)
+        - invalid spaces at the start of attribute values (width=" 10" -> width="10")
+        - &#786 -> &#176 (degree sign)
+    The file is read in chunks and written directly to the .svgz file (or to the .svg again).
+'''
+import os
+import re
+import gzip
+from multiprocessing.pool import ThreadPool
+
+ChunkSize = 1 << 20
+
+# the same substitutions as the former replace passes: width, height, x, y and r lose up to two
+# spaces (their own replace and the general one), all other attributes one
+_Pattern = re.compile(r'(<svg(?: preserveAspectRatio)?)|(width|height|[xyr])=" {1,2}|=" |&#786')
+# no match is longer than this, text closer than this to the end of the read data is kept for the next chunk
+_MaxMatchLength = len('<svg preserveAspectRatio')
+
+verbose = False
+
+
+def fix_chunk(Text, Final, State):
+    '''
+        returns the processed text and the rest of Text which has to be processed with the next chunk
+    '''
+    Cut = len(Text) if Final else len(Text) - _MaxMatchLength
+    Parts = []
+    Position = 0
+    for Match in _Pattern.finditer(Text):
+        if Match.start() >= Cut:
+            break
+        Parts.append(Text[Position:Match.start()])
+        if Match.group(1):
+            if State['SVGTagFound'] or Match.group(1) != '<svg':
+                Parts.append(Match.group(1))
+            else:
+                Parts.append('<svg preserveAspectRatio="xMinYMin"')
+            State['SVGTagFound'] = True
+        elif Match.group(2):
+            Parts.append(Match.group(2) + '="')
+        elif Match.group(0) == '&#786':
+            Parts.append('&#176')
+        else:
+            Parts.append('="')
+        Position = Match.end()
+    if Position < Cut:
+        Parts.append(Text[Position:Cut])
+        Position = Cut
+    return ''.join(Parts), Text[Position:]
+
+
+def fix_svg(FileName, Gzip = True, CompressionLevel = 9):
+    '''
+        fixes the svg file, with Gzip it is replaced by FileName + 'z'
+        returns the name of the written file
+    '''
+    if Gzip and not FileName.endswith('.svgz'):
+        OutputFileName = FileName + 'z'
+        OutputFile = gzip.GzipFile(OutputFileName, 'wb', CompressionLevel)
+    else:
+        OutputFileName = FileName
+        OutputFile = open(FileName + '.tmp', 'wb')
+    InputFile = open(FileName, 'rb')
+    State = {'SVGTagFound': False}
+    Rest = ''
+    while True:
+        Chunk = InputFile.read(ChunkSize)
+        Text, Rest = fix_chunk(Rest + Chunk, not Chunk, State)
+        OutputFile.write(Text)
+        if not Chunk:
+            break
+    InputFile.close()
+    OutputFile.close()
+
+    if OutputFileName != FileName:
+        os.remove(FileName)
+    else:
+        os.rename(FileName + '.tmp', FileName)
+        if os.path.exists(FileName + 'z'):
+            os.remove(FileName + 'z')
+    return OutputFileName
+
+
+def fix_svgs(TestResultObjects, nThreads):
+    '''
+        calls FixSVGFile of all test results, the compression runs in parallel threads
+    '''
+    if nThreads < 2 or len(TestResultObjects) < 2:
+        for TestResultObject in TestResultObjects:
+            TestResultObject.FixSVGFile()
+        return
+    Pool = ThreadPool(nThreads)
+    try:
+        Pool.map(lambda TestResultObject: TestResultObject.FixSVGFile(), TestResultObjects, chunksize = 1)
+    finally:
+        Pool.close()
+        Pool.join()
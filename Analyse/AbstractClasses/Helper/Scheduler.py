@@ -0,0 +1,197 @@
+'''
+    Populates the sub test results of a test result as a dependency graph.
+
+    Every test result declares in self.Inputs the keys of the sub test results of its parent
+    it reads (via ParentObject.ResultData['SubTestResults']). If it does not declare them
+    (Inputs = None), it depends on all sub test results before it, which is the order
+    of the SubTestResultDictList. A test result is always populated after its own sub test results.
+
+    For test results with ParallelSubTestResults the sub test results whose inputs are
+    populated are started in worker processes, e.g. the chips of a module or the
+    Fulltests at different temperatures. A worker populates the whole subtree and writes it
+    with the ResultDataCache to the storage folders, the main process restores it from there.
+    Subtrees which fail in the worker are populated again in the main process.
+'''
+import sys
+import traceback
+import Queue
+import multiprocessing
+import ResultDataCache
+import HistoGetter
+import Profiler
+import PlotRenderer
+
+verbose = False
+
+# the ids of the ROOT objects created by different workers must not collide
+UniqueIDOffset = 1000000
+
+
+def get_enabled_sub_test_results(TestResultObject):
+    return ResultDataCache.get_enabled_sub_test_results(TestResultObject)
+
+
+def get_subtree(TestResultObject):
+    Subtree = [TestResultObject]
+    for SubTestResult in get_enabled_sub_test_results(TestResultObject):
+        Subtree.extend(get_subtree(SubTestResult))
+    return Subtree
+
+
+def get_dependencies(TestResultObject):
+    '''
+        key of every enabled sub test result -> set of keys of the sub test results it depends on
+    '''
+    Keys = [SubTestResult.Key for SubTestResult in get_enabled_sub_test_results(TestResultObject)]
+    Dependencies = {}
+    for Index, Key in enumerate(Keys):
+        Inputs = TestResultObject.ResultData['SubTestResults'][Key].Inputs
+        if Inputs is None:
+            Dependencies[Key] = set(Keys[:Index])
+        else:
+            Dependencies[Key] = set(Input for Input in Inputs if Input in Keys and Input != Key)
+    return Dependencies
+
+
+def get_order(TestResultObject):
+    '''
+        keys of the enabled sub test results in an order which satisfies all dependencies,
+        the declaration order is kept where possible
+    '''
+    Dependencies = get_dependencies(TestResultObject)
+    Pending = [SubTestResult.Key for SubTestResult in get_enabled_sub_test_results(TestResultObject)]
+    Order = []
+    while Pending:
+        Ready = [Key for Key in Pending if Dependencies[Key] <= set(Order)]
+        if not Ready:
+            raise ValueError('cyclic inputs in the sub test results of %s: %s' % (TestResultObject.ModulePath, ', '.join(Pending)))
+        Order.append(Ready[0])
+        Pending.remove(Ready[0])
+    return Order
+
+
+def populate_sub_test_results(TestResultObject):
+    '''
+        populates all enabled sub test results of TestResultObject
+    '''
+    nProcesses = TestResultObject.TestResultEnvironmentObject.Configuration['Scheduler']['nProcesses']
+    Order = get_order(TestResultObject)
+    if nProcesses > 1 and TestResultObject.ParallelSubTestResults and len(Order) > 1:
+        populate_parallel(TestResultObject, nProcesses)
+    else:
+        for Key in Order:
+            TestResultObject.PopulateSubTestResult(TestResultObject.ResultData['SubTestResults'][Key])
+
+
+def populate_parallel(TestResultObject, nProcesses):
+    Dependencies = get_dependencies(TestResultObject)
+    Pending = [SubTestResult.Key for SubTestResult in get_enabled_sub_test_results(TestResultObject)]
+    Done = set()
+    Running = {}
+    ResultQueue = multiprocessing.Queue()
+    nStarted = 0
+    while Pending or Running:
+        Ready = [Key for Key in Pending if Dependencies[Key] <= Done]
+        if not Ready and not Running:
+            raise ValueError('cyclic inputs in the sub test results of %s: %s' % (TestResultObject.ModulePath, ', '.join(Pending)))
+        for Key in Ready[:max(nProcesses - len(Running), 0)]:
+            Pending.remove(Key)
+            nStarted += 1
+            Running[Key] = start_worker(TestResultObject.ResultData['SubTestResults'][Key], ResultQueue, nStarted, nProcesses)
+        if not Running:
+            continue
+        Key, Stored, Restored, Records = wait_for_worker(Running, ResultQueue)
+        Running.pop(Key).join()
+        Profiler.add_records(Records)
+        finish_worker(TestResultObject.ResultData['SubTestResults'][Key], Stored, Restored)
+        Done.add(Key)
+
+
+def start_worker(SubTestResultObject, ResultQueue, WorkerNumber, nProcesses):
+    # the keys depend on the file system and the sub test results before, they are calculated
+    # here so that the worker and the main process see the same ones
+    for Node in get_subtree(SubTestResultObject):
+        ResultDataCache.get_key(Node)
+    if verbose:
+        print 'populating %s in worker %d' % (SubTestResultObject.ModulePath, WorkerNumber)
+    # not a pool, the workers have to be able to start fitting processes
+    Process = multiprocessing.Process(target = populate_in_worker,
+                                      args = (SubTestResultObject, ResultQueue, WorkerNumber, nProcesses))
+    Process.start()
+    return Process
+
+
+def wait_for_worker(Running, ResultQueue):
+    '''
+        returns (key, stored, restored module paths, profiler records) of the next worker which finished,
+        workers which died without result count as not stored
+    '''
+    while True:
+        try:
+            Result = ResultQueue.get(timeout = 1)
+            if Result[0] in Running:
+                return Result
+        except Queue.Empty:
+            for Key, Process in Running.items():
+                if not Process.is_alive() and Process.exitcode:
+                    return Key, False, [], []
+
+
+def reopen_file_handles(TestResultObject):
+    '''
+        the ROOT files of the parents are opened again, a file handle which is shared with
+        the main process shares the file position as well
+    '''
+    import ROOT
+    Reopened = {}
+    Object = TestResultObject
+    while Object:
+        FileHandle = Object.FileHandle
+        if isinstance(FileHandle, ROOT.TFile):
+            if id(FileHandle) not in Reopened:
+                Reopened[id(FileHandle)] = ROOT.TFile.Open(FileHandle.GetName())
+            Object.FileHandle = Reopened[id(FileHandle)]
+        Object = Object.ParentObject
+    HistoGetter.reopen_array_stores()
+
+
+def populate_in_worker(SubTestResultObject, ResultQueue, WorkerNumber, nProcesses):
+    Environment = SubTestResultObject.TestResultEnvironmentObject
+    Environment.LastUniqueIDCounter += UniqueIDOffset * WorkerNumber
+    Environment.Configuration['Scheduler'] = dict(Environment.Configuration['Scheduler'], nProcesses = 1)
+    Fitting = Environment.Configuration['Fitting']
+    Environment.Configuration['Fitting'] = dict(Fitting, nProcesses = max(Fitting['nProcesses'] // nProcesses, 1))
+    nErrors = len(Environment.ErrorList)
+    nRecords = len(Profiler.get_records())
+    Stored = False
+    Restored = []
+    try:
+        reopen_file_handles(SubTestResultObject.ParentObject)
+        SubTestResultObject.ParentObject.PopulateSubTestResult(SubTestResultObject)
+        if PlotRenderer.close():
+            Environment.ErrorList.append({'ModulePath': SubTestResultObject.ModulePath, 'ErrorCode': 'plots missing',
+                                          'FinalResultsStoragePath': SubTestResultObject.FinalResultsStoragePath})
+        if len(Environment.ErrorList) == nErrors:
+            Stored = all([ResultDataCache.store(Node) for Node in get_subtree(SubTestResultObject)])
+        Restored = [Node.ModulePath for Node in get_subtree(SubTestResultObject) if Node.ResultDataRestored]
+    except Exception:
+        traceback.print_exc()
+    sys.stdout.flush()
+    ResultQueue.put((SubTestResultObject.Key, Stored, Restored, Profiler.get_records(nRecords)))
+
+
+def finish_worker(SubTestResultObject, Stored, Restored):
+    Environment = SubTestResultObject.TestResultEnvironmentObject
+    ParentObject = SubTestResultObject.ParentObject
+    if Stored and ResultDataCache.restore_subtree(SubTestResultObject):
+        # only the test results which the worker took from the cache have their final plot files already
+        Subtree = get_subtree(SubTestResultObject)
+        for Node in Subtree:
+            Node.ResultDataRestored = Node.ModulePath in Restored
+        if not Environment.Configuration['ResultDataCache']:
+            for Node in Subtree:
+                ResultDataCache.remove(Node)
+    else:
+        if verbose:
+            print 'populating %s again in the main process' % SubTestResultObject.ModulePath
+        ParentObject.PopulateSubTestResult(SubTestResultObject)
@@ -0,0 +1,105 @@
+'''
+    Registry of the test result classes: package of a test result
+    (e.g. TestResultClasses.CMSPixel.QualificationGroup.Fulltest.Chips) -> module which defines
+    its TestResult class (<package>.<last part of package> or <package>.TestResult).
+
+    The registry is generated once by walking TestResultClasses and written to RegistryFileName,
+    later runs only read this file. Packages which are missing in the registry or whose module
+    was renamed are looked up again and the file is rewritten.
+    Run this file to regenerate the registry.
+'''
+import os
+import json
+
+RootPackage = 'TestResultClasses'
+RegistryFileName = RootPackage + '/TestResultRegistry.json'
+
+# directory which contains TestResultClasses
+BaseDirectory = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+verbose = False
+
+# package -> module name, None until the registry is loaded
+_Modules = None
+# package -> TestResult class
+_Classes = {}
+
+
+def get_file_name(ModuleName):
+    return BaseDirectory + '/' + ModuleName.replace('.', '/') + '.py'
+
+
+def find_module_name(Package):
+    '''
+        module of the TestResult class of a package, None if there is none
+    '''
+    for Name in [Package.split('.')[-1], 'TestResult']:
+        if os.path.isfile(get_file_name(Package + '.' + Name)):
+            return Package + '.' + Name
+    return None
+
+
+def generate():
+    Modules = {}
+    for Directory, SubDirectories, Files in os.walk(BaseDirectory + '/' + RootPackage):
+        if '__init__.py' not in Files:
+            continue
+        Package = os.path.relpath(Directory, BaseDirectory).replace(os.sep, '.')
+        ModuleName = find_module_name(Package)
+        if ModuleName:
+            Modules[Package] = ModuleName
+    return Modules
+
+
+def save():
+    try:
+        f = open(BaseDirectory + '/' + RegistryFileName, 'w')
+        json.dump(_Modules, f, sort_keys = True, indent = 4)
+        f.close()
+    except (IOError, OSError) as e:
+        if verbose:
+            print 'cannot write test result registry: %s' % e
+
+
+def load():
+    global _Modules
+    if _Modules is None:
+        try:
+            f = open(BaseDirectory + '/' + RegistryFileName, 'r')
+            _Modules = json.load(f)
+            f.close()
+        except (IOError, OSError, ValueError):
+            _Modules = generate()
+            save()
+    return _Modules
+
+
+def get_module_name(Package):
+    Modules = load()
+    ModuleName = Modules.get(Package)
+    if not ModuleName or not os.path.isfile(get_file_name(ModuleName)):
+        ModuleName = find_module_name(Package)
+        if ModuleName:
+            if verbose:
+                print 'adding %s to test result registry' % ModuleName
+            Modules[Package] = ModuleName
+            save()
+    return ModuleName
+
+
+def get_test_result_class(Package):
+    '''
+        TestResult class of a package, the module is imported on first use
+    '''
+    if Package not in _Classes:
+        ModuleName = get_module_name(Package)
+        if not ModuleName:
+            raise ImportError('no TestResult class in %s' % Package)
+        _Classes[Package] = __import__(ModuleName, fromlist = ['TestResult'], level = 0).TestResult
+    return _Classes[Package]
+
+
+if __name__ == '__main__':
+    _Modules = generate()
+    save()
+    print 'registered %d test result classes in %s' % (len(_Modules), RegistryFileName)
@@ -1,5 +1,6 @@
 import hashlib
 import os
+import json
 
 verbose = False
 def get_python_file_list(rootdir):
@@ -26,17 +27,54 @@ def hashfile(fileName, hasher, blocksize=65536):
 def md5(fileName):
     return hashfile(fileName,hashlib.md5())
 
-def create_hash_list(fileList):
-    hashlist = [(file,hashfile(file,hashlib.md5())) for file in fileList]
+def create_hash_list(fileList, cache=None):
+    '''
+        cache: file name -> [size, mtime, md5], files with the same size and mtime are not read again
+    '''
+    if cache is None:
+        return [(file,hashfile(file,hashlib.md5())) for file in fileList]
+    hashlist = []
+    for file in fileList:
+        stat = os.stat(file)
+        signature = [stat.st_size, stat.st_mtime]
+        if file not in cache or cache[file][:2] != signature:
+            cache[file] = signature + [hashfile(file,hashlib.md5())]
+        hashlist.append((file,cache[file][2]))
     return hashlist
 
+def read_hash_cache(cacheFileName):
+    try:
+        fobj = open(cacheFileName, "r")
+        cache = json.load(fobj)
+        fobj.close()
+        return dict((str(file), value) for file, value in cache.items())
+    except (IOError, ValueError):
+        return {}
+
+def write_hash_cache(cacheFileName, cache, fileList):
+    try:
+        fobj = open(cacheFileName, "w")
+        json.dump(dict((file, cache[file]) for file in fileList if file in cache), fobj)
+        fobj.close()
+    except IOError:
+        if verbose: print 'cannot write ' + cacheFileName
+
 def fill_hash_file(outputfile,hashlist):
     for i in hashlist:
         outputfile.write(str(i[0])+' '+(i[1])+'\n')
 
-def create_hash_file_directory(filename,directory):
+def create_hash_file_directory(filename,directory,useCache=True):
+    '''
+        writes the md5 sums of all python files in directory to filename,
+        with useCache only files whose size or mtime changed since the last call are read (cache in filename.cache)
+    '''
     fileList = get_python_file_list(directory)
-    hashList = create_hash_list(fileList)
+    if useCache:
+        cache = read_hash_cache(filename + '.cache')
+        hashList = create_hash_list(fileList, cache)
+        write_hash_cache(filename + '.cache', cache, fileList)
+    else:
+        hashList = create_hash_list(fileList)
     fobj = open(filename, "w")
     fill_hash_file(fobj,hashList)
     fobj.close()
@@ -2,38 +2,42 @@ import AbstractClasses.Helper.HtmlParser
 import re
 import datetime
 import os
+import json
+import hashlib
 class ModuleResultOverview:
+    # rows of the overview for the client side table, also the cache of the merged rows of the modules
+    JSONFileName = 'Overview.json'
+    # part of the fingerprint of the rows, has to be increased if MergeDBRows creates other cells
+    RowFormatVersion = 1
+
     def __init__(self, TestResultEnvironmentObject):
         self.TestResultEnvironmentObject = TestResultEnvironmentObject
         self.GlobalOverviewPath = self.TestResultEnvironmentObject.GlobalOverviewPath
 
-    def TableData(self, ModuleID = None, TestDate = None, GlobalOverviewList = True):
-        HtmlParser = self.TestResultEnvironmentObject.HtmlParser
-
+    def GetDBRows(self, ModuleID = None, TestDate = None):
         if self.TestResultEnvironmentObject.Configuration['Database']['UseGlobal']:
-            Rows = {}
-        else:
-            AdditionalWhere = ''
-            if ModuleID:
-                AdditionalWhere += ' AND ModuleID=:ModuleID '
-            if TestDate:
-                AdditionalWhere += ' AND TestDate=:TestDate '
-            self.TestResultEnvironmentObject.LocalDBConnectionCursor.execute(
-                'SELECT * FROM ModuleTestResults '+
-                'WHERE 1=1 '+
-                AdditionalWhere+
-                'ORDER BY ModuleID ASC,TestType ASC,TestDate ASC ',
-                {
-                    'ModuleID':ModuleID,
-                    'TestDate':TestDate
-                }
-            )
-            Rows = self.TestResultEnvironmentObject.LocalDBConnectionCursor.fetchall()
-
-        TableHTMLTemplate = HtmlParser.getSubpart(self.TestResultEnvironmentObject.OverviewHTMLTemplate, '###OVERVIEWTABLE###')
-        TableBodyHTMLTemplate = HtmlParser.getSubpart(TableHTMLTemplate, '###BODY###')
-        CellLinkHTMLTemplate  = HtmlParser.getSubpart(TableBodyHTMLTemplate, '###LINK###')
+            return {}
+        AdditionalWhere = ''
+        if ModuleID:
+            AdditionalWhere += ' AND ModuleID=:ModuleID '
+        if TestDate:
+            AdditionalWhere += ' AND TestDate=:TestDate '
+        self.TestResultEnvironmentObject.LocalDBConnectionCursor.execute(
+            'SELECT * FROM ModuleTestResults '+
+            'WHERE 1=1 '+
+            AdditionalWhere+
+            'ORDER BY ModuleID ASC,TestType ASC,TestDate ASC ',
+            {
+                'ModuleID':ModuleID,
+                'TestDate':TestDate
+            }
+        )
+        return self.TestResultEnvironmentObject.LocalDBConnectionCursor.fetchall()
 
+    '''
+        labels and DB column names of the columns of the global overview or of the list of a module
+    '''
+    def GetTableColumns(self, GlobalOverviewList = True):
         TableColumns = [
             {
                 'Label':'Module ID',
@@ -133,42 +137,72 @@ class ModuleResultOverview:
         ]
 
 
-        TableData = {
-            'HEADER':[[]],
-            'BODY':[],
-            'FOOTER':[],
-        }
+        Labels = []
         TableColumnList = []
-
-
         for ColumnDict in TableColumns:
             if ((not GlobalOverviewList and ColumnDict.has_key('InFullList')  and ColumnDict['InFullList'] == True)
                 or
                 (not GlobalOverviewList and not ColumnDict.has_key('InFullList'))
                 or
                 (GlobalOverviewList and ColumnDict.has_key('InGlobalOverviewList') and ColumnDict['InGlobalOverviewList'] == True)):
-                TableData['HEADER'][0].append(ColumnDict['Label'])
+                Labels.append(ColumnDict['Label'])
                 TableColumnList.append(ColumnDict['DBColumnName'])
-
-        FinalModuleRowsDict = {}
-        ModuleIDList = []
-
+        return Labels, TableColumnList
+
+    '''
+        key of the row of the table a DB row belongs to, None if it is not shown
+    '''
+    def GetIdentificator(self, RowTuple, GlobalOverviewList = True):
+        Identificator = RowTuple['ModuleID']
+        if not GlobalOverviewList:
+            Identificator+='_%s'%RowTuple['TestType']
+            if RowTuple['TestType'] == 'TemperatureCycle':
+                return None
+        else:
+            Identificator+='_%s'%RowTuple['QualificationType']
+        return Identificator
+
+    '''
+        the DB rows which belong to a row of the table, their order in the table is the one
+        in which their first DB row was found
+    '''
+    def GroupDBRows(self, Rows, GlobalOverviewList = True):
+        Groups = {}
+        Identificators = []
         for RowTuple in Rows:
-            Identificator = RowTuple['ModuleID']
-            if not GlobalOverviewList:
-                Identificator+='_%s'%RowTuple['TestType']
-                if RowTuple['TestType'] == 'TemperatureCycle':
-                    continue
-            else:
-                Identificator+='_%s'%RowTuple['QualificationType']
-#            Identificator+='_%s'%RowTuple['TestDate']
-#            print Identificator
-            if not FinalModuleRowsDict.has_key(Identificator):
-                FinalModuleRowsDict[Identificator] = {}
-                ModuleIDList.append(Identificator)
-#                print 'added'
-
-                RowDict = FinalModuleRowsDict[Identificator]
+            Identificator = self.GetIdentificator(RowTuple, GlobalOverviewList)
+            if Identificator is None:
+                continue
+            if not Groups.has_key(Identificator):
+                Groups[Identificator] = []
+                Identificators.append(Identificator)
+            Groups[Identificator].append(RowTuple)
+        return [(Identificator, Groups[Identificator]) for Identificator in Identificators]
+
+    def GetCellLinkHTMLTemplate(self):
+        HtmlParser = self.TestResultEnvironmentObject.HtmlParser
+        TableHTMLTemplate = HtmlParser.getSubpart(self.TestResultEnvironmentObject.OverviewHTMLTemplate, '###OVERVIEWTABLE###')
+        TableBodyHTMLTemplate = HtmlParser.getSubpart(TableHTMLTemplate, '###BODY###')
+        return HtmlParser.getSubpart(TableBodyHTMLTemplate, '###LINK###')
+
+    '''
+        hash of everything the cells depend on besides the DB rows: the columns and the link template,
+        the rows of an Overview.json with another format are not used
+    '''
+    def GetRowFormat(self):
+        return hashlib.md5(repr((self.RowFormatVersion, self.GetCellLinkHTMLTemplate(), self.GetTableColumns()[1]))).hexdigest()
+
+    '''
+        cells of the row of the table of the DB rows of one module
+    '''
+    def MergeDBRows(self, RowTuples, TableColumnList, GlobalOverviewList = True):
+        HtmlParser = self.TestResultEnvironmentObject.HtmlParser
+        CellLinkHTMLTemplate = self.GetCellLinkHTMLTemplate()
+
+        RowDict = None
+        for RowTuple in RowTuples:
+            if RowDict is None:
+                RowDict = {}
                 for Key in TableColumnList:
                     try:
                         RowDict[Key] = RowTuple[Key]
@@ -182,14 +216,13 @@ class ModuleResultOverview:
 
 
                 if GlobalOverviewList:
-                	Link = os.path.relpath(
-				self.TestResultEnvironmentObject.GlobalOverviewPath+'/'+RowTuple['RelativeModuleFinalResultsPath']+'/'+QualificationGroupSubfolder+'/'+ResultHTMLFileName,
-				self.TestResultEnvironmentObject.GlobalOverviewPath
-			)
+                    Link = os.path.relpath(
+                        self.TestResultEnvironmentObject.GlobalOverviewPath+'/'+RowTuple['RelativeModuleFinalResultsPath']+'/'+QualificationGroupSubfolder+'/'+ResultHTMLFileName,
+                        self.TestResultEnvironmentObject.GlobalOverviewPath
+                    )
                 else:
-			CurrentBasePath = self.GlobalOverviewPath + '/' +RowTuple['FulltestSubfolder']
-			# change directory one level up since we are in QualificationGroup folder and FulltestSubfolder is relative to ModuleFinalResultsPath...
-                	Link = '../'+RowTuple['FulltestSubfolder'] + '/' + ResultHTMLFileName
+                    # change directory one level up since we are in QualificationGroup folder and FulltestSubfolder is relative to ModuleFinalResultsPath...
+                    Link = '../'+RowTuple['FulltestSubfolder'] + '/' + ResultHTMLFileName
 
 
 
@@ -219,43 +252,112 @@ class ModuleResultOverview:
 
             else:
 #                TestType
-                 FinalModuleRowsDict[Identificator]['TestType'] += ' & %s'%RowTuple['TestType']
-                 if ( FinalModuleRowsDict[Identificator]['Grade'] < RowTuple['Grade']):
-                      FinalModuleRowsDict[Identificator]['Grade'] = RowTuple['Grade']
+                 RowDict['TestType'] += ' & %s'%RowTuple['TestType']
+                 if ( RowDict['Grade'] < RowTuple['Grade']):
+                      RowDict['Grade'] = RowTuple['Grade']
                  MaxCompareList = ['PixelDefects','ROCsMoreThanOnePercent','Noise','Trimming','PHCalibration']
                  for item in MaxCompareList:
-                     FinalModuleRowsDict[Identificator][item] = max( FinalModuleRowsDict[Identificator][item],RowTuple[item])
-                 if RowTuple['Temperature'] and FinalModuleRowsDict[Identificator].has_key('Temperature'):
-                       if FinalModuleRowsDict[Identificator]['Temperature']:
-                           FinalModuleRowsDict[Identificator]['Temperature'] += " / %s"%RowTuple['Temperature']
+                     RowDict[item] = max( RowDict[item],RowTuple[item])
+                 if RowTuple['Temperature'] and RowDict.has_key('Temperature'):
+                       if RowDict['Temperature']:
+                           RowDict['Temperature'] += " / %s"%RowTuple['Temperature']
                        else:
-                           FinalModuleRowsDict[Identificator]['Temperature'] = "%s" % RowTuple['Temperature']
-                 if RowTuple['initialCurrent'] and FinalModuleRowsDict[Identificator].has_key('initialCurrent'):
-                       if FinalModuleRowsDict[Identificator]['initialCurrent']:
-                           FinalModuleRowsDict[Identificator]['initialCurrent'] += " / %s"%RowTuple['initialCurrent']
+                           RowDict['Temperature'] = "%s" % RowTuple['Temperature']
+                 if RowTuple['initialCurrent'] and RowDict.has_key('initialCurrent'):
+                       if RowDict['initialCurrent']:
+                           RowDict['initialCurrent'] += " / %s"%RowTuple['initialCurrent']
                        else:
-                           FinalModuleRowsDict[Identificator]['initialCurrent'] = "%s" % RowTuple['initialCurrent']
-                 if RowTuple['Comments'] and FinalModuleRowsDict[Identificator].has_key('Comments'):
-                       if FinalModuleRowsDict[Identificator]['Comments']:
-                           FinalModuleRowsDict[Identificator]['Comments'] += " / %s"%RowTuple['Comments']
+                           RowDict['initialCurrent'] = "%s" % RowTuple['initialCurrent']
+                 if RowTuple['Comments'] and RowDict.has_key('Comments'):
+                       if RowDict['Comments']:
+                           RowDict['Comments'] += " / %s"%RowTuple['Comments']
                        else:
-                           FinalModuleRowsDict[Identificator]['Comments'] = "%s"%RowTuple['Comments']
-                 if RowTuple['nCycles'] and FinalModuleRowsDict[Identificator].has_key('nCycles'):
-                       FinalModuleRowsDict[Identificator]['nCycles'] = RowTuple['nCycles']
-                       FinalModuleRowsDict[Identificator]['CycleTempLow'] = RowTuple['CycleTempLow']
-                       FinalModuleRowsDict[Identificator]['CycleTempHigh'] = RowTuple['CycleTempHigh']
-
-        for ModuleID in ModuleIDList:
-            RowDict = FinalModuleRowsDict[ModuleID]
-            Row = []
-            for Key in TableColumnList:
-                Row.append(RowDict[Key])
-            TableData['BODY'].append(Row)
-
+                           RowDict['Comments'] = "%s"%RowTuple['Comments']
+                 if RowTuple['nCycles'] and RowDict.has_key('nCycles'):
+                       RowDict['nCycles'] = RowTuple['nCycles']
+                       RowDict['CycleTempLow'] = RowTuple['CycleTempLow']
+                       RowDict['CycleTempHigh'] = RowTuple['CycleTempHigh']
+
+        Row = []
+        for Key in TableColumnList:
+            Row.append(RowDict[Key])
+        return Row
+
+    '''
+        rows of the table: [{'Id': identificator, 'ModuleID': module ID, 'Cells': [...]}, ...]
+    '''
+    def GetRows(self, ModuleID = None, TestDate = None, GlobalOverviewList = True):
+        Labels, TableColumnList = self.GetTableColumns(GlobalOverviewList)
+        Rows = []
+        for Identificator, RowTuples in self.GroupDBRows(self.GetDBRows(ModuleID, TestDate), GlobalOverviewList):
+            Rows.append({
+                'Id': Identificator,
+                'ModuleID': RowTuples[0]['ModuleID'],
+                'Cells': self.MergeDBRows(RowTuples, TableColumnList, GlobalOverviewList),
+            })
+        return Rows
+
+    '''
+        rows of the global overview in which the rows of ModuleIDs are read again from the DB,
+        the rows of all other modules are taken from PreviousRows
+    '''
+    def GetUpdatedRows(self, PreviousRows, ModuleIDs):
+        Rows = [Row for Row in PreviousRows if Row['ModuleID'] not in ModuleIDs]
+        for ModuleID in sorted(ModuleIDs):
+            Rows += self.GetRows(ModuleID)
+        # same order as the rows read by GetRows, the sort is stable
+        Rows.sort(key = lambda Row: Row['ModuleID'])
+        return Rows
 
+    def TableData(self, ModuleID = None, TestDate = None, GlobalOverviewList = True):
+        TableData = {
+            'HEADER':[self.GetTableColumns(GlobalOverviewList)[0]],
+            'BODY':[],
+            'FOOTER':[],
+        }
+        for Row in self.GetRows(ModuleID, TestDate, GlobalOverviewList):
+            TableData['BODY'].append(Row['Cells'])
         return TableData
 
-    def GenerateOverviewHTML(self):
+    '''
+        rows of the last Overview.json, the text is stored as utf-8 like in the DB,
+        None if there is none or it has another format
+    '''
+    def ReadOverviewJSONFile(self):
+        try:
+            f = open(self.GlobalOverviewPath+'/'+self.JSONFileName, 'r')
+            Data = json.load(f)
+            f.close()
+            if Data['Format'] != self.GetRowFormat():
+                return None
+            Rows = Data['Rows']
+            for Row in Rows:
+                Row['Id'] = Row['Id'].encode('utf-8')
+                Row['ModuleID'] = Row['ModuleID'].encode('utf-8')
+                Row['Cells'] = [Cell.encode('utf-8') if isinstance(Cell, unicode) else Cell for Cell in Row['Cells']]
+            return Rows
+        except (IOError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def WriteOverviewJSONFile(self, Rows):
+        Data = {
+            'Columns': [Label.decode('utf-8', 'replace') for Label in self.GetTableColumns()[0]],
+            'Format': self.GetRowFormat(),
+            'Rows': [
+                {
+                    'Id': Row['Id'].decode('utf-8', 'replace'),
+                    'ModuleID': Row['ModuleID'].decode('utf-8', 'replace'),
+                    'Cells': [Cell.decode('utf-8', 'replace') if isinstance(Cell, str) else Cell for Cell in Row['Cells']],
+                } for Row in Rows
+            ],
+        }
+        FileName = self.GlobalOverviewPath+'/'+self.JSONFileName
+        f = open(FileName + '.tmp', 'w')
+        json.dump(Data, f, separators = (',', ':'))
+        f.close()
+        os.rename(FileName + '.tmp', FileName)
+
+    def GenerateOverviewHTML(self, Rows = None):
         HtmlParser = self.TestResultEnvironmentObject.HtmlParser
 
         HTMLTemplate = self.TestResultEnvironmentObject.OverviewHTMLTemplate
@@ -265,13 +367,12 @@ class ModuleResultOverview:
 
         # Stylesheet
 
-        StylesheetHTMLTemplate = HtmlParser.getSubpart(HTMLTemplate, '###HEAD_STYLESHEET_TEMPLATE###')
-        StylesheetHTML = HtmlParser.substituteMarkerArray(
-            StylesheetHTMLTemplate,
-            {
-                '###STYLESHEET###':self.TestResultEnvironmentObject.MainStylesheet+
-                    self.TestResultEnvironmentObject.OverviewStylesheet,
-            }
+        StylesheetHTML = self.TestResultEnvironmentObject.GetStylesheetHTML(
+            HTMLTemplate,
+            'Overview',
+            self.TestResultEnvironmentObject.MainStylesheet+
+                self.TestResultEnvironmentObject.OverviewStylesheet,
+            self.GlobalOverviewPath
         )
         FinalHTML = HtmlParser.substituteSubpart(
             FinalHTML,
@@ -283,8 +384,23 @@ class ModuleResultOverview:
             '###HEAD_STYLESHEET_TEMPLATE###',
             ''
         )
+        FinalHTML = HtmlParser.substituteSubpart(
+            FinalHTML,
+            '###HEAD_STYLESHEET_LINK_TEMPLATE###',
+            ''
+        )
 
-        TableData = self.TableData()
+        if Rows is None:
+            Rows = self.GetRows()
+        # with a page size the rows are loaded by the page from Overview.json
+        PageSize = self.TestResultEnvironmentObject.Configuration['OverviewPageSize']
+        TableData = {
+            'HEADER':[self.GetTableColumns()[0]],
+            'BODY':[],
+            'FOOTER':[],
+        }
+        if not PageSize:
+            TableData['BODY'] = [Row['Cells'] for Row in Rows]
         TableHTMLTemplate = HtmlParser.getSubpart(self.TestResultEnvironmentObject.OverviewHTMLTemplate, '###OVERVIEWTABLE###')
 
         TableHTML = HtmlParser.GenerateTableHTML(TableHTMLTemplate, TableData, {
@@ -297,15 +413,49 @@ class ModuleResultOverview:
             TableHTML
         )
 
+        ScriptHTML = ''
+        if PageSize:
+            ScriptHTML = HtmlParser.substituteMarkerArray(
+                HtmlParser.getSubpart(HTMLTemplate, '###OVERVIEWTABLE_SCRIPT###'),
+                {
+                    '###PAGESIZE###':str(int(PageSize)),
+                    '###DATAURL###':HtmlParser.MaskHTML(self.JSONFileName),
+                }
+            )
+        FinalHTML = HtmlParser.substituteSubpart(
+            FinalHTML,
+            '###OVERVIEWTABLE_SCRIPT###',
+            ScriptHTML
+        )
+
 
         return FinalHTML
 
 
-    def GenerateOverviewHTMLFile(self):
+    '''
+        writes Overview.json and Overview.html, with ModuleIDs only the rows of these modules are read from
+        the DB and the rows of all other modules are taken from the last Overview.json
+    '''
+    def GenerateOverviewHTMLFile(self, ModuleIDs = None):
         HTMLFileName = 'Overview.html'
-        FinalHTML = self.GenerateOverviewHTML()
-
-        f = open(self.GlobalOverviewPath+'/'+HTMLFileName, 'w')
-        f.write(FinalHTML)
-        f.close()
-
+        Connection = self.TestResultEnvironmentObject.LocalDBConnection
+        if Connection:
+            # Controller processes running at the same time wait until this one has updated the files
+            Connection.execute('BEGIN IMMEDIATE')
+        try:
+            PreviousRows = None
+            if ModuleIDs is not None:
+                PreviousRows = self.ReadOverviewJSONFile()
+            if PreviousRows is None:
+                Rows = self.GetRows()
+            else:
+                Rows = self.GetUpdatedRows(PreviousRows, ModuleIDs)
+            self.WriteOverviewJSONFile(Rows)
+            FinalHTML = self.GenerateOverviewHTML(Rows)
+
+            f = open(self.GlobalOverviewPath+'/'+HTMLFileName, 'w')
+            f.write(FinalHTML)
+            f.close()
+        finally:
+            if Connection:
+                Connection.rollback()
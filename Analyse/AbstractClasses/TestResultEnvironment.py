@@ -1,4 +1,8 @@
-import ROOT, Helper.HtmlParser, os
+import Helper.HtmlParser, os
+import multiprocessing
+import hashlib
+import Helper.ResultWriter as ResultWriter
+import Helper.PixelDBOutbox as PixelDBOutbox
 class TestResultEnvironment:
     # Configuration attributes
     Configuration = {
@@ -18,6 +22,37 @@ class TestResultEnvironment:
         'GzipSVG':True,
         'DefaultImageFormat':'svg',
         'AbsoluteOverviewPage': None,
+        'Fitting':{
+            'refit': True,
+            'nProcesses': multiprocessing.cpu_count(),
+            'vectorized': False,
+        },
+        'ResultDataCache': False,
+        # the results of every qualification are stored for a render-only run (Controller.py --render-only)
+        'ResultDataStore': False,
+        'HistoStore': False,
+        'PlotRenderProcesses': 0,
+        'SVGCompressionLevel': 9,
+        'SVGThreads': 1,
+        # the stylesheets are written once to the overview folder and linked instead of inlined in every page
+        'ExternalStylesheets': False,
+        # rows per page of the overview table which is loaded from Overview.json, 0 = the whole table in Overview.html
+        'OverviewPageSize': 0,
+        # journal mode of the local DB, WAL: the overview can be read while the results are written
+        'SQLiteJournalMode': 'WAL',
+        # seconds a connection waits for the lock of another process before it fails
+        'SQLiteBusyTimeout': 60.,
+        # the rows of all processes (Controller.py --jobs) are written by one writer process
+        'ResultWriterProcess': False,
+        # module with the PixelDBInterface used by the uploader, AbstractClasses.Helper.LocalPixelDB for tests
+        'PixelDBModule': 'PixelDB',
+        # seconds the uploader continues at the end of the run, the rest is uploaded by the next run
+        'PixelDBUploadTimeout': 600.,
+        # plot files and HTML are written, False: only the numerical results (Controller.py --no-render)
+        'Render': True,
+        'Scheduler':{
+            'nProcesses': 1,
+        },
     }
 
     GradingParameters = {
@@ -94,6 +129,15 @@ class TestResultEnvironment:
 
     LastUniqueIDCounter = 0;
 
+    # writes the rows of the test results to the local DB, see Helper/ResultWriter.py
+    ResultWriter = None
+
+    # uploads to the global PixelDB, see Helper/PixelDBOutbox.py
+    PixelDBOutbox = None
+
+    # ROOT canvas shared by all test results, see GetCanvas
+    Canvas = None
+
     #Error Handling
     ErrorList = []
 
@@ -110,9 +154,55 @@ class TestResultEnvironment:
             refit = True
             if Configuration.has_option('Fitting','refit'):
                 refit = Configuration.getboolean('Fitting','refit')
+            # number of worker processes used for fitting, 1 = serial fitting
+            nProcesses = multiprocessing.cpu_count()
+            if Configuration.has_option('Fitting','nProcesses'):
+                nProcesses = Configuration.getint('Fitting','nProcesses')
+            # numpy based fitting of all pixels at once, Minuit only for pixels where it fails
+            vectorized = False
+            if Configuration.has_option('Fitting','vectorized'):
+                vectorized = Configuration.getboolean('Fitting','vectorized')
             self.Configuration['Fitting'] = {
-                'refit': refit
+                'refit': refit,
+                'nProcesses': nProcesses,
+                'vectorized': vectorized,
             }
+            # number of worker processes populating independent test results (chips, Fulltests), 1 = serial
+            if Configuration.has_option('Scheduler', 'nProcesses'):
+                self.Configuration['Scheduler'] = {
+                    'nProcesses': Configuration.getint('Scheduler', 'nProcesses'),
+                }
+            # reuse the ResultData of test results whose code, configuration and input files did not change
+            if Configuration.has_option('SystemConfiguration', 'ResultDataCache'):
+                self.Configuration['ResultDataCache'] = Configuration.getboolean('SystemConfiguration', 'ResultDataCache')
+            if Configuration.has_option('SystemConfiguration', 'ResultDataStore'):
+                self.Configuration['ResultDataStore'] = Configuration.getboolean('SystemConfiguration', 'ResultDataStore')
+            # serve histogram bin contents from a numpy store written next to the results
+            if Configuration.has_option('SystemConfiguration', 'HistoStore'):
+                self.Configuration['HistoStore'] = Configuration.getboolean('SystemConfiguration', 'HistoStore')
+            # number of processes rendering the plot files while the analysis continues, 0 = render in SaveCanvas
+            if Configuration.has_option('SystemConfiguration', 'PlotRenderProcesses'):
+                self.Configuration['PlotRenderProcesses'] = Configuration.getint('SystemConfiguration', 'PlotRenderProcesses')
+            # zlib level of the .svgz files, 1 = fastest
+            if Configuration.has_option('SystemConfiguration', 'SVGCompressionLevel'):
+                self.Configuration['SVGCompressionLevel'] = Configuration.getint('SystemConfiguration', 'SVGCompressionLevel')
+            # number of threads post processing the svg files of a module
+            if Configuration.has_option('SystemConfiguration', 'SVGThreads'):
+                self.Configuration['SVGThreads'] = Configuration.getint('SystemConfiguration', 'SVGThreads')
+            if Configuration.has_option('SystemConfiguration', 'ExternalStylesheets'):
+                self.Configuration['ExternalStylesheets'] = Configuration.getboolean('SystemConfiguration', 'ExternalStylesheets')
+            if Configuration.has_option('SystemConfiguration', 'OverviewPageSize'):
+                self.Configuration['OverviewPageSize'] = Configuration.getint('SystemConfiguration', 'OverviewPageSize')
+            if Configuration.has_option('SystemConfiguration', 'SQLiteJournalMode'):
+                self.Configuration['SQLiteJournalMode'] = Configuration.get('SystemConfiguration', 'SQLiteJournalMode').strip()
+            if Configuration.has_option('SystemConfiguration', 'SQLiteBusyTimeout'):
+                self.Configuration['SQLiteBusyTimeout'] = Configuration.getfloat('SystemConfiguration', 'SQLiteBusyTimeout')
+            if Configuration.has_option('SystemConfiguration', 'ResultWriterProcess'):
+                self.Configuration['ResultWriterProcess'] = Configuration.getboolean('SystemConfiguration', 'ResultWriterProcess')
+            if Configuration.has_option('SystemConfiguration', 'PixelDBModule'):
+                self.Configuration['PixelDBModule'] = Configuration.get('SystemConfiguration', 'PixelDBModule').strip()
+            if Configuration.has_option('SystemConfiguration', 'PixelDBUploadTimeout'):
+                self.Configuration['PixelDBUploadTimeout'] = Configuration.getfloat('SystemConfiguration', 'PixelDBUploadTimeout')
             self.Configuration['GzipSVG'] = int(Configuration.get('SystemConfiguration', 'GzipSVG'))
             self.Configuration['DefaultImageFormat'] = Configuration.get('SystemConfiguration', 'DefaultImageFormat')
             for i in self.GradingParameters:
@@ -127,13 +217,67 @@ class TestResultEnvironment:
         self.OverviewHTMLTemplate = open('HTML/Overview/OverviewTemplate.html').read()
         self.OverviewStylesheet = open('HTML/Overview/OverviewTemplate.css').read()
         self.HtmlParser = Helper.HtmlParser.HtmlParser()
-
+        # (name, stylesheet) -> path of the written stylesheet file, see WriteStylesheet
+        self.StylesheetFileNames = {}
+
+    def GetCanvas(self):
+        '''
+            the canvas is created on first use, runs in which no module is analysed do not need ROOT
+        '''
+        if self.Canvas is None:
+            self.Canvas = self.CreateCanvas()
+        return self.Canvas
+
+    def CreateCanvas(self):
+        import ROOT
         ROOT.gEnv.GetValue("Canvas.SavePrecision", -1)
         ROOT.gEnv.SetValue('Canvas.SavePrecision', "30")
-        self.Canvas = ROOT.TCanvas()#'c1', '', 900, 700
+        Canvas = ROOT.TCanvas()#'c1', '', 900, 700
 
         # Prevent garbage collection
-        ROOT.SetOwnership(self.Canvas,False)
+        ROOT.SetOwnership(Canvas,False)
+        return Canvas
+
+    def WriteStylesheet(self, Name, Stylesheet):
+        '''
+            writes the stylesheet once to the overview folder, the file name contains a hash of the content,
+            so it can be cached by the browser until the stylesheet changes; returns the path of the file
+        '''
+        Key = (Name, Stylesheet)
+        if Key not in self.StylesheetFileNames:
+            FileName = '%s/%s.%s.css' % (self.GlobalOverviewPath or '.', Name, hashlib.md5(Stylesheet).hexdigest()[:12])
+            if not os.path.exists(FileName):
+                Directory = os.path.dirname(FileName)
+                if not os.path.isdir(Directory):
+                    os.makedirs(Directory)
+                # other processes may write the same file at the same time
+                TemporaryFileName = '%s.%d.tmp' % (FileName, os.getpid())
+                f = open(TemporaryFileName, 'w')
+                f.write(Stylesheet)
+                f.close()
+                os.rename(TemporaryFileName, FileName)
+            self.StylesheetFileNames[Key] = FileName
+        return self.StylesheetFileNames[Key]
+
+    def GetStylesheetHTML(self, HTMLTemplate, Name, Stylesheet, Path):
+        '''
+            HTML for the ###HEAD_STYLESHEETS### subpart of the template of a page in the folder Path,
+            a link to the stylesheet file with ExternalStylesheets, else the inlined stylesheet
+        '''
+        if self.Configuration['ExternalStylesheets']:
+            return self.HtmlParser.substituteMarkerArray(
+                self.HtmlParser.getSubpart(HTMLTemplate, '###HEAD_STYLESHEET_LINK_TEMPLATE###'),
+                {
+                    '###STYLESHEETURL###': self.HtmlParser.MaskHTML(
+                        os.path.relpath(self.WriteStylesheet(Name, Stylesheet), Path)),
+                }
+            )
+        return self.HtmlParser.substituteMarkerArray(
+            self.HtmlParser.getSubpart(HTMLTemplate, '###HEAD_STYLESHEET_TEMPLATE###'),
+            {
+                '###STYLESHEET###': Stylesheet,
+            }
+        )
 
     def OpenDBConnection(self):
         if self.Configuration['Database']['UseGlobal']:
@@ -143,6 +287,8 @@ class TestResultEnvironment:
                 self.GlobalDBConnectionCursor = GlobalDBConnection.cursor()
             except:
                 self.GlobalDBConnection = None;
+            self.PixelDBOutbox = PixelDBOutbox.Outbox(self.GlobalOverviewPath + '/' + PixelDBOutbox.SpoolFileName,
+                                                      self.Configuration['SQLiteBusyTimeout'])
         else:
             CreateDBStructure = False
             import sqlite3
@@ -155,11 +301,19 @@ class TestResultEnvironment:
                 f.close()
                 CreateDBStructure = True
 
-            self.LocalDBConnection = sqlite3.connect(self.SQLiteDBPath)
+            self.LocalDBConnection = ResultWriter.connect(self.SQLiteDBPath, self.Configuration['SQLiteBusyTimeout'],
+                                                          self.Configuration['SQLiteJournalMode'])
             self.LocalDBConnection.row_factory = sqlite3.Row
             self.LocalDBConnectionCursor =  self.LocalDBConnection.cursor()
             self.LocalDBConnection.text_factory = str
 
+            # a forked worker keeps the writer process of its parent, but not the rows of the parent
+            if not self.ResultWriter:
+                self.ResultWriter = ResultWriter.ResultWriter(self.SQLiteDBPath, self.Configuration['SQLiteBusyTimeout'],
+                                                              self.Configuration['SQLiteJournalMode'])
+            self.ResultWriter.Connection = self.LocalDBConnection
+            self.ResultWriter.clear()
+
             if CreateDBStructure:
                 self.LocalDBConnectionCursor.executescript('''
                      CREATE TABLE ModuleTestResults(
@@ -187,6 +341,17 @@ class TestResultEnvironment:
                     );
                 ''')
 
+            # the overview and the DELETE before every INSERT select the rows of a module by these columns,
+            # also added to existing databases
+            try:
+                self.LocalDBConnectionCursor.execute(
+                    'CREATE INDEX IF NOT EXISTS ModuleTestResultsModuleIndex ON ModuleTestResults(ModuleID, QualificationType, TestDate)'
+                )
+                self.LocalDBConnection.commit()
+            except sqlite3.OperationalError as e:
+                # locked by another process which creates it
+                print 'cannot create index of ModuleTestResults: %s' % e
+
 
     def GetUniqueID(self, Prefix = ''):
         self.LastUniqueIDCounter += 1
@@ -2,12 +2,19 @@
  # -*- coding: utf-8 -*-
 from AbstractClasses import GeneralTestResult, TestResultEnvironment, ModuleResultOverview
 import AbstractClasses.Helper.hasher as hasher
+import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.Profiler as Profiler
+import AbstractClasses.Helper.TestResultRegistry as TestResultRegistry
+import AbstractClasses.Helper.PlotRenderer as PlotRenderer
+import AbstractClasses.Helper.PixelDBOutbox as PixelDBOutbox
+import AbstractClasses.Helper.ResultDataStore as ResultDataStore
 import argparse
 # from AbstractClasses import Helper
-import TestResultClasses.CMSPixel.QualificationGroup.QualificationGroup
 import os, time,shutil, sys
 # import errno
 import ConfigParser
+import multiprocessing
+import traceback
 
 #arg parse to analyse a single Fulltest
 parser = argparse.ArgumentParser(description='MORE web Controller: an analysis software for CMS pixel modules and ROCs')
@@ -35,15 +42,21 @@ parser.add_argument('-rev','--analysis-revision',dest='revision',metavar='REV',d
 parser.add_argument('-norev','--no-revisionnumber',dest='norev',action='store_true',default=False,
                     help='deactivates the revsion sting with in the path')
 parser.add_argument('-f', '--force', dest = 'force', action = 'store_true', default = False,
-                    help = 'Forces runnig analysis even if checksums agree')
+                    help = 'Forces runnig analysis even if checksums agree, the ResultData cache is not used')
+parser.add_argument('-j', '--jobs', dest = 'jobs', metavar = 'N', type = int, default = 1,
+                    help = 'number of module folders which are analysed in parallel worker processes [default: 1]')
+parser.add_argument('-nr', '--no-render', dest = 'render', action = 'store_false', default = True,
+                    help = 'only calculate the results and write them to the database, no plots and HTML (e.g. for regrading with -f)')
+parser.add_argument('-ro', '--render-only', dest = 'renderOnly', action = 'store_true', default = False,
+                    help = 'only draw the plots and write the HTML again from the results stored by the last analysis (ResultDataStore), no raw data is read and nothing is written to the database')
+parser.add_argument('-p', '--profile', dest = 'profile', metavar = 'FILE', default = '',
+                    help = 'measure time and memory of every test result, writes Profile.json next to each TestResult.html and the collapsed stacks of the whole run to FILE')
 parser.set_defaults(DBUpload=True)
 args = parser.parse_args()
 verbose = args.verbose
+Profiler.Enabled = bool(args.profile)
 
-import AbstractClasses.Helper.ROOTConfiguration as ROOTConfiguration
-
-
-ROOTConfiguration.initialise_ROOT()
+# ROOT is initialised by the test results, i.e. only if a module is analysed
 Configuration = ConfigParser.ConfigParser()
 Configuration.read([
     'Configuration/GradingParameters.cfg',
@@ -96,7 +109,18 @@ TestResultEnvironmentInstance = TestResultEnvironment.TestResultEnvironment(Conf
 TestResultEnvironmentInstance.SQLiteDBPath = SQLiteDBPath
 TestResultEnvironmentInstance.GlobalOverviewPath = GlobalOverviewPath
 TestResultEnvironmentInstance.OpenDBConnection()
+PixelDBUploader = None
+if TestResultEnvironmentInstance.PixelDBOutbox:
+    # also uploads the jobs left by former runs
+    PixelDBUploader = PixelDBOutbox.Uploader(TestResultEnvironmentInstance.PixelDBOutbox, TestResultEnvironmentInstance.Configuration['PixelDBModule'])
+    PixelDBUploader.start()
 TestResultEnvironmentInstance.GlobalDataDirectory = GlobalDataDirectory
+if args.force:
+    TestResultEnvironmentInstance.Configuration['ResultDataCache'] = False
+if not args.render:
+    TestResultEnvironmentInstance.Configuration['Render'] = False
+    # the cached ResultData would not contain the plots
+    TestResultEnvironmentInstance.Configuration['ResultDataCache'] = False
 
 if Configuration.has_option('Paths','AbsoluteOverviewPage'):
     TestResultEnvironmentInstance.Configuration['OverviewHTMLLink'] = Configuration.get('Paths','AbsoluteOverviewPage')
@@ -107,6 +131,9 @@ hasher.create_hash_file_directory('checksum.md5','.')
 
 ModuleTestResults = []
 
+# only one process at a time writes to the SQLite DB, see AnalyseAllTestDataInDirectory
+DBWriteLock = multiprocessing.Lock()
+
 
 def extractModuleInformation(ModuleInformationRaw):
     lenght = len(ModuleInformationRaw)
@@ -175,7 +202,7 @@ def GetModuleTestResult(TestResultEnvironment,FinalModuleResultsPath,ModuleInfor
             }
     if ModuleInformation.has_key('TestType'):
         newModuleInformation['TestType'] =  ModuleInformation['TestType']
-    return TestResultClasses.CMSPixel.QualificationGroup.QualificationGroup.TestResult(
+    return TestResultRegistry.get_test_result_class('TestResultClasses.CMSPixel.QualificationGroup')(
             TestResultEnvironmentInstance,
             ParentObject = None,
             InitialModulePath = 'TestResultClasses.CMSPixel.QualificationGroup',
@@ -194,6 +221,19 @@ def CreateApacheWebserverConfiguration(FinalResultsPath):
     ''')
     f.close()
 
+def RenderStoredTestData(FinalModuleResultsPath):
+    '''
+        draws the plots and writes the HTML of one qualification from its ResultDataStore
+    '''
+    ModuleTestResult = ResultDataStore.load(TestResultEnvironmentInstance, FinalModuleResultsPath)
+    if not ModuleTestResult:
+        print 'no stored results in %s' % FinalModuleResultsPath
+        return
+    CreateApacheWebserverConfiguration(FinalModuleResultsPath)
+    print '    Generating Final Output from %s' % ResultDataStore.get_store_file_name(FinalModuleResultsPath)
+    ModuleTestResult.GenerateFinalOutput()
+    ModuleTestResults.append(ModuleTestResult)
+
 def AnalyseTestData(ModuleInformationRaw,ModuleFolder):
     print 'AnalyseTestData',ModuleInformationRaw,ModuleFolder
     global final_result_directory
@@ -212,6 +252,10 @@ def AnalyseTestData(ModuleInformationRaw,ModuleFolder):
 
     TestResultEnvironmentInstance.FinalModuleResultsPath = FinalModuleResultsPath
 
+    if args.renderOnly:
+        RenderStoredTestData(FinalModuleResultsPath)
+        return
+
     if not NeedsToBeAnalyzed(TestResultEnvironmentInstance.FinalModuleResultsPath ,ModuleInformation):
         return
 
@@ -224,12 +268,19 @@ def AnalyseTestData(ModuleInformationRaw,ModuleFolder):
 
     print '    Populating Data'
     ModuleTestResult.PopulateAllData()
-    ModuleTestResult.WriteToDatabase() # needed before final output
+    if TestResultEnvironmentInstance.ResultWriter and TestResultEnvironmentInstance.ResultWriter.Process:
+        # the writer process writes the rows of one qualification after the other
+        ModuleTestResult.WriteToDatabase() # needed before final output
+    else:
+        with DBWriteLock:
+            ModuleTestResult.WriteToDatabase() # needed before final output
 
     print '    Generating Final Output'
     ModuleTestResult.GenerateFinalOutput()
     ModuleTestResults.append(ModuleTestResult)
-    CopyMD5File(TestResultEnvironmentInstance.FinalModuleResultsPath)
+    # without plots and HTML the next normal run has to analyse the module again
+    if args.render:
+        CopyMD5File(TestResultEnvironmentInstance.FinalModuleResultsPath)
     print 'DONE'
     pass
 
@@ -255,14 +306,72 @@ def AnalyseSingleQualification(Folder):
     if len(ModuleInformationRaw) >= 5:
         AnalyseTestData(ModuleInformationRaw, Folder)
 
+def InitModuleWorker():
+    # the forked worker must not share the DB connection and canvas of the parent
+    TestResultEnvironmentInstance.OpenDBConnection()
+    TestResultEnvironmentInstance.Canvas = None
+    del TestResultEnvironmentInstance.ErrorList[:]
+    # pool workers can not start fitting processes of their own
+    TestResultEnvironmentInstance.Configuration['Fitting']['nProcesses'] = 1
+    TestResultEnvironmentInstance.Configuration['Scheduler']['nProcesses'] = 1
+    TestResultEnvironmentInstance.Configuration['PlotRenderProcesses'] = 0
+    Profiler.clear()
+
+def AnalyseModuleFolderWorker(Folder):
+    '''
+        analyses one module folder in a worker process and returns its ErrorList entries, profiler records
+        and the IDs of the modules whose rows it wrote to the DB
+    '''
+    try:
+        AnalyseTestData(Folder.split('_'), Folder)
+    except Exception as inst:
+        traceback.print_exc()
+        TestResultEnvironmentInstance.ErrorList.append(
+                       {'ModulePath':Folder,
+                        'ErrorCode': inst,
+                        'FinalResultsStoragePath':'unkown'
+                        }
+       )
+    # exceptions can not always be pickled
+    WrittenModuleIDs = set()
+    if TestResultEnvironmentInstance.ResultWriter:
+        WrittenModuleIDs = TestResultEnvironmentInstance.ResultWriter.WrittenModuleIDs
+    return [dict(Error, ErrorCode = '%s'%Error['ErrorCode']) for Error in TestResultEnvironmentInstance.ErrorList], Profiler.get_records(), WrittenModuleIDs
+
 def AnalyseAllTestDataInDirectory(GlobalDataDirectory):
+    Folders = []
     for Folder in os.listdir(GlobalDataDirectory):
         absPath = GlobalDataDirectory+'/'+Folder
         if not os.path.isdir(absPath):
             continue
         ModuleInformationRaw = Folder.split('_')
         if len(ModuleInformationRaw) >= 5:
-            AnalyseTestData(ModuleInformationRaw,Folder)
+            Folders.append(Folder)
+
+    nJobs = min(args.jobs, len(Folders))
+    if nJobs > 1:
+        print 'analysing %d module folders with %d processes'%(len(Folders), nJobs)
+        if TestResultEnvironmentInstance.Configuration['ResultWriterProcess'] and TestResultEnvironmentInstance.ResultWriter:
+            TestResultEnvironmentInstance.ResultWriter.start_process()
+        # one fresh process per module folder: own ROOT state, no memory growth over many modules
+        pool = multiprocessing.Pool(processes = nJobs, initializer = InitModuleWorker, maxtasksperchild = 1)
+        try:
+            for Errors, Records, WrittenModuleIDs in pool.imap_unordered(AnalyseModuleFolderWorker, Folders):
+                TestResultEnvironmentInstance.ErrorList.extend(Errors)
+                Profiler.add_records(Records)
+                if TestResultEnvironmentInstance.ResultWriter:
+                    TestResultEnvironmentInstance.ResultWriter.WrittenModuleIDs.update(WrittenModuleIDs)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            if TestResultEnvironmentInstance.ResultWriter:
+                TestResultEnvironmentInstance.ResultWriter.stop_process()
+    else:
+        for Folder in Folders:
+            AnalyseTestData(Folder.split('_'),Folder)
 
 def AnalyseSingleFullTest(singleFulltestPath):
     print 'analysing a single Fulltest at destination: "%s"' % args.singleFulltestPath
@@ -278,6 +387,9 @@ def AnalyseSingleFullTest(singleFulltestPath):
         'TestType': 'singleFulltest'
     }
     FinalResultsPath = args.singleFulltestPath+'/FinalResults'+RevisionString
+    if args.renderOnly:
+        RenderStoredTestData(FinalResultsPath)
+        return
     ModuleTestResult = GetModuleTestResult(TestResultEnvironment, FinalResultsPath, ModuleInformation)
     print 'ModuleTestResult',ModuleTestResult
                 # add apache webserver configuration for compressed svg images
@@ -308,6 +420,9 @@ def AnalyseBareModuleTest(bareModuletestPath):
         'TestType': 'bareModuletest'
     }
     FinalResultsPath = args.bareModuletestPath+'/BareFinalResults'+RevisionString
+    if args.renderOnly:
+        RenderStoredTestData(FinalResultsPath)
+        return
     ModuleTestResult = GetModuleTestResult(TestResultEnvironment, FinalResultsPath, ModuleInformation)
     print 'ModuleTestResult',ModuleTestResult
                 # add apache webserver configuration for compressed svg images
@@ -334,8 +449,25 @@ elif not args.bareModuletestPath=='':
 elif int(Configuration.get('SystemConfiguration', 'GenerateResultData')):
     AnalyseAllTestDataInDirectory(GlobalDataDirectory)
 
+PlotRenderer.close()
 ModuleResultOverviewObject = ModuleResultOverview.ModuleResultOverview(TestResultEnvironmentInstance)
-ModuleResultOverviewObject.GenerateOverviewHTMLFile()
+# only the modules written in this run are read from the DB, the other rows are taken from Overview.json
+if TestResultEnvironmentInstance.ResultWriter:
+    ModuleResultOverviewObject.GenerateOverviewHTMLFile(TestResultEnvironmentInstance.ResultWriter.WrittenModuleIDs)
+else:
+    ModuleResultOverviewObject.GenerateOverviewHTMLFile()
+if verbose:
+    print '\nHistoGetter cache:'
+    for Key, Value in sorted(HistoGetter.get_cache_statistics().items()):
+        print '\t%20s: %d' % (Key, Value)
+if args.profile:
+    print '\nwrote profiles of %d test results' % Profiler.write_reports()
+    print 'wrote %d stacks to %s' % (Profiler.write_collapsed_stacks(args.profile), args.profile)
+if PixelDBUploader:
+    print '\nuploading to the PixelDB...'
+    nPending = PixelDBUploader.stop(TestResultEnvironmentInstance.Configuration['PixelDBUploadTimeout'])
+    print 'uploaded %d jobs, %d pending and %d failed in %s' % (PixelDBUploader.nUploaded, nPending,
+        TestResultEnvironmentInstance.PixelDBOutbox.count('failed'), TestResultEnvironmentInstance.PixelDBOutbox.FileName)
 # TestResultEnvironmentInstance.ErrorList.append( {'test1':'bla'})
 print '\nErrorList:'
 for i in TestResultEnvironmentInstance.ErrorList:
@@ -1,5 +1,6 @@
 import ROOT
 import AbstractClasses
+import AbstractClasses.Helper.HistoArray as HistoArray
 import ROOT
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
@@ -27,9 +28,13 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
                 print 'cannot get BumpBondingProblems histo for chip ',ChipTestResultObject.Attributes['ChipNo']
                 continue
             chipNo = ChipTestResultObject.Attributes['ChipNo']
+            binContents = HistoArray.get_array(histo) if HistoArray.available else None
             for col in range(self.nCols):  # Columns
                 for row in range(self.nRows):  # Rows
-                    result = histo.GetBinContent(col + 1, row + 1)
+                    if binContents is not None:
+                        result = float(binContents[col, row])
+                    else:
+                        result = histo.GetBinContent(col + 1, row + 1)
                     if isDigital:
                         result = not (result < thr)
                     self.UpdatePlot(chipNo, col, row, result)
@@ -1,12 +1,14 @@
 import ROOT
 import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.PixelMask as PixelMask
 import AbstractClasses
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = []
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_AddressDecoding_TestResult'
         self.NameSingle='AddressDecoding'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
-        self.AddressProblemList = set()
+        self.AddressProblemList = PixelMask.PixelMask()
         self.chipNo = self.ParentObject.Attributes['ChipNo']
 
 
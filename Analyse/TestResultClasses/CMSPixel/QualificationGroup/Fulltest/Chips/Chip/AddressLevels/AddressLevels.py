@@ -3,6 +3,7 @@ import AbstractClasses
 import AbstractClasses.Helper.HistoGetter as HistoGetter
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = []
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_AddressLevels_TestResult'
         self.NameSingle='AddressLevels'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
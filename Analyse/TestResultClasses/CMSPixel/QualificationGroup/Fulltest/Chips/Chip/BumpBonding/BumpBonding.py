@@ -6,6 +6,7 @@ import AbstractClasses.Helper.HistoGetter as HistoGetter
 
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = []
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_BumpBonding_TestResult'
         self.NameSingle = 'BumpBonding'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
@@ -2,20 +2,20 @@ import ROOT
 
 import AbstractClasses
 import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.HistoArray as HistoArray
+import AbstractClasses.Helper.PixelMask as PixelMask
+import AbstractClasses.Helper.GradingEngine as GradingEngine
 
 
-try:
-    set
-except NameError:
-    from sets import Set as set
 
 
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['BumpBonding']
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_BumpBondingProblems_TestResult'
         self.NameSingle = 'BumpBondingProblems'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
-        self.DeadBumpList = set()
+        self.DeadBumpList = PixelMask.PixelMask()
         self.isDigitalROC = self.ParentObject.ParentObject.ParentObject.Attributes['isDigital']
         self.chipNo = self.ParentObject.Attributes['ChipNo']
 
@@ -69,7 +69,8 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
             self.ResultData['Plot']['ROOTObject'].GetZaxis().SetTitle("#Delta Threshold [DAC]");
             self.ResultData['Plot']['ROOTObject'].GetZaxis().CenterTitle();
             self.ResultData['Plot']['ROOTObject'].Draw("colz");
-            self.ResultData['Plot']['ROOTObject'].SaveAs(self.GetPlotFileName() + '.cpp')
+            if self.SavePlotFile:
+                self.ResultData['Plot']['ROOTObject'].SaveAs(self.GetPlotFileName() + '.cpp')
 
         self.ResultData['Plot']['ROOTObject2'] = self.ResultData['Plot']['ROOTObject'].Clone(self.GetUniqueID())
         self.SaveCanvas()
@@ -92,21 +93,22 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
             self.ParentObject.ResultData['SubTestResults']['BumpBonding'].ResultData['KeyValueDictPairs']['nSigma'][
                 'Value']
         threshold = BumpBondingProblems_Mean + BumpBondingProblems_nSigma * BumpBondingProblems_RMS
-        for column in range(self.nCols):
-            for row in range(self.nRows):
-                self.HasBumpBondingProblems(column, row, threshold)
+        deadBumpThreshold = GradingEngine.get_bump_bonding_threshold(self.isDigitalROC, BumpBondingProblems_Mean,
+                BumpBondingProblems_RMS, BumpBondingProblems_nSigma, self.TestResultEnvironmentObject.GradingParameters['minThrDiff'])
+        if HistoArray.available:
+            binContents = HistoArray.get_array(self.ResultData['Plot']['ROOTObject'])[:self.nCols, :self.nRows]
+            self.DeadBumpList.update(HistoArray.get_pixel_mask(binContents >= deadBumpThreshold, self.chipNo))
+        else:
+            for column in range(self.nCols):
+                for row in range(self.nRows):
+                    self.HasBumpBondingProblems(column, row, deadBumpThreshold)
         return threshold
 
     def HasBumpBondingProblems(self, column, row, threshold):
         binContent = self.ResultData['Plot']['ROOTObject'].GetBinContent(column + 1, row + 1)
-        if self.isDigitalROC:
-            if binContent >= threshold:
-                self.DeadBumpList.add((self.chipNo, column, row))
-                return True
-        else:  # is analog ROC
-            if binContent >= self.TestResultEnvironmentObject.GradingParameters['minThrDiff']:  # analog Roc
-                self.DeadBumpList.add((self.chipNo, column, row))
-                return True
+        if binContent >= threshold:
+            self.DeadBumpList.add((self.chipNo, column, row))
+            return True
         return False
 
 
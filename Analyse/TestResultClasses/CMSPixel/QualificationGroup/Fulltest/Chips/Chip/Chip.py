@@ -4,6 +4,7 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
 
 
     def CustomInit(self):
+        self.Inputs = []
         ROOT.gStyle.SetOptStat(0)
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
 
@@ -7,6 +7,7 @@ from AbstractClasses.GeneralTestResult import GeneralTestResult
 
 class TestResult(GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['TrimBits']
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_DacParameterOverview_TestResult'
         self.NameSingle = 'DacParameterOverview'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
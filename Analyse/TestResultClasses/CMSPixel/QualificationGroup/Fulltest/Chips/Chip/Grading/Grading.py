@@ -1,29 +1,28 @@
 import ROOT
 import AbstractClasses
 import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.PixelMask as PixelMask
+import AbstractClasses.Helper.GradingEngine as GradingEngine
 
-try:
-       set
-except NameError:
-       from sets import Set as set
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['AddressDecoding', 'BumpBonding', 'BumpBondingProblems', 'OpParameters', 'PHCalibrationGain', 'PHCalibrationTan', 'PixelMap', 'SCurveWidths', 'TrimBitProblems', 'VcalThresholdTrimmed']
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_Grading_TestResult'
         self.NameSingle='Grading'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
         self.chipNo = self.ParentObject.Attributes['ChipNo']
-        self.ResultData['HiddenData']['DeadPixelList'] = set()
-        self.ResultData['HiddenData']['Noisy1PixelList'] = set()
-        self.ResultData['HiddenData']['MaskDefectList'] = set()
-        self.ResultData['HiddenData']['IneffPixelList'] = set()
+        self.ResultData['HiddenData']['DeadPixelList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['Noisy1PixelList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['MaskDefectList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['IneffPixelList'] = PixelMask.PixelMask()
 
-        self.ResultData['HiddenData']['AddressProblemList'] = set()
-        self.ResultData['HiddenData']['ThrDefectList'] = set()
-        self.ResultData['HiddenData']['NoisyPixelSCurveList'] = set()
-        self.ResultData['HiddenData']['GainDefectList'] = set()
-        self.ResultData['HiddenData']['PedDefectList'] = set()
-        self.ResultData['HiddenData']['Par1DefectList'] = set()
-        self.ResultData['HiddenData']['TotalList'] = set()
+        self.ResultData['HiddenData']['AddressProblemList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['ThrDefectList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['NoisyPixelSCurveList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['GainDefectList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['PedDefectList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['Par1DefectList'] = PixelMask.PixelMask()
+        self.ResultData['HiddenData']['TotalList'] = PixelMask.PixelMask()
         self.isDigitalROC = self.ParentObject.ParentObject.ParentObject.Attributes['isDigital']
 
     def GetSingleChipSubtestGrade(self, SpecialPopulateDataParameters, CurrentGrade):
@@ -38,13 +37,12 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
 	Value = float(Value)
 	ChipGrade = CurrentGrade
 	
-	if ChipGrade == 1 and Value > SpecialPopulateDataParameters['YLimitB']:
+	GradeB, GradeC = GradingEngine.get_subtest_limits(Value, nValue,
+		SpecialPopulateDataParameters['YLimitB'], SpecialPopulateDataParameters['YLimitC'],
+		self.TestResultEnvironmentObject.GradingParameters['defectsB'], self.TestResultEnvironmentObject.GradingParameters['defectsC'])
+	if ChipGrade == 1 and GradeB:
 		ChipGrade = 2
-	if Value > SpecialPopulateDataParameters['YLimitC']:
-		ChipGrade = 3
-	if ChipGrade == 1 and nValue < (8*self.nCols - self.TestResultEnvironmentObject.GradingParameters['defectsB']):
-		ChipGrade = 2
-	if nValue < (8*self.nCols - self.TestResultEnvironmentObject.GradingParameters['defectsC']):
+	if GradeC:
 		ChipGrade = 3
 	return ChipGrade
 	
@@ -171,20 +169,8 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
 #         print ' BumpBondingProblems_nSigma: %s'%BumpBondingProblems_nSigma
 #         if self.isDigitalROC:
 
-        TrimBitHistograms = []
-        ChipNo=self.ParentObject.Attributes['ChipNo']
-        HistoDict = self.ParentObject.ParentObject.ParentObject.HistoDict
-        for k in range(5):
-            histname = HistoDict.get('Summary','TrimBitMap%d'%k)
-            tmpHistogram = HistoGetter.get_histo(self.ParentObject.ParentObject.FileHandle, histname, rocNo = ChipNo)
-            tmpHistogram = tmpHistogram.Clone(self.GetUniqueID())
-            TrimBitHistograms.append(tmpHistogram )
-
-        # TH2D
-
-        histname = HistoDict.get('Summary','ThresholdMap')
-        tmpHistogram = HistoGetter.get_histo(self.ParentObject.ParentObject.FileHandle, histname, rocNo = ChipNo)
-        VcalThresholdMapHistogram =  tmpHistogram.Clone(self.GetUniqueID())
+        # the trim bit maps and the threshold map are analysed in TrimBitProblems and VcalThresholdTrimmed,
+        # their pixel lists are used below instead of fetching the histograms again
 
         #reset file pointers
         # if self.ParentObject.ResultData['SubTestResults']['SCurveWidths'].FileHandle:
@@ -275,12 +261,7 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         PixelDefectsGradeALimit = self.TestResultEnvironmentObject.GradingParameters['defectsB']
         PixelDefectsGradeBLimit = self.TestResultEnvironmentObject.GradingParameters['defectsC']
         totalDefects = len(self.ResultData['HiddenData']['TotalList'])
-        if totalDefects < PixelDefectsGradeALimit:
-            pixelDefectsGrade = 1
-        elif totalDefects < PixelDefectsGradeBLimit:
-            pixelDefectsGrade = 2
-        else:
-            pixelDefectsGrade = 3
+        pixelDefectsGrade = GradingEngine.get_pixel_defects_grade(totalDefects, PixelDefectsGradeALimit, PixelDefectsGradeBLimit)
         print '\tGrade: %s'%pixelDefectsGrade
         self.ResultData['KeyValueDictPairs'] = {
             'PixelDefectsGrade':{
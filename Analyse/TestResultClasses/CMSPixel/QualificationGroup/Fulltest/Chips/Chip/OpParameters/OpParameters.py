@@ -9,6 +9,7 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
 
 
     def CustomInit(self):
+        self.Inputs = []
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_OpParameters_TestResult'
         self.NameSingle = 'OpParameters'
 
@@ -5,10 +5,12 @@ import ROOT
 
 import AbstractClasses
 import AbstractClasses.GeneralTestResult as GeneralTestResult
+import TestResultClasses.CMSPixel.QualificationGroup.Fulltest.Fitting.DatFiles as DatFiles
 
 
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = []
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_PHCalibrationGain_TestResult'
         self.NameSingle = 'PHCalibrationGain'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
@@ -30,58 +32,41 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
 
         # for (int i = 0 i < 2 i++) fgets(string, 200, phLinearFile)
 
-        n_lines = 0
-        for i in range(3):
-            # Line = \
-            PHCalibrationFitFile.readline()  # Omit first four lines
+        # 0.0 0.0 0.249260980545  -24.9957127636  0.0 0.0 Pix  1 13, after three header lines
+        FitResults = DatFiles.ReadFitResults(PHCalibrationFitFileName, 3)
+        n_lines = len(FitResults['Parameters'])
         n_dead_pixels = 0
         n_errors = 0
         n_warnings = 0
-        for Line in PHCalibrationFitFile.readlines():
-            n_lines += 1
-            if Line:
-                try:
-                    Parameters = Line.strip().split()
-                    # 0.0 0.0 0.249260980545  -24.9957127636  0.0 0.0 Pix  1 13
-                    # -->
-                    # 0: Parameters[0]
-                    # 1: Parameters[1]
-                    # 2: Parameters[2]
-                    # 3: Parameters[3]
-                    # 4: Parameters[4]
-                    # 5: Parameters[5]
-                    # PIX
-                    # column
-                    # row
-                    # Parameters[0], Parameters[1], Parameters[2], Parameters[3], Parameters[4], Parameters[5], d, a, b = line.strip().split()
-                    row = int(Parameters[-1])
-                    col = int(Parameters[-2])
-                    par2 = float(Parameters[2])
-                    par3 = float(Parameters[3])
-                    if self.verbose:
-                        print '%2d %2d: %5f %5f '%(row,col,par2,par3)
-                    if abs(par2) < 1e-10:  # dead pixels have par2 == 0.
-                        n_dead_pixels += 1
-                    else:
-                        gain = 1. / float(par2)  # gain in Vcal/adc
-                        pedestal = float(par3) * gain  # Pedestal in Vcal / vcal offset : units: adc * vcal/adc = vcal
-                        if not (0 <= row < self.nRows and 0 <= col < self.nCols):
-                            warnings.warn(
-                                'PHCalibrationGain: pixel address out of bounds: {col}/{row}'.format(col=col,
-                                                                                                     row=row))
-                            n_warnings += 1
-                            continue
-                        self.ResultData['Plot']['ROOTObject_hPedestal'].Fill(pedestal)
-                        self.ResultData['Plot']['ROOTObject_hGain'].Fill(gain)
-                        self.ResultData['Plot']['ROOTObject_hGainMap'].SetBinContent(col + 1, row + 1,
-                                                                                     min(max(0, gain),
-                                                                                         5.5))  # Column, Row, Gain
-                        self.ResultData['Plot']['ROOTObject_hPedestalMap'].SetBinContent(col + 1, row + 1,
-                                                                                         pedestal)  # Column, Row, Gain
-
-                except (ValueError, TypeError, IndexError):
-                    n_errors += 1
-                    pass
+        for Parameters, col, row, valid in zip(FitResults['Parameters'], FitResults['Columns'], FitResults['Rows'], FitResults['Valid']):
+            if not valid or len(Parameters) < 4:
+                n_errors += 1
+                continue
+            row = int(row)
+            col = int(col)
+            par2 = float(Parameters[2])
+            par3 = float(Parameters[3])
+            if self.verbose:
+                print '%2d %2d: %5f %5f '%(row,col,par2,par3)
+            if abs(par2) < 1e-10:  # dead pixels have par2 == 0.
+                n_dead_pixels += 1
+            else:
+                gain = 1. / float(par2)  # gain in Vcal/adc
+                pedestal = float(par3) * gain  # Pedestal in Vcal / vcal offset : units: adc * vcal/adc = vcal
+                if not (0 <= row < self.nRows and 0 <= col < self.nCols):
+                    warnings.warn(
+                        'PHCalibrationGain: pixel address out of bounds: {col}/{row}'.format(col=col,
+                                                                                             row=row))
+                    n_warnings += 1
+                    continue
+                self.ResultData['Plot']['ROOTObject_hPedestal'].Fill(pedestal)
+                self.ResultData['Plot']['ROOTObject_hGain'].Fill(gain)
+                self.ResultData['Plot']['ROOTObject_hGainMap'].SetBinContent(col + 1, row + 1,
+                                                                             min(max(0, gain),
+                                                                                 5.5))  # Column, Row, Gain
+                self.ResultData['Plot']['ROOTObject_hPedestalMap'].SetBinContent(col + 1, row + 1,
+                                                                                 pedestal)  # Column, Row, Gain
+
         if self.verbose:
             print 'Filled {pixels} to histogram'.format(pixels=self.ResultData['Plot']['ROOTObject_hGain'].GetEntries()),n_dead_pixels,n_errors,n_warnings,n_lines
         return True
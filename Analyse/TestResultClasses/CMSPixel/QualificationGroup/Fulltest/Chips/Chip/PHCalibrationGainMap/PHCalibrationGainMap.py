@@ -2,6 +2,7 @@ import ROOT
 import AbstractClasses
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['PHCalibrationGain']
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_PHCalibrationGainMap_TestResult'
         self.NameSingle='PHCalibrationGainMap'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
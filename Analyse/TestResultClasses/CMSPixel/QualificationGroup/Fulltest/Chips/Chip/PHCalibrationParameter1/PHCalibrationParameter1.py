@@ -6,6 +6,7 @@ import ROOT
 
 class TestResult(GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['PHCalibrationTan']
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_PHCalibrationParameter1_TestResult'
         self.NameSingle = 'PHCalibrationParameter1'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
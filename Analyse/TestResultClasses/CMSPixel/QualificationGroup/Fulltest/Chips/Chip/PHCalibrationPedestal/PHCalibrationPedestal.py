@@ -6,6 +6,7 @@ from AbstractClasses.GeneralTestResult import GeneralTestResult
 
 class TestResult(GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['PHCalibrationGain']
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_PHCalibrationPedestal_TestResult'
         self.NameSingle = 'PHCalibrationPedestal'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import ROOT
 import AbstractClasses
+import TestResultClasses.CMSPixel.QualificationGroup.Fulltest.Fitting.DatFiles as DatFiles
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     
     def CustomInit(self):
+        self.Inputs = []
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_PHCalibrationTan_TestResult'
         self.NameSingle = 'PHCalibrationTan'
         self.Show = False
@@ -30,23 +32,13 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
 
         if PHCalibrationFitTanFile:
             
-            # for (int i = 0 i < 2 i++) fgets(string, 200, phLinearFile)
-            for i in range(3):
-                PHCalibrationFitTanFile.readline() #Omit first three lines
-            
-            for i in range(self.nCols): #Columns
-                for j in range(self.nRows): #Rows
-                    Line = PHCalibrationFitTanFile.readline()
-                    if Line:
-                        LineArray = Line.strip().split()
-                        try:
-                            float(LineArray[1])
-                            self.ResultData['Plot']['ROOTObject'].Fill(float(LineArray[1]));
-                        
-                        except (ValueError, TypeError, IndexError):
-                            pass
-                    
-            
+            # parameters Pix column row, after three header lines
+            FitResults = DatFiles.ReadFitResults(PHCalibrationFitTanFileName, 3)
+            nPixels = self.nCols * self.nRows
+            for Parameters, Valid in zip(FitResults['Parameters'][:nPixels], FitResults['Valid'][:nPixels]):
+                if Valid and len(Parameters) > 1:
+                    self.ResultData['Plot']['ROOTObject'].Fill(float(Parameters[1]));
+
             # -- Parameter1
         
             #mPar1
@@ -9,6 +9,7 @@ except NameError:
        from sets import Set as set
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['BumpBonding', 'Grading', 'PHCalibrationGain', 'PHCalibrationParameter1', 'PHCalibrationPedestal', 'SCurveWidths', 'TrimBits', 'VcalThresholdTrimmed']
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_PerformanceParameters_TestResult'
         self.NameSingle='PerformanceParameters'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
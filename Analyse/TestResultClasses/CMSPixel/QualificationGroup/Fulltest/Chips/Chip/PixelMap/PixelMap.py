@@ -1,18 +1,26 @@
 import ROOT
 import AbstractClasses
 import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.HistoArray as HistoArray
+import AbstractClasses.Helper.PixelMask as PixelMask
 import AbstractClasses.Helper.ROOTConfiguration as ROOTConfiguration
+import AbstractClasses.Helper.GradingEngine as GradingEngine
+try:
+    import numpy
+except ImportError:
+    numpy = None
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = []
         ROOTConfiguration.initialise_ROOT()
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_PixelMap_TestResult'
         self.NameSingle='PixelMap'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
         self.verbose = True
-        self.DeadPixelList = set()
-        self.Noisy1PixelList = set()
-        self.MaskDefectList = set()
-        self.IneffPixelList = set()
+        self.DeadPixelList = PixelMask.PixelMask()
+        self.Noisy1PixelList = PixelMask.PixelMask()
+        self.MaskDefectList = PixelMask.PixelMask()
+        self.IneffPixelList = PixelMask.PixelMask()
         self.chipNo = self.ParentObject.Attributes['ChipNo']
 
 
@@ -45,13 +53,19 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
             else:
                 comperateTo=0
 
-            for xbin in range(1,nXbins+1):
-                for ybin in range(1,nYbins+1):
-                    binContent = self.ResultData['Plot']['ROOTObject_Mask'].GetBinContent(xbin,ybin)
+            if HistoArray.available:
+                maskProblems = HistoArray.get_array(self.ResultData['Plot']['ROOTObject_Mask']) != comperateTo
+                for xbin, ybin in zip(*numpy.nonzero(maskProblems)):
+                    if self.verbose: print 'MaskProblem with %d/%d'%(xbin+1,ybin+1)
+                    self.ResultData['Plot']['ROOTObject'].SetBinContent(int(xbin)+1,int(ybin)+1,-1)
+            else:
+                for xbin in range(1,nXbins+1):
+                    for ybin in range(1,nYbins+1):
+                        binContent = self.ResultData['Plot']['ROOTObject_Mask'].GetBinContent(xbin,ybin)
 
-                    if binContent != comperateTo:
-                        if self.verbose: print 'MaskProblem with %d/%d'%(xbin,ybin)
-                        self.ResultData['Plot']['ROOTObject'].SetBinContent(xbin,ybin,-1)
+                        if binContent != comperateTo:
+                            if self.verbose: print 'MaskProblem with %d/%d'%(xbin,ybin)
+                            self.ResultData['Plot']['ROOTObject'].SetBinContent(xbin,ybin,-1)
 
         self.CheckPixelAlive()
         if self.ResultData['Plot']['ROOTObject']:
@@ -69,14 +83,17 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         self.Title = 'Pixel Map: C{ChipNo}'.format(ChipNo=self.ParentObject.Attributes['ChipNo'])
         
     def CheckPixelAlive(self):
-        for column in range(self.nCols): #Column
-            for row in range(self.nRows): #Row
-                pixelAlive = True
-                PixelMapCurrentValue = self.ResultData['Plot']['ROOTObject'].GetBinContent(column+1, row+1)
-                pixelAlive = pixelAlive and not self.IsDeadPixel(column, row,PixelMapCurrentValue)
-                pixelAlive = pixelAlive and not self.IsNoisyPixel(column,row,PixelMapCurrentValue)
-                pixelAlive = pixelAlive and not self.HasMaskDefect(column,row,PixelMapCurrentValue)
-                pixelAlive = pixelAlive and not self.IsInefficientPixel(column,row,PixelMapCurrentValue)
+        if HistoArray.available:
+            self.CheckPixelAliveArray()
+        else:
+            for column in range(self.nCols): #Column
+                for row in range(self.nRows): #Row
+                    pixelAlive = True
+                    PixelMapCurrentValue = self.ResultData['Plot']['ROOTObject'].GetBinContent(column+1, row+1)
+                    pixelAlive = pixelAlive and not self.IsDeadPixel(column, row,PixelMapCurrentValue)
+                    pixelAlive = pixelAlive and not self.IsNoisyPixel(column,row,PixelMapCurrentValue)
+                    pixelAlive = pixelAlive and not self.HasMaskDefect(column,row,PixelMapCurrentValue)
+                    pixelAlive = pixelAlive and not self.IsInefficientPixel(column,row,PixelMapCurrentValue)
 
         NotAlivePixelList = self.DeadPixelList.union(self.Noisy1PixelList).union(self.MaskDefectList).union(self.IneffPixelList)
         self.ResultData['KeyValueDictPairs'][ 'NotAlivePixels'] = {'Value':   (NotAlivePixelList), 'Label':'  Not Alive Pixels', }
@@ -95,6 +112,25 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         self.ResultData['KeyValueDictPairs']['NInefficentPixels'] = {'Value':len(self.IneffPixelList), 'Label':'- N Inefficent Pixels', }
         self.ResultData['KeyList'].append('NInefficentPixels')
 
+    def CheckPixelAliveArray(self):
+        '''
+            same classification as the IsDeadPixel, IsNoisyPixel, HasMaskDefect and IsInefficientPixel
+            checks, every pixel ends up in the first list it qualifies for
+        '''
+        PixelMapValues = HistoArray.get_array(self.ResultData['Plot']['ROOTObject'])[:self.nCols,:self.nRows]
+        thr = 0
+        if self.TestResultEnvironmentObject.GradingParameters.has_key('PixelMapMaskDefectUpperThreshold'):
+            thr = self.TestResultEnvironmentObject.GradingParameters['PixelMapMaskDefectUpperThreshold']
+        else:
+            print "self.TestResultEnvironmentObject.GradingParameters['PixelMapMaskDefectUpperThreshold'] doesn't exist..."
+        dead, noisy, maskDefect = GradingEngine.get_pixel_alive_defects(PixelMapValues,
+                self.TestResultEnvironmentObject.GradingParameters['PixelMapMaxValue'], thr)
+        inefficient = ~(dead | noisy | maskDefect) & (PixelMapValues < self.TestResultEnvironmentObject.GradingParameters['PixelMapMinValue'])
+        self.DeadPixelList.update(HistoArray.get_pixel_mask(dead, self.chipNo))
+        self.Noisy1PixelList.update(HistoArray.get_pixel_mask(noisy, self.chipNo))
+        self.MaskDefectList.update(HistoArray.get_pixel_mask(maskDefect, self.chipNo))
+        self.IneffPixelList.update(HistoArray.get_pixel_mask(inefficient, self.chipNo))
+
     def IsDeadPixel(self, column, row,PixelMapCurrentValue):
         if PixelMapCurrentValue == 0:
             self.DeadPixelList.add((self.chipNo,column,row))
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import AbstractClasses
 import AbstractClasses.Helper.HistoGetter as HistoGetter
+import TestResultClasses.CMSPixel.QualificationGroup.Fulltest.Fitting.DatFiles as DatFiles
 import ROOT
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = []
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_SCurveWidths_TestResult'
         self.NameSingle='SCurveWidths'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
@@ -68,31 +70,23 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         if not SCurveFile:
             raise Exception('Cannot find SCurveFile "%s"'%SCurveFileName)
         else:
-            #Omit the first two lines
             print 'read file',SCurveFileName
-            Line = SCurveFile.readline()
-            Line = SCurveFile.readline()
-
-            for column in range(self.nCols): #Columns
-                for row in range(self.nRows): #Rows
-                    Line = SCurveFile.readline()
-                    if Line:
-                        LineArray = Line.strip().split()
-                        Threshold = float(LineArray[0])
-                        Width = float(LineArray[1])
-#                         if self.verbose:
-                        if self.verbose:  print column, row, Threshold, Width
-                        #Threshold, Sign, SomeString, a, b = Line.strip().split()
-
-                        self.ResultData['Plot']['ROOTObject'].Fill(Width)
-                        Threshold = Threshold / self.TestResultEnvironmentObject.GradingParameters['StandardVcal2ElectronConversionFactor']
-                        self.ResultData['Plot']['ROOTObject_ht'].SetBinContent(column+1, row+1, Threshold)
-                        if not isDigitalROC and self.ResultData['Plot']['ROOTObject_h2'].GetBinContent(column+1, row+1) >= self.TestResultEnvironmentObject.GradingParameters['minThrDiff']:
-                            self.ResultData['Plot']['ROOTObject_hd'].Fill(Width)
-                        elif isDigitalROC and self.ResultData['Plot']['ROOTObject_h2'].GetBinContent(column+1, row+1) <= self.TestResultEnvironmentObject.GradingParameters['BumpBondThr']:
-                            self.ResultData['Plot']['ROOTObject_hd'].Fill(Width)
-                    else:
-                        if self.verbose: print column, row, 'NAN'
+            # Threshold Sigma Pix column row, after two header lines
+            FitResults = DatFiles.ReadFitResults(SCurveFileName, 2)
+            for i, Parameters in enumerate(FitResults['Parameters'][:self.nCols * self.nRows]):
+                column = i // self.nRows
+                row = i % self.nRows
+                Threshold = float(Parameters[0])
+                Width = float(Parameters[1])
+                if self.verbose:  print column, row, Threshold, Width
+
+                self.ResultData['Plot']['ROOTObject'].Fill(Width)
+                Threshold = Threshold / self.TestResultEnvironmentObject.GradingParameters['StandardVcal2ElectronConversionFactor']
+                self.ResultData['Plot']['ROOTObject_ht'].SetBinContent(column+1, row+1, Threshold)
+                if not isDigitalROC and self.ResultData['Plot']['ROOTObject_h2'].GetBinContent(column+1, row+1) >= self.TestResultEnvironmentObject.GradingParameters['minThrDiff']:
+                    self.ResultData['Plot']['ROOTObject_hd'].Fill(Width)
+                elif isDigitalROC and self.ResultData['Plot']['ROOTObject_h2'].GetBinContent(column+1, row+1) <= self.TestResultEnvironmentObject.GradingParameters['BumpBondThr']:
+                    self.ResultData['Plot']['ROOTObject_hd'].Fill(Width)
             if self.verbose:
                 print 'Entries: ', self.ResultData['Plot']['ROOTObject'].GetEntries(), self.ResultData['Plot']['ROOTObject'].GetMean(), self.ResultData['Plot']['ROOTObject'].GetRMS()
                 raw_input()
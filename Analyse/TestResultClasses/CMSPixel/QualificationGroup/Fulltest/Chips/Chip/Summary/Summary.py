@@ -8,6 +8,7 @@ except NameError:
        from sets import Set as set
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['Grading']
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_Summary_TestResult'
         self.NameSingle='Summary'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
@@ -4,6 +4,7 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
 
 
     def CustomInit(self):
+        self.Inputs = []
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_TemperatureCalibration_TestResult'
         self.NameSingle = 'TemperatureCalibration'
         self.Enabled = False
@@ -1,12 +1,16 @@
 import ROOT
 import AbstractClasses
 import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.HistoArray as HistoArray
+import AbstractClasses.Helper.PixelMask as PixelMask
+import AbstractClasses.Helper.GradingEngine as GradingEngine
 try:
-    set
-except NameError:
-    from sets import Set as set
+    import numpy
+except ImportError:
+    numpy = None
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['PixelMap']
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_Chips_Chip_TrimBitProblems_TestResult'
         self.NameSingle = 'TrimBitProblems'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
@@ -20,17 +24,27 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         TrimBitHistograms = []
         ChipNo = self.ParentObject.Attributes['ChipNo']
         HistoDict = self.ParentObject.ParentObject.ParentObject.HistoDict
-        self.DeadTrimbitsList = set()
+        self.DeadTrimbitsList = PixelMask.PixelMask()
         self.PixelNotAliveList = self.ParentObject.ResultData['SubTestResults']['PixelMap'].ResultData['KeyValueDictPairs']['NotAlivePixels']['Value']
-        for k in range(5):
-            histname = HistoDict.get(self.NameSingle, 'TrimBitMap%d' % k)
-            tmpHistogram = HistoGetter.get_histo(self.ParentObject.ParentObject.FileHandle, histname, rocNo = ChipNo)
-            tmpHistogram = tmpHistogram.Clone(self.GetUniqueID())
-            TrimBitHistograms.append(tmpHistogram)
-        for col in range(self.nCols):  # Column
-            for row in range(self.nRows):  # Row
-                deadTrimBits = self.GetDeadTrimBits(col, row, TrimBitHistograms)
-                self.ResultData['Plot']['ROOTObject'].Fill(col, row, deadTrimBits)
+        if HistoArray.available:
+            TrimBitArrays = []
+            for k in range(5):
+                histname = HistoDict.get(self.NameSingle, 'TrimBitMap%d' % k)
+                TrimBitArrays.append(HistoGetter.get_histo_array(self.ParentObject.ParentObject.FileHandle, histname, rocNo = ChipNo))
+            deadTrimBits = self.GetDeadTrimBitsArray(TrimBitArrays)
+            for col, row in zip(*numpy.nonzero(deadTrimBits)):
+                self.ResultData['Plot']['ROOTObject'].SetBinContent(int(col) + 1, int(row) + 1, float(deadTrimBits[col, row]))
+            self.ResultData['Plot']['ROOTObject'].SetEntries(self.nCols * self.nRows)
+        else:
+            for k in range(5):
+                histname = HistoDict.get(self.NameSingle, 'TrimBitMap%d' % k)
+                tmpHistogram = HistoGetter.get_histo(self.ParentObject.ParentObject.FileHandle, histname, rocNo = ChipNo)
+                tmpHistogram = tmpHistogram.Clone(self.GetUniqueID())
+                TrimBitHistograms.append(tmpHistogram)
+            for col in range(self.nCols):  # Column
+                for row in range(self.nRows):  # Row
+                    deadTrimBits = self.GetDeadTrimBits(col, row, TrimBitHistograms)
+                    self.ResultData['Plot']['ROOTObject'].Fill(col, row, deadTrimBits)
 
         if self.ResultData['Plot']['ROOTObject']:
 
@@ -65,6 +79,30 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
                                                 }
         self.ResultData['KeyList'] = ['nDeadTrimbits', 'nDeadPixels']
 
+    def GetDeadTrimBitsArray(self, TrimBitArrays):
+        '''
+            GetDeadTrimBits for all pixels at once from the bin content arrays of the trim bit maps,
+            returns an array [column, row] with the dead trim bit pattern
+        '''
+        gradingCriteria = self.TestResultEnvironmentObject.GradingParameters['TrimBitDifference']
+        excludeTrimBit14 = bool(self.TestResultEnvironmentObject.GradingParameters['excludeTrimBit14'])
+        trimBit0 = TrimBitArrays[0][:self.nCols, :self.nRows]
+        if self.TestResultEnvironmentObject.Configuration['ResultDataStore']:
+            # stored for regrading with other TrimBitDifference and excludeTrimBit14 values, see Helper/GradingEngine.py
+            self.ResultData['HiddenData']['TrimBitDifference1'] = abs(TrimBitArrays[1][:self.nCols, :self.nRows] - trimBit0)
+            self.ResultData['HiddenData']['TrimBitMinDifference'] = numpy.min(
+                [abs(TrimBitArrays[k][:self.nCols, :self.nRows] - trimBit0) for k in range(2, 5)], axis = 0)
+        retVal = numpy.zeros((self.nCols, self.nRows), dtype = int)
+        for k in range(1, 5):
+            trimBitK = TrimBitArrays[k][:self.nCols, :self.nRows]
+            deadTrimBit = GradingEngine.is_dead_trim_bit(abs(trimBitK - trimBit0), k, gradingCriteria, excludeTrimBit14)
+            retVal += deadTrimBit * 2 ** (4 - (k - 1))
+            if self.verbose:
+                for column, row in zip(*numpy.nonzero(deadTrimBit)):
+                    print 'Dead TrimBit: added %2d,%2d %d' % (column, row, k), trimBitK[column, row], trimBit0[column, row], gradingCriteria
+        self.DeadTrimbitsList.update(HistoArray.get_pixel_mask(retVal > 0, self.chipNo))
+        return retVal
+
     def GetDeadTrimBits(self, column, row, TrimBitHistograms):
         gradingCriteria = self.TestResultEnvironmentObject.GradingParameters['TrimBitDifference']
         excludeTrimBit14 = bool(self.TestResultEnvironmentObject.GradingParameters['excludeTrimBit14'])
@@ -72,10 +110,8 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         for k in range(1, 5):
             trimBit0 = TrimBitHistograms[0].GetBinContent(column + 1, row + 1)
             trimBitK = TrimBitHistograms[k].GetBinContent(column + 1, row + 1)
-            if excludeTrimBit14 and k == 1:
-                continue
             TrimBitDifference = abs(trimBitK - trimBit0)
-            if TrimBitDifference <= gradingCriteria :
+            if GradingEngine.is_dead_trim_bit(TrimBitDifference, k, gradingCriteria, excludeTrimBit14):
                 self.DeadTrimbitsList.add((self.chipNo, column, row))
                 retVal += 2 ** (4 - (k - 1))
                 if self.verbose:
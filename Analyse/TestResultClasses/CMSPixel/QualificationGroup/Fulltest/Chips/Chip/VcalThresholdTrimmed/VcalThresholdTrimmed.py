@@ -2,13 +2,15 @@
 import ROOT
 import AbstractClasses
 import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.PixelMask as PixelMask
 
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['OpParameters']
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_VcalThresholdTrimmed_TestResult'
         self.NameSingle='VcalThresholdTrimmed'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
-        self.ThrDefectList = set()
+        self.ThrDefectList = PixelMask.PixelMask()
         self.chipNo = self.ParentObject.Attributes['ChipNo']
 
     def PopulateResultData(self):
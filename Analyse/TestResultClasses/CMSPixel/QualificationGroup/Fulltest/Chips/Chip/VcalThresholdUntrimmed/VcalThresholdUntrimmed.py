@@ -4,6 +4,7 @@ import AbstractClasses
 import ROOT
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        self.Inputs = ['SCurveWidths']
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_Chip_VcalThresholdUntrimmed_TestResult'
         self.NameSingle='VcalThresholdUntrimmed'
         self.Attributes['TestedObjectType'] = 'CMSPixel_QualificationGroup_Fulltest_ROC'
@@ -2,6 +2,8 @@ import AbstractClasses
 import ROOT
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        # the chips are independent of each other
+        self.ParallelSubTestResults = True
         self.Name='CMSPixel_QualificationGroup_Fulltest_Chips_TestResult'
         self.NameSingle='Chips'
         
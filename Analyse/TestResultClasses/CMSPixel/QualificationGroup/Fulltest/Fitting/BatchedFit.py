@@ -0,0 +1,132 @@
+'''
+    Batched least squares fits of the calibration curves of all pixels of a ROC at once.
+    The curves are numpy arrays of shape (nPixels, nPoints), points which should not be
+    used in the fit are excluded via a boolean mask.
+    Used as fast path in front of the per pixel ROOT fits, pixels which do not converge
+    have to be refitted with ROOT by the caller.
+'''
+import math
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def Erf(x):
+    '''
+        vectorized error function (Abramowitz and Stegun 7.1.26, |error| < 1.5e-7)
+    '''
+    t = 1. / (1. + 0.3275911 * numpy.abs(x))
+    y = 1. - t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429)))) * numpy.exp(-x * x)
+    return numpy.where(x < 0, -y, y)
+
+
+def ErfModel(parameters, x):
+    '''
+        [0]*Erf([2]*(x-[1])) + [3]
+        returns function values, jacobian w.r.t. the parameters and derivative w.r.t. x
+    '''
+    amplitude = parameters[:,0:1]
+    threshold = parameters[:,1:2]
+    width = parameters[:,2:3]
+    offset = parameters[:,3:4]
+    u = width * (x - threshold)
+    erf = Erf(u)
+    gauss = 2. / math.sqrt(math.pi) * numpy.exp(-u * u)
+    jacobian = numpy.empty(x.shape + (4,))
+    jacobian[:,:,0] = erf
+    jacobian[:,:,1] = -amplitude * width * gauss
+    jacobian[:,:,2] = amplitude * (x - threshold) * gauss
+    jacobian[:,:,3] = 1.
+    return amplitude * erf + offset, jacobian, amplitude * width * gauss
+
+
+def TanhModel(parameters, x):
+    '''
+        [3] + [2]*tanh([0]*x - [1])
+        returns function values, jacobian w.r.t. the parameters and derivative w.r.t. x
+    '''
+    tanh = numpy.tanh(parameters[:,0:1] * x - parameters[:,1:2])
+    derivative = parameters[:,2:3] * (1. - tanh * tanh)
+    jacobian = numpy.empty(x.shape + (4,))
+    jacobian[:,:,0] = derivative * x
+    jacobian[:,:,1] = -derivative
+    jacobian[:,:,2] = tanh
+    jacobian[:,:,3] = 1.
+    return parameters[:,3:4] + parameters[:,2:3] * tanh, jacobian, derivative * parameters[:,0:1]
+
+
+def GetWeights(dfdx, ey, ex, mask):
+    '''
+        1/sigma^2 with the effective variance ey^2 + (f'(x)*ex)^2 like TGraphErrors::Fit
+    '''
+    variance = ey * ey
+    if ex is not None:
+        variance = variance + (dfdx * ex)**2
+    return numpy.where(mask & (variance > 0), 1. / numpy.where(variance > 0, variance, 1.), 0.)
+
+
+def GetStep(jacobian, weights, residuals, damping):
+    '''
+        Levenberg-Marquardt step for all pixels, returns step and gradient
+    '''
+    nParameters = jacobian.shape[2]
+    hessian = numpy.einsum('npi,np,npj->nij', jacobian, weights, jacobian)
+    gradient = numpy.einsum('npi,np,np->ni', jacobian, weights, residuals)
+    diagonal = numpy.diagonal(hessian, axis1=1, axis2=2)
+    # parameters without influence are kept fixed instead of making the matrix singular
+    diagonal = numpy.where(diagonal > 0, diagonal, 1.)
+    hessian = hessian + ((damping[:,numpy.newaxis] + 1.e-12) * diagonal)[:,:,numpy.newaxis] * numpy.eye(nParameters)
+    return numpy.linalg.solve(hessian, gradient), gradient
+
+
+def FitLevenbergMarquardt(model, parameters, x, y, ey, ex = None, mask = None, maxIterations = 100, edmLimit = 1.e-4):
+    '''
+        fits model to all curves at the same time, parameters are the start values (nPixels, nParameters)
+        convergence criterion like Minuit: estimated distance to minimum < edmLimit
+        returns parameters, chi2, ndf and a boolean array which pixels converged
+    '''
+    parameters = numpy.array(parameters, dtype=float)
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    ey = numpy.asarray(ey, dtype=float)
+    if mask is None:
+        mask = numpy.ones(x.shape, dtype=bool)
+    nPixels, nParameters = parameters.shape
+    ndf = mask.sum(axis=1) - nParameters
+
+    values, jacobian, dfdx = model(parameters, x)
+    weights = GetWeights(dfdx, ey, ex, mask)
+    residuals = y - values
+    chi2 = (weights * residuals**2).sum(axis=1)
+    damping = numpy.ones(nPixels) * 1.e-3
+    active = ndf > 0
+    for iteration in range(maxIterations):
+        if not active.any():
+            break
+        a = numpy.nonzero(active)[0]
+        step = GetStep(jacobian[a], weights[a], residuals[a], damping[a])[0]
+        newParameters = parameters[a] + step
+        newValues, newJacobian, newDfdx = model(newParameters, x[a])
+        newWeights = GetWeights(newDfdx, ey[a], None if ex is None else ex[a], mask[a])
+        newResiduals = y[a] - newValues
+        newChi2 = (newWeights * newResiduals**2).sum(axis=1)
+        improved = numpy.isfinite(newChi2) & (newChi2 <= chi2[a])
+        accepted = a[improved]
+        smallChange = (chi2[accepted] - newChi2[improved]) <= 1.e-9 * (1. + chi2[accepted])
+        parameters[accepted] = newParameters[improved]
+        residuals[accepted] = newResiduals[improved]
+        jacobian[accepted] = newJacobian[improved]
+        weights[accepted] = newWeights[improved]
+        chi2[accepted] = newChi2[improved]
+        damping[accepted] = numpy.maximum(damping[accepted] / 10., 1.e-12)
+        rejected = a[~improved]
+        damping[rejected] *= 10.
+        active[accepted[smallChange]] = False
+        active[rejected[damping[rejected] > 1.e10]] = False
+
+    # estimated distance to minimum with the undamped step
+    step, gradient = GetStep(jacobian, weights, residuals, numpy.zeros(nPixels))
+    edm = numpy.abs((gradient * step).sum(axis=1))
+    converged = (ndf > 0) & numpy.isfinite(chi2) & numpy.isfinite(parameters).all(axis=1) & (edm < edmLimit)
+    return parameters, chi2, ndf, converged
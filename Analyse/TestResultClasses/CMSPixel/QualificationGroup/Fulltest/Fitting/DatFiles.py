@@ -0,0 +1,183 @@
+'''
+    Readers for the fixed layout text files of the calibration scans and their fits
+        SCurveData_C*.dat       n start value_0 ... value_n-1
+        phCalibration_C*.dat    ph_0 ... ph_n-1 Pix column row
+        SCurve_C*.dat,
+        phCalibrationFit*.dat   parameter_0 ... parameter_n-1 Pix column row
+    The lines are only split in python, the conversion of the tokens is done for the whole
+    file at once with numpy (plain lists if numpy is not available).
+    The fit results are read by several test results and are cached by size and modification time
+    until ClearCache() is called at the end of the Fulltest.
+'''
+import os
+import copy
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# (reader, file name, arguments) -> ((size, mtime), result)
+_Cache = {}
+
+
+def Cached(reader):
+    '''
+        decorator: cache the result of reader(fileName, ...) as long as the file does not change,
+        open files are always read. Every caller gets its own copy of the result.
+    '''
+    def CachedReader(fileOrName, *args):
+        if not isinstance(fileOrName, basestring):
+            return reader(fileOrName, *args)
+        fileName = os.path.abspath(fileOrName)
+        fileStat = os.stat(fileName)
+        signature = (fileStat.st_size, fileStat.st_mtime)
+        key = (reader.__name__, fileName, args)
+        if key not in _Cache or _Cache[key][0] != signature:
+            _Cache[key] = (signature, reader(fileName, *args))
+        return copy.deepcopy(_Cache[key][1])
+    CachedReader.__name__ = reader.__name__
+    CachedReader.__doc__ = reader.__doc__
+    return CachedReader
+
+
+def ClearCache():
+    _Cache.clear()
+
+
+def ReadLines(fileOrName, nHeaderLines):
+    '''
+        returns the header lines and the tokens of all non empty lines after the header
+    '''
+    if isinstance(fileOrName, basestring):
+        inputFile = open(fileOrName, 'r')
+        text = inputFile.read()
+        inputFile.close()
+    else:
+        text = fileOrName.read()
+    lines = text.splitlines()
+    return lines[:nHeaderLines], [line.split() for line in lines[nHeaderLines:] if line.strip()]
+
+
+def ConvertToken(token, converter, default):
+    try:
+        return converter(token)
+    except ValueError:
+        return default
+
+
+def ConvertTokens(tokens, dtype, default):
+    '''
+        tokens (list of equally long token lists) as 2d array of dtype, tokens which can not be
+        converted are replaced by default. Returns the array and which lines could be converted completely.
+    '''
+    if numpy is not None:
+        try:
+            return numpy.array(tokens, dtype = str).reshape(len(tokens), -1).astype(dtype), numpy.ones(len(tokens), dtype = bool)
+        except ValueError:
+            pass
+    # token by token for files with invalid entries
+    converter = float if dtype == 'float64' else int
+    values = [[ConvertToken(token, converter, None) for token in line] for line in tokens]
+    valid = [None not in line for line in values]
+    values = [[default if value is None else value for value in line] for line in values]
+    if numpy is not None:
+        return numpy.array(values, dtype = dtype).reshape(len(tokens), -1), numpy.array(valid, dtype = bool)
+    return values, valid
+
+
+def SplitPixelAddress(tokens):
+    '''
+        splits lines '... Pix column row' into the values and the pixel address,
+        lines without address get column and row -1
+    '''
+    values = []
+    columns = []
+    rows = []
+    for line in tokens:
+        if len(line) >= 3 and line[-3] == 'Pix':
+            values.append(line[:-3])
+            columns.append(ConvertToken(line[-2], int, -1))
+            rows.append(ConvertToken(line[-1], int, -1))
+        else:
+            values.append(line)
+            columns.append(-1)
+            rows.append(-1)
+    if numpy is not None:
+        columns = numpy.array(columns, dtype = int)
+        rows = numpy.array(rows, dtype = int)
+    return values, columns, rows
+
+
+def PadTokens(tokens, fill):
+    '''
+        all token lists with the same length, returns the padded lists and which lines are complete
+    '''
+    length = max([len(line) for line in tokens] + [0])
+    return [line + [fill] * (length - len(line)) for line in tokens], [len(line) == length for line in tokens]
+
+
+def ReadSCurveData(fileOrName):
+    '''
+        reads SCurveData_C*.dat, returns a dict with
+            Mode, NTrig: from the header if given there, otherwise None
+            Data: int array [pixel, (n, start, value_0, ...)], a list of lists if the pixels have
+                  a different number of points or numpy is not available
+    '''
+    header, tokens = ReadLines(fileOrName, 1)
+    result = {'Mode': None, 'NTrig': None}
+    header = header[0].split() if header else []
+    for index, token in enumerate(header):
+        if 'mode' in token.lower() and len(header) > index + 1:
+            result['Mode'] = int(header[index + 1])
+        if 'ntrig' in token.lower() and len(header) > index + 1:
+            result['NTrig'] = int(header[index + 1])
+    if numpy is not None and len(set(len(line) for line in tokens)) == 1:
+        result['Data'] = numpy.array(tokens, dtype = str).astype(int)
+    else:
+        result['Data'] = [[int(token) for token in line] for line in tokens]
+    return result
+
+
+def ReadPHCalibrationData(fileOrName, invalidPH = -99999):
+    '''
+        reads phCalibration_C*.dat, returns a dict with
+            LowRange, HighRange: vcal values of the header
+            Columns, Rows: pixel addresses
+            PH: int array [pixel, point], tokens which are no integer are replaced by invalidPH
+    '''
+    header, tokens = ReadLines(fileOrName, 4)
+    result = {
+        'LowRange': [int(i) for i in header[1].split(':')[1].split()],
+        'HighRange': [int(i) for i in header[2].split(':')[1].split()],
+    }
+    values, result['Columns'], result['Rows'] = SplitPixelAddress(tokens)
+    nPoints = set(len(line) for line in values)
+    if len(nPoints) > 1:
+        raise Exception('Length of PHCalibration file does not fit! %s' % fileOrName)
+    result['PH'] = ConvertTokens(values, 'int64', invalidPH)[0]
+    return result
+
+
+@Cached
+def ReadFitResults(fileOrName, nHeaderLines):
+    '''
+        reads the fit results written by the fitters (SCurve_C*.dat, phCalibrationFit*_C*.dat),
+        returns a dict with
+            Columns, Rows: pixel addresses as written in the file, -1 if there is none
+            Parameters: float array [pixel, parameter], NaN for missing or invalid values
+            Valid: which lines could be read completely
+    '''
+    header, tokens = ReadLines(fileOrName, nHeaderLines)
+    values, columns, rows = SplitPixelAddress(tokens)
+    values, complete = PadTokens(values, 'nan')
+    parameters, valid = ConvertTokens(values, 'float64', float('nan'))
+    if numpy is not None:
+        valid = valid & numpy.array(complete, dtype = bool) & (columns >= 0) & (rows >= 0)
+    else:
+        valid = [i and j and column >= 0 and row >= 0 for i, j, column, row in zip(valid, complete, columns, rows)]
+    return {
+        'Columns': columns,
+        'Rows': rows,
+        'Parameters': parameters,
+        'Valid': valid,
+    }
@@ -16,14 +16,16 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         nRocs = self.Attributes['NumberOfChips']
         directory = self.RawTestSessionDataPath
         refit = self.TestResultEnvironmentObject.Configuration['Fitting']['refit']
+        nProcesses = self.TestResultEnvironmentObject.Configuration['Fitting']['nProcesses']
+        vectorized = self.TestResultEnvironmentObject.Configuration['Fitting']['vectorized']
         print 'SCurve fitting...'
         ePerVcal =  self.TestResultEnvironmentObject.GradingParameters['StandardVcal2ElectronConversionFactor']
-        fitter = SCurve_Fitting(refit,HistoDict = self.ParentObject.HistoDict,ePerVcal=ePerVcal)
+        fitter = SCurve_Fitting(refit,HistoDict = self.ParentObject.HistoDict,ePerVcal=ePerVcal,nProcesses=nProcesses,vectorized=vectorized)
         fitter.FitAllSCurve(directory,nRocs)
         print 'linear PH fitting...'
-        fitter = PH_Fitting(0,refit,HistoDict = self.ParentObject.HistoDict)
+        fitter = PH_Fitting(0,refit,HistoDict = self.ParentObject.HistoDict,nProcesses=nProcesses)
         fitter.FitAllPHCurves(directory,nRocs)
         print 'tanh PH fitting...'
-        fitter = PH_Fitting(3,refit,HistoDict = self.ParentObject.HistoDict)
+        fitter = PH_Fitting(3,refit,HistoDict = self.ParentObject.HistoDict,nProcesses=nProcesses,vectorized=vectorized)
         fitter.FitAllPHCurves(directory,nRocs)
         print 'done'
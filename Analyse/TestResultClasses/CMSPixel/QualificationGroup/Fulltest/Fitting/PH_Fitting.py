@@ -7,6 +7,27 @@ from multiprocessing import Pool, Process, Queue, Pipe
 import multiprocessing
 import time
 import random
+import warnings
+try:
+    import numpy
+except ImportError:
+    numpy = None
+import BatchedFit
+import DatFiles
+
+# fitter instance of the current worker process, see FitAllPHCurves
+_WorkerFitter = None
+
+def _InitWorkerFitter(fitter):
+    global _WorkerFitter
+    _WorkerFitter = fitter
+    # every worker process needs its own TF1 and result histograms
+    _WorkerFitter.InitFit()
+    _WorkerFitter.InitResultHistos()
+
+def _FitPHCurveWorker(args):
+    dirName, chip = args
+    return _WorkerFitter.FitPHCurve(dirName, chip)
 
 class PH_Fitting():
     FitfcnTanName = "FitfcnTanName"
@@ -16,8 +37,14 @@ class PH_Fitting():
     vcalSteps = 5
     rangeConversion = 7
 
-    def __init__(self,fitMode,refit=True,HistoDict = None):
+    def __init__(self,fitMode,refit=True,HistoDict = None,nProcesses = 1,vectorized = False):
         self.k = 0
+        self.nProcesses = max(1, int(nProcesses))
+        # only the tanh fit has a vectorized implementation
+        self.vectorized = vectorized and fitMode == 3
+        if self.vectorized and numpy is None:
+            warnings.warn('numpy is not available, using Minuit for all PH fits')
+            self.vectorized = False
         # ROOT.gStyle
         self.verbose = False
         self.fitMode = fitMode
@@ -95,12 +122,24 @@ class PH_Fitting():
                 self.histoFits[i].Fill(value)
             i += 1
 
+    def GetHistoContents(self,histo):
+        '''
+            bin contents including under- and overflow as plain list, can be sent between processes
+        '''
+        return [histo.GetEntries(), [histo.GetBinContent(i) for i in range(histo.GetNbinsX() + 2)]]
+
+    def AddHistoContents(self,histo,contents):
+        entries, binContents = contents
+        for i in range(len(binContents)):
+            histo.SetBinContent(i, histo.GetBinContent(i) + binContents[i])
+        histo.SetEntries(histo.GetEntries() + entries)
+
     def AddToHistos(self,histos):
         if len(histos)!=2:
             raise Exception
-        self.histoChi.Add(histos[0])
+        self.AddHistoContents(self.histoChi, histos[0])
         for i in range(len(histos[1])):
-            self.histoFits[i].Add(histos[1][i])
+            self.AddHistoContents(self.histoFits[i], histos[1][i])
 
     def FitAllPHCurves(self, dir, nRocs):
 #         FILE * inputFile, *outputFile;
@@ -110,51 +149,26 @@ class PH_Fitting():
 
         print "Fitting PH Curves %s"%dir
         maxChi2 = [-1]*4
-#         self.ClearResultHistos()
-#
-#
-#         print 'using pool '
-#         pool = Pool(processes=1)
-#
-#         res = pool.map(functools.partial(self.FitPHCurve,dirName=dir), range(nRocs))
-#         print res
-#
-        threads = []
-        #result = Queue()
-        result = Queue()
-        for chip in range (0,nRocs):
-        #p = Process(target=self.FitPHCurve, args=(dir,chip,result))
-            self.FitPHCurve(dir, chip, result)
-            p = chip
-            threads.append(p)
-
-#         #loop as long as not all finished
-#         nProcesses = 3
-#         i = 0
-#         while any([(p.is_alive() or p.exitcode == None ) for p in threads]):
-#             if len(multiprocessing.active_children())< nProcesses:
-#                 if i< len(threads):
-#                     print [(p.is_alive() or p.exitcode == None ) for p in threads]
-#                     print 'start process %s of %s'%(i,len(threads))
-#                     threads[i].start()
-# #                     threads[i].join()
-#                     i += 1
-#             for k in range(i):
-#                 threads[k].join()
-#             time.sleep(1)
-#             print [(p.is_alive() or p.exitcode == None ) for p in threads]
-#             print len(multiprocessing.active_children()),multiprocessing.active_children()
-#             print i, len(threads)
-# #             if result.empty():
-# #                 print 0
-# #             else:
-# #                 print result.qsize()
-# #
-#         for p in threads:
-#             p.join()
-
-        results = [result.get() for p in threads]
-            #
+        nProcesses = min(self.nProcesses, nRocs)
+        if nProcesses > 1:
+            print 'using %d processes'%nProcesses
+            pool = Pool(processes=nProcesses, initializer=_InitWorkerFitter, initargs=(self,))
+            try:
+                # map keeps the chip order, the summary does not depend on which worker finished first
+                results = pool.map(_FitPHCurveWorker, [(dir, chip) for chip in range(0,nRocs)], chunksize=1)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            results = []
+            for chip in range(0,nRocs):
+                results.append(self.FitPHCurve(dir, chip))
+
+        # the per chip histograms are merged from their contents
+        self.ClearResultHistos()
         for chi2,histos in results :
             if chi2[0] ==-1:
                 print 'Failed to to fit in chip %s'%chi2[1]
@@ -169,7 +183,11 @@ class PH_Fitting():
         self.SaveResultHistos()
 
 
-    def FitPHCurve(self,dirName,chip,result):
+    def FitPHCurve(self,dirName,chip,result=None):
+        '''
+            fits all pixels of one chip, returns [maxChi2, [histoChi, histoFits]] with the histogram contents
+            as plain lists (see GetHistoContents). If a queue is given as result, the return value is put into it.
+        '''
         print "Fitting pulse height curves for chip %i"%chip
 
         inputFileName = '%s/'%dirName
@@ -191,9 +209,9 @@ class PH_Fitting():
             retVal =[-1]*4
             retVal[1]=chip
             retVal = [retVal,[]]
-#             if result:
-            result.put(retVal)
-            return
+            if result is not None:
+                result.put(retVal)
+            return retVal
 
         if self.fitMode ==3:
             outputFileName = '%s//phCalibrationFitTan_C%i.dat'%(dirName, chip)
@@ -204,20 +222,17 @@ class PH_Fitting():
             retVal =[-2]*4
             retVal[1]=chip
             retVal = [retVal,[]]
-#             if result:
-            result.put(retVal)
-            return
+            if result is not None:
+                result.put(retVal)
+            return retVal
 
-        dataSet = inputFile.readlines()
+        inputData = DatFiles.ReadPHCalibrationData(inputFile.name)
+        inputFile.close()
         if self.verbose:
-            print '\tLength of Dataset: %s'%len(dataSet)
-        # remove header
-        header = dataSet[:4]
-        low_range = [int(i) for i in header[1].strip('\n').split(':')[1].strip().split()]
-        high_range = [int(i) for i in header[2].strip('\n').split(':')[1].strip().split()]
-        high_range_in_low_range = [i* self.rangeConversion for i in high_range]
+            print '\tLength of Dataset: %s'%len(inputData['PH'])
+        low_range = list(inputData['LowRange'])
+        high_range_in_low_range = [i* self.rangeConversion for i in inputData['HighRange']]
         low_range.extend(high_range_in_low_range)
-        dataSet = dataSet[4:]
 
         outputFile = open(outputFileName, "w")
 
@@ -229,20 +244,25 @@ class PH_Fitting():
         outputFile.write("\n")
 
         maxChi2 = [-1]*4
-        for data in dataSet:
-            #   2  12  19  29  38  30  62  94 127 232    Pix  0  0
-                calibration = data.split() #dataSet[iCol*self.nRows+iRow].split()
-
-            #   [2,12,19,29,38,30,62,94,127,232,Pix,0,0]
-                row = int(calibration[-1])
-                column = int(calibration[-2])
-                calibration = calibration[:-3]
-                calibration = [self.convertStringToPH(i) for i in calibration]
+        self.ClearResultHistos()
+        pixels = []
+        #   2  12  19  29  38  30  62  94 127 232    Pix  0  0
+        for column,row,calibration in zip(inputData['Columns'],inputData['Rows'],inputData['PH']):
+                calibration = list(calibration) if type(calibration) == list else calibration.tolist()
+                column = int(column)
+                row = int(row)
                 if len(calibration) != len(low_range):
                     raise Exception ('Length of PHCalibration file does not fit! %s' % calibration)
                 if self.verbose:
                     print '\t',chip, column,row,":",calibration
-                fitResult = self.Fit(calibration)
+                pixels.append((column,row,calibration))
+
+        if self.vectorized:
+            fitResults = self.FitTanhVectorized([calibration for column,row,calibration in pixels])
+        else:
+            fitResults = [self.Fit(calibration) for column,row,calibration in pixels]
+
+        for (column,row,calibration),fitResult in zip(pixels,fitResults):
                 isDead = False
                 chi2 = fitResult[-1]
                 if not isDead:
@@ -250,14 +270,12 @@ class PH_Fitting():
                         maxChi2 = [chi2, chip, column, row]
                 self.FillOutputFile(outputFile,fitResult,column,row)
                 self.FillResultHistos(fitResult)
-        inputFile.close()
         outputFile.close()
-        retVal = [maxChi2,[self.histoChi,self.histoFits]]
+        retVal = [maxChi2,[self.GetHistoContents(self.histoChi),[self.GetHistoContents(histo) for histo in self.histoFits]]]
         print "\tMax Chi^2 for chip %s: %s chi^2/NDF at %s/%s"%(maxChi2[1],maxChi2[0],maxChi2[2],maxChi2[3])
-        result.put(retVal)
-#         sys.exit()
-        return
-#         return retVal
+        if result is not None:
+            result.put(retVal)
+        return retVal
 
 
     def FillOutputFile(self,outputFile,fitResult,column,row):
@@ -341,6 +359,34 @@ class PH_Fitting():
         return retVal
         pass
 
+    def FitTanhVectorized(self,calibrations):
+        '''
+            Same fit as FitTanh for all pixels at once (batched Levenberg-Marquardt),
+            pixels which do not converge are fitted with FitTanh.
+            Returns a list of fit results like FitTanh.
+        '''
+        if not calibrations:
+            return []
+        xErr = [8.94,8.89,8.55,8.55,9.16,8.68,8.90,7.85,7.29,4.37]
+        ph = numpy.array(calibrations, dtype=float)
+        nPoints = ph.shape[1]
+        vcal = numpy.tile(numpy.array(self.vcalLow[:nPoints], dtype=float), (len(ph), 1))
+        # same points and range as getArrayOfCalibrationPoints and FitTanh
+        mask = (ph >= -9999) & (vcal >= 50) & (vcal <= 1500)
+        startValues = numpy.tile([0.004, 1.4, 1000., 0.], (len(ph), 1))
+        parameters, chi2, ndf, converged = BatchedFit.FitLevenbergMarquardt(BatchedFit.TanhModel, startValues,
+                vcal, ph, numpy.tile(numpy.array(xErr[:nPoints]), (len(ph), 1)), ex=numpy.ones(ph.shape) * 2.0,
+                mask=mask)
+        results = []
+        for i in range(len(calibrations)):
+            if converged[i]:
+                results.append([float(p) for p in parameters[i]] + [float(chi2[i] / ndf[i])])
+            else:
+                results.append(self.FitTanh(calibrations[i]))
+        if self.verbose:
+            print 'vectorized PH fit: %d / %d pixels refitted with Minuit'%(len(calibrations) - converged.sum(), len(calibrations))
+        return results
+
     def FitTanPol(self,calibration):
 
         n,x,y,ex,ey = self.getArrayOfCalibrationPoints(calibration)
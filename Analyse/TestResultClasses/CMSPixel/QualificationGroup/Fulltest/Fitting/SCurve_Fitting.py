@@ -4,11 +4,31 @@ from multiprocessing import Pool, Process, Queue, Pipe
 import sys,os
 import math
 import time
+import warnings
+try:
+    import numpy
+except ImportError:
+    numpy = None
+import BatchedFit
+import DatFiles
+
+# fitter instance of the current worker process, see FitAllSCurve
+_WorkerFitter = None
+
+def _InitWorkerFitter(fitter):
+    global _WorkerFitter
+    _WorkerFitter = fitter
+    # every worker process needs its own TF1 / gMinuit state
+    _WorkerFitter.InitFit()
+
+def _FitSCurveWorker(args):
+    dirName, chip = args
+    return _WorkerFitter.FitSCurve(dirName, chip)
 
 class SCurve_Fitting():
     nCols = 52
     nRows = 80
-    def __init__(self, refit = True, HistoDict = None, chi2Limit = 2.0, ePerVcal = 50.0, verbose = False):
+    def __init__(self, refit = True, HistoDict = None, chi2Limit = 2.0, ePerVcal = 50.0, verbose = False, nProcesses = 1, vectorized = False):
         print 'SCURVE Fitting'
         ROOT.gStyle
         self.verbose = verbose
@@ -21,6 +41,11 @@ class SCurve_Fitting():
             self.nReadouts = 50
         self.chiLimit = chi2Limit
         self.ePerVcal = ePerVcal
+        self.nProcesses = max(1, int(nProcesses))
+        self.vectorized = vectorized
+        if self.vectorized and numpy is None:
+            warnings.warn('numpy is not available, using Minuit for all S-curve fits')
+            self.vectorized = False
         self.slope = self.getVcal(0,255)/256
         print "ePerVcal ",self.ePerVcal
         print 'slope: ',self.slope
@@ -45,11 +70,23 @@ class SCurve_Fitting():
     def FitAllSCurve(self,dir,nRocs):
         print "Fitting SCurves %s"%dir
         maxChi2 = [-1]*4
-        results = []
-#             p = Process(target=self.FitPHCurve, args=(dir,chip,result))
-        for chip in range(0,nRocs):
-            results.append(self.FitSCurve(dir, chip))
-            #
+        nProcesses = min(self.nProcesses, nRocs)
+        if nProcesses > 1:
+            print 'using %d processes'%nProcesses
+            pool = Pool(processes=nProcesses, initializer=_InitWorkerFitter, initargs=(self,))
+            try:
+                # map keeps the chip order, the summary does not depend on which worker finished first
+                results = pool.map(_FitSCurveWorker, [(dir, chip) for chip in range(0,nRocs)], chunksize=1)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            results = []
+            for chip in range(0,nRocs):
+                results.append(self.FitSCurve(dir, chip))
         for chi2,histos in results :
             if chi2[0] ==-1:
                 print 'Failed to to fit in chip %s'%chi2[1]
@@ -113,32 +150,33 @@ class SCurve_Fitting():
         outputFile = self.getOutputFile(dirName,chip)
         if type(outputFile) == list: return outputFile
 
-        dataSet = inputFile.readlines()
+        inputData = DatFiles.ReadSCurveData(inputFile.name)
+        inputFile.close()
+        dataSet = inputData['Data']
         if self.verbose:
             print '\tLength of Dataset: %s'%len(dataSet)
-        # remove header
-        header = dataSet[0].split()
-        for i in header:
-            if 'mode' in i.lower():
-                index = header.index(i)
-                if len(header) > index + 1:
-                    self.mode = int(header[index + 1])
-#                     raw_input('Mode: %d' % self.mode)
-            if 'ntrig' in i.lower():
-                index = header.index(i)
-                print index, len(header), index + 1,
-                if len(header) > index + 1:
-                    self.nReadouts = int(header[index + 1])
-#                     raw_input('Ntrig: %d' % self.nReadouts)
-        dataSet = dataSet[1:]
-
-#         maxChi2 = [-1]*4
+        if inputData['Mode'] is not None:
+            self.mode = inputData['Mode']
+        if inputData['NTrig'] is not None:
+            self.nReadouts = inputData['NTrig']
+
+        maxChi2 = [-3,chip,-1,-1]
         assert len(dataSet)== self.nCols*self.nRows
         badPixels = []
+        pixelResults = None
+        if self.vectorized:
+            pixelResults = self.fitSCurveDataVectorized(dataSet,chip)
         for col in range(self.nCols):
             for row in range(self.nRows):
-                data = [int(i) for i in  dataSet[col*self.nRows+row].split()]
-                [chi2, fitResults] = self.fitSCurveData(data,chip,row,col)
+                if pixelResults:
+                    [chi2, fitResults] = pixelResults[col*self.nRows+row]
+                else:
+                    data = dataSet[col*self.nRows+row]
+                    if type(data) != list:
+                        data = data.tolist()
+                    [chi2, fitResults] = self.fitSCurveData(data,chip,row,col)
+                if chi2[0] > maxChi2[0]:
+                    maxChi2 = chi2
                 if fitResults:
                     outputFile.write("%+.3e %+.3e   Pix %2i %2i\n"%(fitResults[0],fitResults[1],col,row))
                 else:
@@ -148,9 +186,8 @@ class SCurve_Fitting():
                         print 'problem with chip %s, col %s, row %s'%(chip,col,row)
         print 'Problem with %s / %s Pixels: '%(len(badPixels),self.nRows*self.nCols)
         print badPixels
-        inputFile.close()
         outputFile.close()
-        return [chi2,[]]
+        return [maxChi2,[]]
 
 
     def fitSCurveData(self,data,chip,row,col):
@@ -185,6 +222,92 @@ class SCurve_Fitting():
         return [[chi2,chip,row,col],[thr,sig]]
         pass
 
+    def fitSCurveDataVectorized(self,dataSet,chip):
+        '''
+            Fits the S-curves of all pixels of one ROC at once with a batched Levenberg-Marquardt
+            fit of the same Erf model. Pixels where the fit fails are refitted with Minuit.
+            dataSet is the int array read by DatFiles.ReadSCurveData.
+            Returns the same [[chi2,chip,row,col],[thr,sig]] list as fitSCurveData for every pixel
+            or None if the data is no array.
+        '''
+        if type(dataSet) == list:
+            print 'SCurve data of chip %s has not the same number of points for all pixels --> use Minuit'%chip
+            return None
+        data = dataSet
+        if data.ndim != 2 or data.shape[1] < 3 or (data[:,0] != data.shape[1] - 2).any():
+            print 'SCurve data of chip %s can not be vectorized --> use Minuit'%chip
+            return None
+
+        nPoints = data.shape[1] - 2
+        start = data[:,1]
+        rawValues = data[:,2:]
+        nReadouts = self.nReadouts
+
+        # same classification as extractSCurveData
+        isDeadPixel = (rawValues == 0).all(axis=1)
+        plateauReached = numpy.cumsum(rawValues == nReadouts, axis=1) > 0
+        plateauBefore = numpy.zeros_like(plateauReached)
+        plateauBefore[:,1:] = plateauReached[:,:-1]
+        values = numpy.where(plateauBefore & (rawValues == 0), nReadouts, rawValues)
+        isBadPixel = ((values < 0) | (values > nReadouts)).any(axis=1)
+        isBadPixel |= ~(values == nReadouts).any(axis=1)
+        isBadPixel |= ~(values == 0).any(axis=1)
+        isValid = ~(isBadPixel | isDeadPixel)
+
+        vcalTable = numpy.array([self.getVcal(0,i) for i in range(256)])
+        index = start[:,numpy.newaxis] + numpy.arange(nPoints)
+        x = numpy.where((index >= 0) & (index < len(vcalTable)), vcalTable[numpy.clip(index,0,len(vcalTable)-1)], -1.)
+        eff = (values + 1.) / (nReadouts + 2.)
+        y = nReadouts * eff
+        ey = nReadouts * numpy.sqrt(numpy.abs(eff * (1 - eff) / (nReadouts + 3.)))
+        # same fit range as in fitSCurveData
+        inRange = (x >= 0.0) & (x <= 0.3) & (ey > 0)
+        ndf = inRange.sum(axis=1) - 4
+        isValid &= ndf > 0
+
+        results = [[[-3,chip,i%self.nRows,i/self.nRows],[]] for i in range(len(data))]
+        fitIndices = numpy.nonzero(isValid)[0]
+        if len(fitIndices):
+            parameters = self.getInitialSCurveParameters(x[fitIndices], values[fitIndices], inRange[fitIndices])
+            parameters, chi2, ndf, converged = BatchedFit.FitLevenbergMarquardt(BatchedFit.ErfModel, parameters,
+                    x[fitIndices], y[fitIndices], ey[fitIndices], mask=inRange[fitIndices])
+            chi2 = chi2 / ndf
+            fitFailed = ~converged | ~(chi2 <= self.chiLimit)
+            for k, i in enumerate(fitIndices):
+                col = i / self.nRows
+                row = i % self.nRows
+                if fitFailed[k]:
+                    # fallback for pixels which can not be fitted vectorized
+                    results[i] = self.fitSCurveData(data[i].tolist(),chip,row,col)
+                else:
+                    thr = parameters[k,1] * self.ePerVcal / self.slope
+                    sig = 1. / (math.sqrt(2.) * parameters[k,2]) * self.ePerVcal / self.slope
+                    results[i] = [[chi2[k],chip,row,col],[thr,sig]]
+            if self.verbose:
+                print 'vectorized S-curve fit: %d / %d pixels refitted with Minuit'%(fitFailed.sum(),len(fitIndices))
+        return results
+
+    def getInitialSCurveParameters(self,x,values,inRange):
+        '''
+            start values: derivative of the efficiency curve is a gauss with mean = threshold
+        '''
+        nReadouts = float(self.nReadouts)
+        efficiency = numpy.clip(values / nReadouts, 0., 1.)
+        step = numpy.clip(numpy.diff(efficiency, axis=1), 0., None) * (inRange[:,1:] & inRange[:,:-1])
+        xCenter = 0.5 * (x[:,1:] + x[:,:-1])
+        norm = step.sum(axis=1)
+        norm = numpy.where(norm > 0, norm, 1.)
+        threshold = (step * xCenter).sum(axis=1) / norm
+        width = numpy.sqrt((step * (xCenter - threshold[:,numpy.newaxis])**2).sum(axis=1) / norm)
+        # at least one vcal step
+        width = numpy.maximum(width, 0.5 * self.slope)
+        parameters = numpy.empty((len(x),4))
+        parameters[:,0] = nReadouts / 2.
+        parameters[:,1] = threshold
+        parameters[:,2] = 1. / (math.sqrt(2.) * width)
+        parameters[:,3] = nReadouts / 2.
+        return parameters
+
     def extractSCurveData(self,data):
         n = data[0]
         start = data[1]
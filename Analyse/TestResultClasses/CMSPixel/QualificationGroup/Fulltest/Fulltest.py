@@ -4,12 +4,31 @@ import ROOT
 
 import AbstractClasses
 from AbstractClasses.Helper.BetterConfigParser import BetterConfigParser
+import AbstractClasses.Helper.HistoGetter as HistoGetter
+import AbstractClasses.Helper.HistoStore as HistoStore
+import TestResultClasses.CMSPixel.QualificationGroup.Fulltest.Fitting.DatFiles as DatFiles
 
 from AbstractClasses.GeneralTestResult import GeneralTestResult
 import subprocess
 
 class TestResult(GeneralTestResult):
+    # KeyValueDictPairs of the DacParameters test results which are uploaded to the PixelDB (column = upper case key)
+    PixelDBDacParameters = [
+        'vdig', 'vana', 'vsh', 'vcomp', 'vcal', 'vwllpr', 'vwllsh', 'vtrim', 'vthrcomp', 'vhlddel', 'vibias_bus',
+        'phoffset', 'vcomp_adc', 'phscale', 'vicolor', 'caldel', 'ctrlreg', 'wbc',
+    ]
+    # KeyValueDictPairs of the PerformanceParameters test results which are uploaded to the PixelDB
+    PixelDBPerformanceParameters = [
+        'Total', 'nDeadPixel', 'nMaskDefect', 'nDeadBumps', 'nDeadTrimbits', 'nAddressProblems', 'nNoisy1Pixel',
+        'nNoisy2Pixel', 'nThrDefect', 'nGainDefect', 'nPedDefect', 'nPar1Defect', 'PixelDefectsGrade',
+        'SCurveWidth_mu', 'SCurveWidth_sigma', 'ThresholdTrimmed_mu', 'ThresholdTrimmed_sigma',
+        'BumpBonding_mu', 'BumpBonding_sigma', 'BumpBonding_threshold',
+        'PHCalibrationGain_mu', 'PHCalibrationGain_sigma', 'PHCalibrationPar1_mu', 'PHCalibrationPar1_sigma',
+        'PHCalibrationPedestal_mu', 'PHCalibrationPedestal_sigma', 'TrimBits_mu', 'TrimBits_sigma',
+    ]
+
     def CustomInit(self):
+        self.Inputs = []
         self.Name = 'CMSPixel_QualificationGroup_Fulltest_TestResult'
         self.NameSingle = 'Fulltest'
         self.Title = str(self.Attributes['ModuleID']) + ' ' + self.Attributes['StorageKey']
@@ -245,7 +264,15 @@ class TestResult(GeneralTestResult):
             else:
                 print 'There exist no ROOT file in "%s"' % self.RawTestSessionDataPath
 
+        if self.FileHandle and self.TestResultEnvironmentObject.Configuration['HistoStore']:
+            nRocs = self.Attributes['StartChip'] + self.Attributes['NumberOfChips']
+            HistoGetter.use_array_store(self.FileHandle, self.HistoDict, nRocs,
+                                        self.FinalResultsStoragePath + '/' + HistoStore.StoreFileName)
+
     def PopulateResultData(self):
+        # the fit results of this Fulltest are not read again
+        DatFiles.ClearCache()
+        HistoGetter.clear_cache(self.FileHandle)
         self.FileHandle.Close()
 
     def GradeIV(self, i1,i2, slope, temp):
@@ -478,254 +505,87 @@ class TestResult(GeneralTestResult):
         }
         print 'fill row end'
         if self.TestResultEnvironmentObject.Configuration['Database']['UseGlobal']:
-            from PixelDB import *
-            # modified by Tommaso
-            #
-            # try and speak directly with PixelDB
-            #
-
-#            fake = int(os.environ.get('FAKE',1))
+            # the upload to the PixelDB is done in the background by the PixelDBOutbox uploader
+            IV = None
+            if IVCurveData['CurrentAtVoltage150V'] != -1:
+                IV = {
+                    'IVCurveFilePath': IVCurveData['IVCurveFilePath'],
+                    # keyword arguments of Test_IV
+                    'Test': {
+                        'I1': float(IVCurveData['CurrentAtVoltage100V']),
+                        'I2': float(IVCurveData['CurrentAtVoltage150V']),
+                        'V1': float(100),
+                        'V2': float(150),
+                        'GRADE': self.GradeIV(
+                            float(IVCurveData['RecalculatedCurrentAtVoltage100V']),
+                            float(IVCurveData['RecalculatedCurrentAtVoltage150V']),
+                            float(IVCurveData['IVSlope']),
+                            float(IVCurveData['RecalculatedToTemperature'])),
+                        'SLOPE': float(IVCurveData['IVSlope']),
+                        'TEMPERATURE': float(IVCurveData['TestTemperature']),
+                        'COMMENT': "",
+                        'DATE': int(Row['TestDate']),
+                        'TYPE': "CYC",
+                    },
+                }
 
-#            insertedID=7
-            pdb = PixelDBInterface(operator="tommaso", center="pisa")
-            pdb.connectToDB()
-            
-#            if (0 == 0):
-            OPERATOR = os.environ['PIXEL_OPERATOR']
-            CENTER = os.environ['PIXEL_CENTER']
-            s = Session(CENTER, OPERATOR)
-            pdb.insertSession(s)
-            print "--------------------"
-            print "INSERTING INTO DB", self.TestResultEnvironmentObject.FinalModuleResultsPath, s.SESSION_ID, Row
-            print "--------------------"
-            pp = pdb.insertTestFullModuleDirPlusMapv96Plus(s.SESSION_ID, Row)
-               
-            if pp is None:
-                print "INSERTION FAILED!"
-                sys.exit(31)
-            insertedID=pp.TEST_ID
-
-
-#
-# if there is an IV, use it!
-#
-#
-            print "IVCURVEDATA ", IVCurveData
-            if IVCurveData['CurrentAtVoltage150V'] != -1 :
-                # extract Sensor name
-              module = pdb.getFullModule(Row['ModuleID'])
-              if module is None:
-                    print " Cannot find Module with ModuleID = ",(Row['ModuleID'])
-                    exit (32)
-              bmodule = pdb.getBareModule(module.BAREMODULE_ID)
-              if bmodule is None:
-                    print " Cannot find bareModule with bareModuleID = ",module.BAREMODULE_ID
-                #    exit (33)
-              else:
-                sensor_id  =bmodule.SENSOR_ID
-                ivlog_path = IVCurveData['IVCurveFilePath']
-                outDir = Row['AbsFulltestSubfolder']
-                from shutil import *
-                # copy the log file in the out test dir
-                print "copying " ,ivlog_path, " to ",outDir+"/"+os.path.basename(ivlog_path)
-                copy(ivlog_path,outDir+"/"+os.path.basename(ivlog_path))
-
-                # creata the data
-                ivdata_id = Data(PFNs = outDir+"/"+os.path.basename(ivlog_path))
-                ppiv = pdb.insertData(ivdata_id)
-                if (ppiv is None):
-                  print "Cannot insert data"
-                  exit (34)
-
-                i1 = float(IVCurveData['CurrentAtVoltage100V'])
-                i2 = float(IVCurveData['CurrentAtVoltage150V'])
-                slope = float(IVCurveData['IVSlope'])
-
-                gradeiv = self.GradeIV(
-                    float(IVCurveData['RecalculatedCurrentAtVoltage100V']),
-                    float(IVCurveData['RecalculatedCurrentAtVoltage150V']),
-                    slope, 
-                    float(IVCurveData['RecalculatedToTemperature']
-                          ))
-
-
-                iv = Test_IV(SESSION_ID=s.SESSION_ID,SENSOR_ID=sensor_id,
-                             DATA_ID = ivdata_id.DATA_ID,
-                             I1 = float(IVCurveData['CurrentAtVoltage100V']), 
-                             I2 = float(IVCurveData['CurrentAtVoltage150V']), 
-                             V1 = float(100),
-                             V2 = float(150),
-                             GRADE = gradeiv,
-                             SLOPE = float(IVCurveData['IVSlope']),
-                             TEMPERATURE = float(IVCurveData['TestTemperature']),
-                             REF_ID= pp.TEST_ID,	
-                             COMMENT ="",
-                             DATE = int(Row['TestDate']),
-                             TYPE = "CYC")
-  
-
-              
-                resultiv = pdb.insertIVTest(iv)
-                if resultiv is None:
-                    print" Error inserting IVTEST"
-                    exit (35)
-                else:
-			print " IVTEST INSERTED FOR ", Row['ModuleID'],sensor_id, resultiv.TEST_ID, ivdata_id.DATA_ID, gradeiv
-
-# end IV
-
-
-#
-# also insert dac parameters
-#
-#
-#                you can access it via self.ResultData['SubTestResults']['Chips'].ResultData['SubTestResults']['Chip'+int(ChipNo)].ResultData['SubTestResults']['DacParameterOverview'].ResultData['SubTestResults']['DacParameters'+int(TrimValue)].ResultData['KeyValueDictPairs']
-            #
-                    
-            if (0==0):
-                for i in self.ResultData['SubTestResults']['Chips'].ResultData['SubTestResults']:
-                    ChipTestResultObject = self.ResultData['SubTestResults']['Chips'].ResultData['SubTestResults'][i]
-                    ChipNo = ChipTestResultObject.Attributes['ChipNo']
-                    DacParameterOverviewTestResultObject =  ChipTestResultObject.ResultData['SubTestResults']['DacParameterOverview']
-                    
-                    for j in DacParameterOverviewTestResultObject.ResultData['SubTestResults']:
-                        DacParameterTestResultObject = DacParameterOverviewTestResultObject.ResultData['SubTestResults'][j]
-                        DacParameters = DacParameterTestResultObject.ResultData['KeyValueDictPairs']
-
-#CHIP 5 {'VIon': {'Value': '130', 'Label': 'VIon'}, 'VwllSh': {'Value': '35', 'Label': 'VwllSh'}, 'Vcal': {'Value': '199', 'Label': 'Vcal'}, 'VhldDel': {'Value': '160', 'Label': 'VhldDel'}, 'Vtrim': {'Value': '7', 'Label': 'Vtrim'}, 'VthrComp': {'Value': '92', 'Label': 'VthrComp'}, 'VrgPr': {'Value': '0', 'Label': 'VrgPr'}, 'Vleak_comp': {'Value': '0', 'Label': 'Vleak_comp'}, 'Vbias_sf': {'Value': '10', 'Label': 'Vbias_sf'}, 'Vana': {'Value': '128', 'Label': 'Vana'}, 'Vdig': {'Value': '6', 'Label': 'Vdig'}, 'RangeTemp': {'Value': '0', 'Label': 'RangeTemp'}, 'VIbias_PH': {'Value': '220', 'Label': 'VIbias_PH'}, 'VIbias_roc': {'Value': '220', 'Label': 'VIbias_roc'}, 'TrimBits_mu': {'Value': '15.00', 'Label': 'TrimBit Mean'}, 'VIColOr': {'Value': '99', 'Label': 'VIColOr'}, 'VOffsetR0': {'Value': '120', 'Label': 'VOffsetR0'}, 'CalDel': {'Value': '85', 'Label': 'CalDel'}, 'TrimValue': {'Value': '-1', 'Label': 'TrimValue'}, 'VrgSh': {'Value': '0', 'Label': 'VrgSh'}, 'VSumCol': {'Value': '0', 'Label': 'VSumCol'}, 'TrimBits_sigma': {'Value': '0.00', 'Label': 'TrimBit sigma'}, 'VwllPr': {'Value': '35', 'Label': 'VwllPr'}, 'CtrlReg': {'Value': '0', 'Label': 'CtrlReg'}, 'Vnpix': {'Value': '0', 'Label': 'Vnpix'}, 'VIbiasOp': {'Value': '50', 'Label': 'VIbiasOp'}, 'Vcomp': {'Value': '10', 'Label': 'Vcomp'}, 'VIBias_Bus': {'Value': '30', 'Label': 'VIBias_Bus'}, 'Ibias_DAC': {'Value': '36', 'Label': 'Ibias_DAC'}, 'Vsf': {'Value': '150', 'Label': 'Vsf'}, 'VoffsetOp': {'Value': '92', 'Label': 'VoffsetOp'}, 'WBC': {'Value': '100', 'Label': 'WBC'}}
-#                        print"PIPPONE",i,j
-                        print "INPUT", DacParameters
-
-                        dacparam = Test_DacParameters(
-                            ROC_POS= ChipNo,
-                            TRIM_VALUE= DacParameters['TrimValue']['Value'], #DACPARAMETERS = j,
-                            FULLMODULEANALYSISTEST_ID = insertedID,   ## NOT SURE!!!!! this seems to be an analysis!!!!
-                            VDIG = DacParameters['vdig']['Value'],
-                            VANA = DacParameters['vana']['Value'], 
-                            VSH = DacParameters['vsh']['Value'],
-                            VCOMP = DacParameters['vcomp']['Value'],
-                            VCAL = DacParameters['vcal']['Value'],
-                            VWLLPR = DacParameters['vwllpr']['Value'],
-                            VWLLSH = DacParameters['vwllsh']['Value'],
-                            VTRIM = DacParameters['vtrim']['Value'],
-                            VTHRCOMP = DacParameters['vthrcomp']['Value'],
-                            VHLDDEL = DacParameters['vhlddel']['Value'],
-                            VIBIAS_BUS = DacParameters['vibias_bus']['Value'],
-                            PHOFFSET = DacParameters['phoffset']['Value'],
-                            VCOMP_ADC = DacParameters['vcomp_adc']['Value'],
-                            PHSCALE = DacParameters['phscale']['Value'],
-                            #
-                            VICOLOR = DacParameters['vicolor']['Value'],
-                            CALDEL = DacParameters['caldel']['Value'],
-                            CTRLREG = DacParameters['ctrlreg']['Value'],
-                            WBC = DacParameters['wbc']['Value'])
-                        pdb.insertTestDac(dacparam)
-                        print "DAC TEST INSERTED FOR", ChipNo, insertedID, j
-
-            if (0 ==0):
-                for i in self.ResultData['SubTestResults']['Chips'].ResultData['SubTestResults']:
-                    ChipTestResultObject = self.ResultData['SubTestResults']['Chips'].ResultData['SubTestResults'][i]
-                    ChipNo = ChipTestResultObject.Attributes['ChipNo']
-#                    print "PIPPO!!!!!",ChipNo
-                # print ChipTestResultObject.ResultData['SubTestResults'].keys()
-                    PerformanceParametersTestResultObject =  ChipTestResultObject.ResultData['SubTestResults']['PerformanceParameters']
-                    PerformanceParameters = PerformanceParametersTestResultObject.ResultData['KeyValueDictPairs']
-#                    print "PAYLOAD ", PerformanceParameters
-#PAYLOAD  {'nDeadTrimbits': {'Value': '0', 'Label': ' - Dead Trimbits'}, 'PHCalibrationPedestal_mu': {'Value': '96.65', 'Label': 'PHCalibrationPedestal \xce\xbc'}, 'nDeadPixel': {'Value': '0', 'Label': ' - Dead Pixels'}, 'PHCalibrationPar1_sigma': {'Value': '0.06', 'Label': 'PHCalibrationParameter1 \xcf\x83'}, 'BumpBonding_mu': {'Value': -16.800000000000001, 'Label': 'BumpBonding \xce\xbc'}, 'BumpBonding_threshold': {'Value': -6.1200000000000001, 'Label': 'BumpBonding Threshold'}, 'nMaskDefect': {'Value': '0', 'Label': ' - Mask Defects'}, 'nDeadBumps': {'Value': '0', 'Label': ' - Dead Bumps'}, 'PHCalibrationGain_mu': {'Value': '0.58', 'Label': 'PHCalibrationGain \xce\xbc'}, 'nNoisy1Pixel': {'Value': '0', 'Label': 'Noisy Pixels 1'}, 'nPedDefect': {'Value': '0', 'Label': 'PH Pedestal defects'}, 'BumpBonding_sigma': {'Value': 2.1400000000000001, 'Label': 'BumpBonding \xcf\x83'}, 'ThresholdTrimmed_mu': {'Value': '60.10', 'Label': 'ThresholdTrimmed \xce\xbc'}, 'PHCalibrationGain_sigma': {'Value': '0.02', 'Label': 'PHCalibrationGain \xcf\x83'}, 'PHCalibrationPedestal_sigma': {'Value': '33.73', 'Label': 'PHCalibrationPedestal \xcf\x83'}, 'nPar1Defect': {'Value': '0', 'Label': 'PH Parameter1 Defects'}, 'TrimBits_sigma': {'Value': '1.77', 'Label': 'TrimBits \xcf\x83'}, 'SCurveWidth_mu': {'Value': '121.67', 'Label': 'SCurveWidth \xce\xbc'}, 'TrimBits_mu': {'Value': '9.36', 'Label': 'TrimBits \xce\xbc'}, 'PixelDefectsGrade': {'Value': '1', 'Label': 'Pixel Defects Grade ROC'}, 'ThresholdTrimmed_sigma': {'Value': '1.37', 'Label': 'ThresholdTrimmed \xcf\x83'}, 'PHCalibrationPar1_mu': {'Value': '0.81', 'Label': 'PHCalibrationParameter1 \xce\xbc'}, 'nAddressProblems': {'Value': '0', 'Label': ' - Address Problems'}, 'SCurveWidth_sigma': {'Value': '11.86', 'Label': 'SCurveWidth \xcf\x83'}, 'nNoisy2Pixel': {'Value': '0', 'Label': 'Noisy Pixels 2'}, 'Total': {'Value': '0', 'Label': 'Total'}, 'nThrDefect': {'Value': '0', 'Label': 'Trim Problems'}, 'nGainDefect': {'Value': '0', 'Label': 'PH Gain defects'}}
-                    
-                    test = Test_PerformanceParameters(
-                        FULLMODULEANALYSISTEST_ID = insertedID, #### beware this is an analysis!
-                        ROC_POS = ChipNo,
-                        Total = PerformanceParameters['Total']['Value'], 
-                        nDeadPixel  = PerformanceParameters['nDeadPixel']['Value'],
-                        nMaskDefect  = PerformanceParameters['nMaskDefect']['Value'],
-                        nDeadBumps  = PerformanceParameters['nDeadBumps']['Value'],
-                        nDeadTrimbits  = PerformanceParameters['nDeadTrimbits']['Value'],
-                        nAddressProblems  = PerformanceParameters['nAddressProblems']['Value'],
-                        nNoisy1Pixel  = PerformanceParameters['nNoisy1Pixel']['Value'],
-                        nNoisy2Pixel  = PerformanceParameters['nNoisy2Pixel']['Value'],
-                        nThrDefect  = PerformanceParameters['nThrDefect']['Value'],
-                        nGainDefect  = PerformanceParameters['nGainDefect']['Value'],
-                        nPedDefect  = PerformanceParameters['nPedDefect']['Value'],
-                        nPar1Defect  = PerformanceParameters['nPar1Defect']['Value'],
-                        PixelDefectsGrade  = PerformanceParameters['PixelDefectsGrade']['Value'],
-                        SCurveWidth_mu = PerformanceParameters['SCurveWidth_mu']['Value'],  
-                        SCurveWidth_sigma= PerformanceParameters['SCurveWidth_sigma']['Value'],
-                        ThresholdTrimmed_mu= PerformanceParameters['ThresholdTrimmed_mu']['Value'],
-                        ThresholdTrimmed_sigma= PerformanceParameters['ThresholdTrimmed_sigma']['Value'],
-                        BumpBonding_mu= PerformanceParameters['BumpBonding_mu']['Value'],
-                        BumpBonding_sigma= PerformanceParameters['BumpBonding_sigma']['Value'],
-                        BumpBonding_threshold= PerformanceParameters['BumpBonding_threshold']['Value'],
-                        PHCalibrationGain_mu= PerformanceParameters['PHCalibrationGain_mu']['Value'],
-                        PHCalibrationGain_sigma= PerformanceParameters['PHCalibrationGain_sigma']['Value'],
-                        PHCalibrationPar1_mu= PerformanceParameters['PHCalibrationPar1_mu']['Value'],
-                        PHCalibrationPar1_sigma= PerformanceParameters['PHCalibrationPar1_sigma']['Value'],
-                        PHCalibrationPedestal_mu= PerformanceParameters['PHCalibrationPedestal_mu']['Value'],
-                        PHCalibrationPedestal_sigma= PerformanceParameters['PHCalibrationPedestal_sigma']['Value'],
-                        TrimBits_mu= PerformanceParameters['TrimBits_mu']['Value'],
-                        TrimBits_sigma= PerformanceParameters['TrimBits_sigma']['Value'])
-                    pdb.insertTestPerformance(test)
-                    print "PERFORMANCE TEST INSERTED FOR", ChipNo, insertedID
-#                    for i in PerformanceParameters:
-#                        print '\t',ChipNo, i,PerformanceParameters[i]['Value']
-#
-# insert performance parameters
-#                    
+            # keyword arguments of Test_DacParameters and Test_PerformanceParameters per ROC, without the id of the Fulltest
+            DacParameterList = []
+            PerformanceParameterList = []
+            for i in self.ResultData['SubTestResults']['Chips'].ResultData['SubTestResults']:
+                ChipTestResultObject = self.ResultData['SubTestResults']['Chips'].ResultData['SubTestResults'][i]
+                ChipNo = ChipTestResultObject.Attributes['ChipNo']
+                DacParameterOverviewTestResultObject = ChipTestResultObject.ResultData['SubTestResults']['DacParameterOverview']
+                for j in DacParameterOverviewTestResultObject.ResultData['SubTestResults']:
+                    DacParameters = DacParameterOverviewTestResultObject.ResultData['SubTestResults'][j].ResultData['KeyValueDictPairs']
+                    DacParameterList.append(dict(
+                        [('ROC_POS', ChipNo), ('TRIM_VALUE', DacParameters['TrimValue']['Value'])] +
+                        [(Key.upper(), DacParameters[Key]['Value']) for Key in self.PixelDBDacParameters]
+                    ))
+
+                PerformanceParameters = ChipTestResultObject.ResultData['SubTestResults']['PerformanceParameters'].ResultData['KeyValueDictPairs']
+                PerformanceParameterList.append(dict(
+                    [('ROC_POS', ChipNo)] +
+                    [(Key, PerformanceParameters[Key]['Value']) for Key in self.PixelDBPerformanceParameters]
+                ))
+
+            self.TestResultEnvironmentObject.PixelDBOutbox.add('Fulltest', {
+                'Row': Row,
+                'Operator': os.environ.get('PIXEL_OPERATOR'),
+                'Center': os.environ.get('PIXEL_CENTER'),
+                'IV': IV,
+                'DacParameters': DacParameterList,
+                'PerformanceParameters': PerformanceParameterList,
+            })
+            print 'PixelDB upload of', Row['ModuleID'], Row['TestDate'], 'added to outbox'
 
         else:
-            with self.TestResultEnvironmentObject.LocalDBConnection:
-                self.TestResultEnvironmentObject.LocalDBConnectionCursor.execute(
-                    'DELETE FROM ModuleTestResults WHERE ModuleID = :ModuleID AND TestType=:TestType AND QualificationType=:QualificationType AND TestDate <= :TestDate',
-                    Row)
-                self.TestResultEnvironmentObject.LocalDBConnectionCursor.execute(
-                    '''INSERT INTO ModuleTestResults
-                    (
-                        ModuleID,
-                        TestDate,
-                        TestType,
-                        QualificationType,
-                        Grade,
-                        PixelDefects,
-                        ROCsMoreThanOnePercent,
-                        Noise,
-                        Trimming,
-                        PHCalibration,
-                        CurrentAtVoltage150V,
-                        RecalculatedVoltage,
-                        IVSlope,
-                        Temperature,
-                        RelativeModuleFinalResultsPath,
-                        FulltestSubfolder,
-                        initialCurrent,
-                        Comments,
-                        nCycles,
-                        CycleTempLow,
-                        CycleTempHigh
-                    )
-                    VALUES (
-                        :ModuleID,
-                        :TestDate,
-                        :TestType,
-                        :QualificationType,
-                        :Grade,
-                        :PixelDefects,
-                        :ROCsMoreThanOnePercent,
-                        :Noise,
-                        :Trimming,
-                        :PHCalibration,
-                        :CurrentAtVoltage150V,
-                        :RecalculatedCurrentAtVoltage150V,
-                        :IVSlope,
-                        :Temperature,
-                        :RelativeModuleFinalResultsPath,
-                        :FulltestSubfolder,
-                        :initialCurrent,
-                        :Comments,
-                        :nCycles,
-                        :CycleTempLow,
-                        :CycleTempHigh
-                    )
-                    ''', Row)
-                return self.TestResultEnvironmentObject.LocalDBConnectionCursor.lastrowid
+            # written in one transaction with the other rows of the qualification, see Helper/ResultWriter.py
+            Columns = [
+                'ModuleID',
+                'TestDate',
+                'TestType',
+                'QualificationType',
+                'Grade',
+                'PixelDefects',
+                'ROCsMoreThanOnePercent',
+                'Noise',
+                'Trimming',
+                'PHCalibration',
+                'CurrentAtVoltage150V',
+                'RecalculatedVoltage',
+                'IVSlope',
+                'Temperature',
+                'RelativeModuleFinalResultsPath',
+                'FulltestSubfolder',
+                'initialCurrent',
+                'Comments',
+                'nCycles',
+                'CycleTempLow',
+                'CycleTempHigh',
+            ]
+            Parameters = list(Columns)
+            Parameters[Columns.index('RecalculatedVoltage')] = 'RecalculatedCurrentAtVoltage150V'
+            self.TestResultEnvironmentObject.ResultWriter.add(Row, Columns, Parameters)
 
 
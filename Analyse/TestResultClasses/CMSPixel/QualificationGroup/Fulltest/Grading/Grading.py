@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import ROOT
 import AbstractClasses
+import AbstractClasses.Helper.GradingEngine as GradingEngine
 
 
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
@@ -29,8 +30,8 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         print 'Subgrading, PixelDefects:',chipResults
         SubGrading = []
         for i in chipResults:
-            if int(i['TestResultObject'].ResultData['SubTestResults']['Summary'].ResultData['KeyValueDictPairs'][
-                'Total']['Value']) > 0.01 * self.nCols * self.nRows:
+            if GradingEngine.is_bad_roc(int(i['TestResultObject'].ResultData['SubTestResults']['Summary'].ResultData['KeyValueDictPairs'][
+                'Total']['Value'])):
                 BadRocs += 1
             SubGrading.append([
                 i['TestResultObject'].ResultData['SubTestResults']['Summary'].ResultData['KeyValueDictPairs'][
@@ -103,47 +104,15 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
         # TODO
 
 
-        if self.ParentObject.Attributes['TestType'] == 'p17_1':
-            # Grading
-            if ModuleGrade == 1 and BadRocs > 1:
-                ModuleGrade = 2
-            if ModuleGrade == 1 and CurrentAtVoltage150V > self.TestResultEnvironmentObject.GradingParameters[
-                'currentB']:
-                ModuleGrade = 2;
-            if ModuleGrade == 1 and CurrentVariation > self.TestResultEnvironmentObject.GradingParameters['slopeivB']:
-                ModuleGrade = 2
-            if BadRocs > 2:
-                ModuleGrade = 3
-            if CurrentAtVoltage150V > self.TestResultEnvironmentObject.GradingParameters['currentC']:
-                ModuleGrade = 3;
-
-            '''
-            // Failures reasons...
-            if( (i150> currentB) && (i150 < currentC) ) currentProblemB++;
-            if( (i150> currentC) ) currentProblemC++;
-            if( (ratio > slopeivB) ) slopeProblemB++;
- '''
-        else:
-            # Grading
-            if ModuleGrade == 1 and BadRocs > 1:
-                ModuleGrade = 2
-            if ModuleGrade == 1 and RecalculatedCurrentAtVoltage150V and RecalculatedCurrentAtVoltage150V > \
-                    self.TestResultEnvironmentObject.GradingParameters['currentBm10']:
-                ModuleGrade = 2
-            if ModuleGrade == 1 and RecalculatedCurrentVariation and RecalculatedCurrentVariation > \
-                    self.TestResultEnvironmentObject.GradingParameters['slopeivB']:
-                ModuleGrade = 2
-            if BadRocs > 2:
-                ModuleGrade = 3
-            if RecalculatedCurrentAtVoltage150V > self.TestResultEnvironmentObject.GradingParameters['currentCm10']:
-                ModuleGrade = 3
-
-            '''
-            # Failures reasons...
-            if (i150> 1.5*currentB and i150 < 1.5*currentC)currentProblemB++;
-            if (i150> 1.5*currentC) ){ currentProblemC++;}
-            if (ratio > slopeivB) ){ slopeProblemB++;}
-            '''
+        # Grading
+        GradeB, GradeC = GradingEngine.get_module_limits(BadRocs, self.ParentObject.Attributes['TestType'],
+                                                         CurrentAtVoltage150V, CurrentVariation,
+                                                         RecalculatedCurrentAtVoltage150V, RecalculatedCurrentVariation,
+                                                         self.TestResultEnvironmentObject.GradingParameters)
+        if ModuleGrade == 1 and GradeB:
+            ModuleGrade = 2
+        if GradeC:
+            ModuleGrade = 3
 
         nPixelDefectsTotal = 0
         try:
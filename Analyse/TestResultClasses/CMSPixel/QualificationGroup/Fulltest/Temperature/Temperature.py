@@ -75,7 +75,7 @@ class TestResult(GeneralTestResult):
                 graph = ROOT.TGraph()
                 self.ResultData['Plot']['ROOTObjects'][name] = ROOT.TGraph()
 
-            canvas = self.TestResultEnvironmentObject.Canvas
+            canvas = self.TestResultEnvironmentObject.GetCanvas()
             self.CanvasSize(canvas)
             canvas.cd()
 
@@ -1,4 +1,5 @@
 import AbstractClasses
+import AbstractClasses.Helper.HistoArray as HistoArray
 import ROOT
 
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
@@ -45,17 +46,22 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
 
         hist = ROOT.TH1F(self.GetUniqueID(), "", 26, 0, 26)
 
+        if HistoArray.available:
+            # sums over the 2 x 80 pixels of each double column
+            dcol_sums_a = HistoArray.get_array(hitmap_low)[:52, :80].reshape(26, 160).sum(axis=1)
+            dcol_sums_b = HistoArray.get_array(hitmap_high)[:52, :80].reshape(26, 160).sum(axis=1)
+
         for dcol in range(26):
-            sum_a = 0
-            sum_a_2 = 0
-            sum_b = 0
-            sum_b_2 = 0
-            for col in range(2):
-                for row in range(80):
-                    sum_a += hitmap_low.GetBinContent(dcol * 2 + col + 1, row + 1)
-                    sum_a_2 += hitmap_low.GetBinContent(dcol * 2 + col + 1, row + 1) ** 2
-                    sum_b += hitmap_high.GetBinContent(dcol * 2 + col + 1, row + 1)
-                    sum_b_2 += hitmap_high.GetBinContent(dcol * 2 + col + 1, row + 1) ** 2
+            if HistoArray.available:
+                sum_a = float(dcol_sums_a[dcol])
+                sum_b = float(dcol_sums_b[dcol])
+            else:
+                sum_a = 0
+                sum_b = 0
+                for col in range(2):
+                    for row in range(80):
+                        sum_a += hitmap_low.GetBinContent(dcol * 2 + col + 1, row + 1)
+                        sum_b += hitmap_high.GetBinContent(dcol * 2 + col + 1, row + 1)
             hist.SetBinContent(dcol + 1, sum_b / sum_a * current_a / current_b)
             err_a = sum_a ** 0.5
             err_b = sum_b ** 0.5
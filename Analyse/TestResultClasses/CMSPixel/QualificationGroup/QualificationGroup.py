@@ -12,6 +12,8 @@ import warnings
 
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
+        # e.g. the Fulltests at different temperatures are independent of each other
+        self.ParallelSubTestResults = True
         self.Name = 'CMSPixel_QualificationGroup_TestResult'
         self.NameSingle = 'QualificationGroup'
         self.Attributes['TestedObjectType'] = 'CMSPixel_Module'
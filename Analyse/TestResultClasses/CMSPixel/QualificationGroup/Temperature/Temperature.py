@@ -80,7 +80,7 @@ class TestResult(GeneralTestResult):
             else:
                 graph = ROOT.TGraph()
 
-            canvas = self.TestResultEnvironmentObject.Canvas
+            canvas = self.TestResultEnvironmentObject.GetCanvas()
             self.CanvasSize(canvas)
             canvas.cd()
 
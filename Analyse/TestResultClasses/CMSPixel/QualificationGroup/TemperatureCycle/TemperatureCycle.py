@@ -64,35 +64,18 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
             print 'use global DB'
             pass
         else:
-            with self.TestResultEnvironmentObject.LocalDBConnection:
-                print 'Delete from DB'
-                self.TestResultEnvironmentObject.LocalDBConnectionCursor.execute('DELETE FROM ModuleTestResults WHERE ModuleID = :ModuleID AND TestType=:TestType AND QualificationType=:QualificationType AND TestDate <= :TestDate',Row)
-                print 'Insert into DB'
-                self.TestResultEnvironmentObject.LocalDBConnectionCursor.execute(
-                    '''INSERT INTO ModuleTestResults 
-                     (
-                        ModuleID,
-                        TestDate,
-                        TestType,
-                        QualificationType,
-                        RelativeModuleFinalResultsPath,
-                        FulltestSubfolder,
-                        nCycles,
-                        CycleTempLow,
-                        CycleTempHigh
-                    )
-                    VALUES (
-                        :ModuleID,
-                        :TestDate,
-                        :TestType,
-                        :QualificationType,
-                        :RelativeModuleFinalResultsPath,
-                        :FulltestSubfolder,
-                        :nCycles,
-                        :CycleTempLow,
-                        :CycleTempHigh
-                    )
-                    ''', Row)
-                return self.TestResultEnvironmentObject.LocalDBConnectionCursor.lastrowid
+            # written in one transaction with the other rows of the qualification, see Helper/ResultWriter.py
+            Columns = [
+                'ModuleID',
+                'TestDate',
+                'TestType',
+                'QualificationType',
+                'RelativeModuleFinalResultsPath',
+                'FulltestSubfolder',
+                'nCycles',
+                'CycleTempLow',
+                'CycleTempHigh',
+            ]
+            self.TestResultEnvironmentObject.ResultWriter.add(Row, Columns)
             
     
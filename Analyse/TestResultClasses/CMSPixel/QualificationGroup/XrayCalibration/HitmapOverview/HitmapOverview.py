@@ -1,5 +1,6 @@
 import ROOT
 import AbstractClasses
+import AbstractClasses.Helper.HistoArray as HistoArray
 
 class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
     def CustomInit(self):
@@ -21,9 +22,13 @@ class TestResult(AbstractClasses.GeneralTestResult.GeneralTestResult):
             SubTestKey = 'Xray_HitMap_{Method}_{Target}_Chip{Chip}'.format(Method=self.Attributes['Method'], Target=self.Attributes['Target'], Chip=chipNo)
             histo = ChipTestResultObject.ResultData['SubTestResults'][SubTestKey].ResultData['Plot']['ROOTObject']
 
+            binContents = HistoArray.get_array(histo) if HistoArray.available else None
             for col in range(self.nCols):
                 for row in range(self.nRows):
-                    result = histo.GetBinContent(col + 1, row + 1)
+                    if binContents is not None:
+                        result = float(binContents[col, row])
+                    else:
+                        result = histo.GetBinContent(col + 1, row + 1)
                     self.UpdatePlot(chipNo, col, row, result)
 
         if self.ResultData['Plot']['ROOTObject']:
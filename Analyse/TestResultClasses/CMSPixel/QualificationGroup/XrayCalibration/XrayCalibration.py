@@ -457,55 +457,27 @@ class TestResult(GeneralTestResult):
                 sys.exit(31)
 
         else:
-            with self.TestResultEnvironmentObject.LocalDBConnection:
-                self.TestResultEnvironmentObject.LocalDBConnectionCursor.execute(
-                    'DELETE FROM ModuleTestResults WHERE ModuleID = :ModuleID AND TestType=:TestType AND QualificationType=:QualificationType AND TestDate <= :TestDate',
-                    Row)
-                self.TestResultEnvironmentObject.LocalDBConnectionCursor.execute(
-                    '''INSERT INTO ModuleTestResults
-                    (
-                        ModuleID,
-                        TestDate,
-                        TestType,
-                        QualificationType,
-                        Grade,
-                        PixelDefects,
-                        ROCsMoreThanOnePercent,
-                        Noise,
-                        Trimming,
-                        PHCalibration,
-                        CurrentAtVoltage150V,
-                        IVSlope,
-                        Temperature,
-                        RelativeModuleFinalResultsPath,
-                        FulltestSubfolder,
-                        initialCurrent,
-                        Comments,
-                        nCycles,
-                        CycleTempLow,
-                        CycleTempHigh
-                    )
-                    VALUES (
-                        :ModuleID,
-                        :TestDate,
-                        :TestType,
-                        :QualificationType,
-                        :Grade,
-                        :PixelDefects,
-                        :ROCsMoreThanOnePercent,
-                        :Noise,
-                        :Trimming,
-                        :PHCalibration,
-                        :CurrentAtVoltage150V,
-                        :IVSlope,
-                        :Temperature,
-                        :RelativeModuleFinalResultsPath,
-                        :FulltestSubfolder,
-                        :initialCurrent,
-                        :Comments,
-                        :nCycles,
-                        :CycleTempLow,
-                        :CycleTempHigh
-                    )
-                    ''', Row)
-                return self.TestResultEnvironmentObject.LocalDBConnectionCursor.lastrowid
+            # written in one transaction with the other rows of the qualification, see Helper/ResultWriter.py
+            Columns = [
+                'ModuleID',
+                'TestDate',
+                'TestType',
+                'QualificationType',
+                'Grade',
+                'PixelDefects',
+                'ROCsMoreThanOnePercent',
+                'Noise',
+                'Trimming',
+                'PHCalibration',
+                'CurrentAtVoltage150V',
+                'IVSlope',
+                'Temperature',
+                'RelativeModuleFinalResultsPath',
+                'FulltestSubfolder',
+                'initialCurrent',
+                'Comments',
+                'nCycles',
+                'CycleTempLow',
+                'CycleTempHigh',
+            ]
+            self.TestResultEnvironmentObject.ResultWriter.add(Row, Columns)
@@ -0,0 +1,111 @@
+'''
+    Tests of the batched Levenberg-Marquardt fits used by the vectorized S-curve and PH fits,
+    they only need numpy. Run from the Analyse directory with
+        python -m unittest discover -s tests
+'''
+import os
+import sys
+import math
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+import TestResultClasses.CMSPixel.QualificationGroup.Fulltest.Fitting.BatchedFit as BatchedFit
+
+# vcalLow of PH_Fitting: 5 low range points and 5 high range points * rangeConversion
+Vcal = [50, 100, 150, 200, 250, 210, 350, 490, 630, 1400]
+VcalErrors = [8.94, 8.89, 8.55, 8.55, 9.16, 8.68, 8.90, 7.85, 7.29, 4.37]
+
+# parameters [0]..[3] of [3] + [2]*tanh([0]*x - [1]) of typical pixels
+TanhReferenceParameters = [
+    [0.0040, 1.40, 1000., 0.],
+    [0.0035, 1.20, 600., 150.],
+    [0.0055, 1.80, 450., -50.],
+    [0.0030, 1.00, 800., 250.],
+]
+# parameters [0]..[3] of [0]*Erf([2]*(x-[1])) + [3] of typical S-curves, x in Vcal/1000
+ErfReferenceParameters = [
+    [25., 0.060, 40., 25.],
+    [25., 0.085, 25., 25.],
+    [25., 0.120, 60., 25.],
+]
+ParameterTolerance = 1.e-6
+
+
+@unittest.skipIf(numpy is None, 'numpy is needed for the batched fits')
+class TestBatchedFit(unittest.TestCase):
+    def test_erf(self):
+        x = numpy.linspace(-5., 5., 1001)
+        expected = numpy.array([math.erf(i) for i in x])
+        self.assertLess(numpy.abs(BatchedFit.Erf(x) - expected).max(), 1.5e-7)
+        self.assertEqual(list(BatchedFit.Erf(numpy.array([-30., 30.]))), [-1., 1.])
+
+    def test_tanh_fit(self):
+        '''
+            same start values, errors and fit range as PH_Fitting.FitTanhVectorized
+        '''
+        reference = numpy.array(TanhReferenceParameters)
+        vcal = numpy.tile(numpy.array(Vcal, dtype = float), (len(reference), 1))
+        ph = BatchedFit.TanhModel(reference, vcal)[0]
+        mask = (vcal >= 50) & (vcal <= 1500)
+        # a pixel with a missing point
+        mask[0, 3] = False
+        startValues = numpy.tile([0.004, 1.4, 1000., 0.], (len(reference), 1))
+        parameters, chi2, ndf, converged = BatchedFit.FitLevenbergMarquardt(BatchedFit.TanhModel, startValues,
+                vcal, ph, numpy.tile(VcalErrors, (len(reference), 1)), ex = numpy.ones(ph.shape) * 2.0, mask = mask)
+        self.assertTrue(converged.all())
+        self.assertEqual(list(ndf), [5, 6, 6, 6])
+        self.assertLess(chi2.max(), 1.e-6)
+        for fitted, expected in zip(parameters, reference):
+            for value, expectedValue in zip(fitted, expected):
+                self.assertAlmostEqual(value, expectedValue, delta = ParameterTolerance * max(abs(expectedValue), 1.))
+
+    def test_noisy_tanh_fit_converges(self):
+        '''
+            with the default EDM limit nearly all pixels are accepted without Minuit
+        '''
+        generator = random.Random(1)
+        reference = numpy.array([[generator.uniform(0.003, 0.006), generator.uniform(1.0, 2.0),
+                                  generator.uniform(400., 1000.), generator.uniform(-100., 300.)] for i in range(200)])
+        vcal = numpy.tile(numpy.array(Vcal, dtype = float), (len(reference), 1))
+        ph = numpy.round(BatchedFit.TanhModel(reference, vcal)[0] + [[generator.gauss(0, 2.) for x in Vcal] for p in reference])
+        converged = BatchedFit.FitLevenbergMarquardt(BatchedFit.TanhModel, numpy.tile([0.004, 1.4, 1000., 0.], (len(ph), 1)),
+                vcal, ph, numpy.tile(VcalErrors, (len(ph), 1)), ex = numpy.ones(ph.shape) * 2.0)[3]
+        self.assertGreaterEqual(converged.sum(), 0.95 * len(ph))
+
+    def test_erf_fit(self):
+        reference = numpy.array(ErfReferenceParameters)
+        x = numpy.tile(numpy.linspace(0., 0.2, 41), (len(reference), 1))
+        y = BatchedFit.ErfModel(reference, x)[0]
+        startValues = reference * [1.1, 1.05, 0.8, 0.9]
+        parameters, chi2, ndf, converged = BatchedFit.FitLevenbergMarquardt(BatchedFit.ErfModel, startValues,
+                x, y, numpy.ones(y.shape))
+        self.assertTrue(converged.all())
+        self.assertEqual(list(ndf), [37, 37, 37])
+        self.assertLess(chi2.max(), 1.e-6)
+        for fitted, expected in zip(parameters, reference):
+            for value, expectedValue in zip(fitted, expected):
+                self.assertAlmostEqual(value, expectedValue, delta = ParameterTolerance * max(abs(expectedValue), 1.))
+
+    def test_too_few_points(self):
+        '''
+            pixels without degrees of freedom are not fitted and not converged
+        '''
+        reference = numpy.array(TanhReferenceParameters[:1])
+        vcal = numpy.array([Vcal], dtype = float)
+        ph = BatchedFit.TanhModel(reference, vcal)[0]
+        mask = numpy.zeros(vcal.shape, dtype = bool)
+        mask[0, :4] = True
+        parameters, chi2, ndf, converged = BatchedFit.FitLevenbergMarquardt(BatchedFit.TanhModel, reference, vcal, ph,
+                numpy.ones(ph.shape), mask = mask)
+        self.assertEqual(ndf[0], 0)
+        self.assertFalse(converged[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
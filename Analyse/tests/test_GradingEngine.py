@@ -0,0 +1,228 @@
+'''
+    Tests of the regrading of stored Fulltests, they only need numpy. The grades of the GradingEngine
+    are compared with the grades of the analysis, which applies the same rules to one ROC and one set
+    of grading parameters at a time in PixelMap, BumpBondingProblems, TrimBitProblems,
+    Chips/Chip/Grading and Fulltest/Grading. Run from the Analyse directory with
+        python -m unittest discover -s tests
+'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+import AbstractClasses.Helper.GradingEngine as GradingEngine
+import AbstractClasses.Helper.PixelMask as PixelMask
+
+GradingParametersFileName = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/Configuration/GradingParameters.cfg'
+
+nRocs = 16
+Shape = (PixelMask.NCols, PixelMask.NRows)
+
+Sweep = {
+    'defectsB': [5, 42],
+    'noiseB': [300, 500],
+    'TrimBitDifference': [1, 2],
+    'excludeTrimBit14': [0, 1],
+    'PixelMapMaskDefectUpperThreshold': [0, 8],
+    'BumpBondingProblemsNSigma': [2., 3.],
+    'currentBm10': [2, 20],
+}
+
+
+def get_record(Key, Attributes = None, KeyValueDictPairs = None, Plot = None, HiddenData = None, SubTestResults = ()):
+    '''
+        sub test result as stored by ResultDataStore
+    '''
+    return {'Key': Key, 'Record': {
+        'Attributes': dict(Attributes or {}, Key = Key),
+        'ResultData': {
+            'KeyValueDictPairs': dict((Name, {'Value': Value}) for Name, Value in (KeyValueDictPairs or {}).items()),
+            'Plot': {'ROOTObject': Plot},
+            'HiddenData': HiddenData or {},
+        },
+        'SubTestResultDictList': list(SubTestResults),
+    }}
+
+
+def get_histogram(Array):
+    '''
+        stored TH2D with the bin contents Array[column, row]
+    '''
+    Contents = numpy.zeros((Shape[1] + 2, Shape[0] + 2))
+    Contents[1:-1, 1:-1] = Array.T
+    return {'Histogram': 'TH2D', 'Contents': Contents.tostring(), 'TypeCode': 'd',
+            'Axes': [(Shape[0], 0, Shape[0], None, ''), (Shape[1], 0, Shape[1], None, '')]}
+
+
+class Chip(object):
+    '''
+        random maps of one ROC
+    '''
+    def __init__(self, Random, chipNo, isDigital):
+        self.chipNo = chipNo
+        self.PixelMap = Random.choice([0, 5, 10, 11, 20], size = Shape, p = [.0005, .0005, .998, .0005, .0005]).astype(float)
+        # analog ROCs are compared with minThrDiff, -5 in the configuration
+        self.BumpBonding = Random.normal(0, .6, Shape) if isDigital else Random.normal(-8.5, 1.3, Shape)
+        self.BumpBondingMean = round(Random.normal(0, .1), 2)
+        self.BumpBondingRMS = round(Random.uniform(.8, 1.2), 2)
+        self.TrimBitMaps = [Random.randint(0, 400, Shape).astype(float)]
+        self.TrimBitMaps += [self.TrimBitMaps[0] + Random.choice([-1, 1], Shape) * Random.randint(1, 800, Shape) for k in range(4)]
+        self.AddressProblems = Random.uniform(size = Shape) < .0002
+        self.Noise = Random.uniform(0, 520)
+        self.GainMu = Random.uniform(1., 3.)
+        self.GainSigma = self.GainMu * Random.uniform(0, .11)
+        self.N = float(Random.randint(405, 417))
+
+    def get_defects(self, GradingParameters, isDigital):
+        '''
+            TotalList of Chip/Grading, see the array checks of the sub test results
+        '''
+        Dead, Noisy, MaskDefect = GradingEngine.get_pixel_alive_defects(self.PixelMap, GradingParameters['PixelMapMaxValue'],
+                                                                        GradingParameters['PixelMapMaskDefectUpperThreshold'])
+        DeadBumps = self.BumpBonding >= GradingEngine.get_bump_bonding_threshold(isDigital, self.BumpBondingMean,
+                self.BumpBondingRMS, GradingParameters['BumpBondingProblemsNSigma'], GradingParameters['minThrDiff'])
+        DeadTrimBits = numpy.zeros(Shape, dtype = bool)
+        for k in range(1, 5):
+            DeadTrimBits |= GradingEngine.is_dead_trim_bit(abs(self.TrimBitMaps[k] - self.TrimBitMaps[0]), k,
+                                                           GradingParameters['TrimBitDifference'], bool(GradingParameters['excludeTrimBit14']))
+        return Dead, MaskDefect, DeadBumps, DeadTrimBits
+
+    def get_record(self, GradingParameters, isDigital, StoreArrays):
+        '''
+            stored record of the ROC, graded with GradingParameters, with or without the arrays
+        '''
+        Dead, MaskDefect, DeadBumps, DeadTrimBits = self.get_defects(GradingParameters, isDigital)
+        Mask = lambda Array: PixelMask.PixelMask.from_array(Array, self.chipNo)
+        nDefects = (Dead | MaskDefect | DeadBumps | DeadTrimBits | self.AddressProblems).sum()
+        TrimBitDifferences = [abs(self.TrimBitMaps[k] - self.TrimBitMaps[0]) for k in range(1, 5)]
+        return get_record('Chip%d' % self.chipNo, {'Attributes': {'ChipNo': self.chipNo}}, SubTestResults = [
+            get_record('PixelMap', KeyValueDictPairs = {'DeadPixels': Mask(Dead), 'MaskDefects': Mask(MaskDefect)},
+                       Plot = get_histogram(self.PixelMap) if StoreArrays else None),
+            get_record('BumpBonding', KeyValueDictPairs = {'Mean': self.BumpBondingMean, 'RMS': self.BumpBondingRMS}),
+            get_record('BumpBondingProblems', KeyValueDictPairs = {'DeadBumps': Mask(DeadBumps)},
+                       Plot = get_histogram(self.BumpBonding) if StoreArrays else None),
+            get_record('TrimBitProblems', KeyValueDictPairs = {'DeadTrimbits': Mask(DeadTrimBits)}, HiddenData = {
+                'TrimBitDifference1': TrimBitDifferences[0],
+                'TrimBitMinDifference': numpy.min(TrimBitDifferences[1:], axis = 0),
+            } if StoreArrays else {}),
+            get_record('AddressDecoding', KeyValueDictPairs = {'AddressDecodingProblems': Mask(self.AddressProblems)}),
+            get_record('SCurveWidths', KeyValueDictPairs = {'mu': self.Noise, 'N': self.N}),
+            get_record('PHCalibrationGain', KeyValueDictPairs = {'mu': self.GainMu, 'sigma': self.GainSigma, 'N': self.N}),
+            get_record('Grading', KeyValueDictPairs = {'PixelDefectsGrade': '%d' % GradingEngine.get_pixel_defects_grade(
+                nDefects, GradingParameters['defectsB'], GradingParameters['defectsC'])}),
+        ])
+
+
+class Fulltest(object):
+    def __init__(self, Random, TestType, isDigital):
+        self.TestType = TestType
+        self.isDigital = isDigital
+        self.Chips = [Chip(Random, chipNo, isDigital) for chipNo in range(nRocs)]
+        self.CurrentAtVoltage150V = Random.uniform(0, 3.6)
+        self.Variation = Random.uniform(0, 1.8)
+        self.RecalculatedCurrentAtVoltage150V = Random.uniform(0, 3.6)
+        self.RecalculatedCurrentVariation = Random.uniform(0, 1.8)
+
+    def get_grades(self, GradingParameters):
+        '''
+            module grade and pixel defects grades of the ROCs in the order the analysis determines them
+        '''
+        nDefects = []
+        for Chip in self.Chips:
+            Dead, MaskDefect, DeadBumps, DeadTrimBits = Chip.get_defects(GradingParameters, self.isDigital)
+            nDefects.append(int((Dead | MaskDefect | DeadBumps | DeadTrimBits | Chip.AddressProblems).sum()))
+        PixelDefectsGrades = [GradingEngine.get_pixel_defects_grade(n, GradingParameters['defectsB'], GradingParameters['defectsC'])
+                              for n in nDefects]
+        BadRocs = sum(1 for n in nDefects if GradingEngine.is_bad_roc(n))
+
+        # Chip/Grading.GetSingleChipSubtestGrade for all ROCs and sub tests
+        ModuleGrade = 1
+        for Chip in self.Chips:
+            for Value, LimitB, LimitC in [(Chip.Noise, 'noiseB', 'noiseC'), (Chip.GainSigma / Chip.GainMu, 'gainB', 'gainC')]:
+                GradeB, GradeC = GradingEngine.get_subtest_limits(Value, Chip.N, GradingParameters[LimitB], GradingParameters[LimitC],
+                                                                  GradingParameters['defectsB'], GradingParameters['defectsC'])
+                if ModuleGrade == 1 and GradeB:
+                    ModuleGrade = 2
+                if GradeC:
+                    ModuleGrade = 3
+
+        GradeB, GradeC = GradingEngine.get_module_limits(BadRocs, self.TestType, self.CurrentAtVoltage150V, self.Variation,
+                                                         self.RecalculatedCurrentAtVoltage150V, self.RecalculatedCurrentVariation,
+                                                         GradingParameters)
+        if ModuleGrade == 1 and GradeB:
+            ModuleGrade = 2
+        if GradeC:
+            ModuleGrade = 3
+        return ModuleGrade, nDefects, PixelDefectsGrades
+
+    def get_record(self, GradingParameters, StoreArrays = True):
+        ModuleGrade = self.get_grades(GradingParameters)[0]
+        return get_record('Fulltest', {
+            'Name': GradingEngine.FulltestName,
+            'Attributes': {'ModuleID': 'M0000', 'TestType': self.TestType, 'isDigital': self.isDigital},
+        }, SubTestResults = [
+            get_record('Chips', SubTestResults = [Chip.get_record(GradingParameters, self.isDigital, StoreArrays) for Chip in self.Chips]),
+            get_record('Noise'),
+            get_record('RelativeGainWidth'),
+            get_record('Grading', KeyValueDictPairs = {'ModuleGrade': '%d' % ModuleGrade}),
+            get_record('IVCurve', KeyValueDictPairs = {
+                'CurrentAtVoltage150V': self.CurrentAtVoltage150V,
+                'Variation': self.Variation,
+                'recalculatedCurrentAtVoltage150V': self.RecalculatedCurrentAtVoltage150V,
+                'recalculatedCurrentVariation': self.RecalculatedCurrentVariation,
+            }),
+        ])['Record']
+
+
+@unittest.skipIf(numpy is None, 'numpy is needed for the GradingEngine')
+class TestGradingEngine(unittest.TestCase):
+    def setUp(self):
+        self.GradingParameters = GradingEngine.read_grading_parameters(GradingParametersFileName)
+        self.GradingParameters.setdefault('PixelMapMaskDefectUpperThreshold', 0.)
+        Random = numpy.random.RandomState(1)
+        self.Fulltests = [Fulltest(Random, TestType, isDigital) for TestType, isDigital in
+                          [('p17_1', True), ('p17_1', False), ('m20_1', True), ('m20_1', False)]]
+
+    def test_sweep(self):
+        '''
+            all parameter sets of the sweep are graded as the analysis would grade them
+        '''
+        Parameters = GradingEngine.get_parameter_sets(self.GradingParameters, Sweep)
+        nSets = len(Parameters['defectsB'])
+        for Test in self.Fulltests:
+            Grades = GradingEngine.grade(GradingEngine.get_fulltest_inputs(Test.get_record(self.GradingParameters)), Parameters)
+            for Set in range(nSets):
+                ModuleGrade, nDefects, PixelDefectsGrades = Test.get_grades(dict((Name, Values[Set]) for Name, Values in Parameters.items()))
+                self.assertEqual(Grades['ModuleGrade'][Set], ModuleGrade)
+                self.assertEqual(list(Grades['nDefects'][Set]), nDefects)
+                self.assertEqual(list(Grades['PixelDefectsGrade'][Set]), PixelDefectsGrades)
+            # the sweep should not be trivial
+            self.assertGreater(len(set(Grades['ModuleGrade'])), 1)
+
+    def test_stored_grades(self):
+        '''
+            with the configured parameters the stored grades are reproduced, also from the pixel lists
+            of Fulltests which were stored without the arrays
+        '''
+        Parameters = GradingEngine.get_parameter_sets(self.GradingParameters)
+        for Test in self.Fulltests:
+            for StoreArrays in (True, False):
+                Inputs = GradingEngine.get_fulltest_inputs(Test.get_record(self.GradingParameters, StoreArrays))
+                self.assertEqual('PixelMap' in Inputs, StoreArrays)
+                Grades = GradingEngine.grade(Inputs, Parameters)
+                self.assertEqual(Grades['ModuleGrade'][0], Inputs['StoredModuleGrade'])
+                self.assertEqual(list(Grades['PixelDefectsGrade'][0]), list(Inputs['StoredPixelDefectsGrade']))
+
+    def test_pixel_defects_grade(self):
+        for nDefects, Grade in [(0, 1), (41, 1), (42, 2), (165, 2), (166, 3)]:
+            self.assertEqual(GradingEngine.get_pixel_defects_grade(nDefects, 42, 166), Grade)
+        self.assertEqual(list(GradingEngine.get_pixel_defects_grade(numpy.array([0, 42, 166]), 42, 166)), [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+'''
+    Regression test of the vectorized tanh PH fit (fitMode 3) against the Minuit fit of FitTanh
+    on synthetic calibration curves. Run from the Analyse directory with
+        python -m unittest discover -s tests
+'''
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import ROOT
+    import TestResultClasses.CMSPixel.QualificationGroup.Fulltest.Fitting.PH_Fitting as PH_Fitting
+except ImportError:
+    ROOT = None
+
+nPixels = 200
+# relative deviation of the parameters which is accepted, Minuit also stops at a finite EDM
+ParameterTolerance = 1.e-3
+
+
+def GetCalibrations(vcal, seed = 1):
+    '''
+        PH values of nPixels tanh curves with random parameters and a little noise
+    '''
+    generator = random.Random(seed)
+    calibrations = []
+    for i in range(nPixels):
+        p0 = generator.uniform(0.003, 0.006)
+        p1 = generator.uniform(1.0, 2.0)
+        p2 = generator.uniform(400., 1000.)
+        p3 = generator.uniform(-100., 300.)
+        calibrations.append([int(round(p3 + p2 * numpy.tanh(p0 * x - p1) + generator.gauss(0, 2.))) for x in vcal])
+    # a pixel with a missing point
+    calibrations[0][3] = -99999
+    return calibrations
+
+
+@unittest.skipIf(ROOT is None or numpy is None, 'ROOT and numpy are needed for the PH fit test')
+class TestFitTanhVectorized(unittest.TestCase):
+    def setUp(self):
+        ROOT.gROOT.SetBatch(True)
+        self.fitter = PH_Fitting.PH_Fitting(3, vectorized = True)
+        self.calibrations = GetCalibrations(self.fitter.vcalLow)
+
+    def test_same_result_as_minuit(self):
+        vectorized = self.fitter.FitTanhVectorized(self.calibrations)
+        self.assertEqual(len(vectorized), len(self.calibrations))
+        for calibration, result in zip(self.calibrations, vectorized):
+            expected = self.fitter.FitTanh(calibration)
+            self.assertEqual(len(result), len(expected))
+            for value, expectedValue in zip(result[:-1], expected[:-1]):
+                self.assertAlmostEqual(value, expectedValue, delta = ParameterTolerance * max(abs(expectedValue), 1.))
+            self.assertAlmostEqual(result[-1], expected[-1], delta = ParameterTolerance * max(expected[-1], 1.))
+
+
+if __name__ == '__main__':
+    unittest.main()